@@ -0,0 +1,73 @@
+# Benchmark of the trainer startup with lazily built metrics and viewer
+# This script builds a Runner on a reconstructed scene (the `sfm` directory written by ReconstructionPipeline)
+# in fresh processes, once as the trainer now does and once also building the LPIPS, SSIM and PSNR metrics and
+# the viewer server up front, as it used to, and reports the startup time and peak memory of both.
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def build_runner(data_dir: str, data_factor: int, eager: bool):
+    tic = time.time()
+    import torch
+
+    from easy_3dgs.pipeline.gaussian_splatting.simple_trainer import Config, Runner
+
+    with tempfile.TemporaryDirectory() as result_dir:
+        cfg = Config(
+            data_dir=data_dir,
+            data_factor=data_factor,
+            result_dir=result_dir,
+            disable_viewer=not eager,
+        )
+        runner = Runner(local_rank=0, world_rank=0, world_size=1, cfg=cfg)
+        if eager:
+            # Build what the Runner used to build in its constructor.
+            for name in ["ssim", "psnr", "lpips", "viewer"]:
+                getattr(runner, name)
+        torch.cuda.synchronize()
+        startup_time = time.time() - tic
+        if eager:
+            runner.server.stop()
+    return {
+        "startup_time": startup_time,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "peak_gpu_mb": torch.cuda.max_memory_allocated() / 1024**2,
+    }
+
+
+def run_in_subprocess(data_dir: str, data_factor: int, eager: bool):
+    command = [sys.executable, __file__, data_dir, "--data_factor", str(data_factor)]
+    command += ["--child", "eager" if eager else "lazy"]
+    output = subprocess.run(command, check=True, capture_output=True, text=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("data_dir", help="Path to the sfm directory of a scene.")
+    parser.add_argument("--data_factor", type=int, default=4)
+    parser.add_argument("--child", choices=["lazy", "eager"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        stats = build_runner(args.data_dir, args.data_factor, args.child == "eager")
+        print(json.dumps(stats))
+        sys.exit()
+
+    # Warm up the file system cache and download the LPIPS weights.
+    run_in_subprocess(args.data_dir, args.data_factor, eager=True)
+
+    eager = run_in_subprocess(args.data_dir, args.data_factor, eager=True)
+    lazy = run_in_subprocess(args.data_dir, args.data_factor, eager=False)
+    for name, stats in [("Eager metrics and viewer", eager), ("Lazy", lazy)]:
+        print(
+            f"{name + ':':26s}{stats['startup_time']:.2f} s, "
+            f"{stats['peak_rss_mb']:.0f} MB RSS, {stats['peak_gpu_mb']:.0f} MB GPU"
+        )
+    print(f"Speedup: {eager['startup_time'] / lazy['startup_time']:.2f}x")
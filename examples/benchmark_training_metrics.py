@@ -0,0 +1,51 @@
+# Benchmark of the training throughput with and without per-step metric syncs
+# This script trains on a reconstructed scene (the `sfm` directory written by ReconstructionPipeline)
+# once syncing the losses to the host at every step, as the trainer used to, and once with the
+# device-side metrics accumulator, and reports the training steps per second of both runs.
+
+import argparse
+import tempfile
+import time
+
+import torch
+
+from easy_3dgs.pipeline.gaussian_splatting.simple_trainer import Config, Runner
+
+
+def steps_per_second(data_dir: str, data_factor: int, steps: int, metrics_every: int):
+    with tempfile.TemporaryDirectory() as result_dir:
+        cfg = Config(
+            data_dir=data_dir,
+            data_factor=data_factor,
+            result_dir=result_dir,
+            max_steps=steps,
+            eval_steps=[],
+            save_steps=[],
+            save_ply=False,
+            disable_viewer=True,
+            metrics_every=metrics_every,
+            tb_every=0,
+        )
+        runner = Runner(local_rank=0, world_rank=0, world_size=1, cfg=cfg)
+        torch.cuda.synchronize()
+        tic = time.time()
+        runner.train()
+        torch.cuda.synchronize()
+        return steps / (time.time() - tic)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("data_dir", help="Path to the sfm directory of a scene.")
+    parser.add_argument("--data_factor", type=int, default=4)
+    parser.add_argument("--steps", type=int, default=2000)
+    args = parser.parse_args()
+
+    # Warm up the CUDA kernels so that both runs are measured the same way.
+    steps_per_second(args.data_dir, args.data_factor, 100, metrics_every=1)
+
+    synced = steps_per_second(args.data_dir, args.data_factor, args.steps, 1)
+    accumulated = steps_per_second(args.data_dir, args.data_factor, args.steps, 100)
+    print(f"Sync every step:        {synced:.1f} steps/s")
+    print(f"Metrics accumulator:    {accumulated:.1f} steps/s")
+    print(f"Speedup:                {accumulated / synced:.2f}x")
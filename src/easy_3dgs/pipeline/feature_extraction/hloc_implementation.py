@@ -1,6 +1,7 @@
 # src/easy_3dgs/pipeline/feature_extraction/hloc_implementation.py
 import logging
 from pathlib import Path
+from typing import List, Optional
 from hloc import extract_features
 from .base import AbstractFeatureExtractor
 
@@ -9,6 +10,10 @@ class HlocFeatureExtractor(AbstractFeatureExtractor):
     def __init__(self, config: dict):
         self.config = config
 
-    def run(self, image_dir: Path, output_dir: Path):
+    def run(
+        self, image_dir: Path, output_dir: Path, image_list: Optional[List[str]] = None
+    ):
         logging.info("Step 3/6: Extracting local features...")
-        return extract_features.main(self.config, image_dir, output_dir)
+        return extract_features.main(
+            self.config, image_dir, output_dir, image_list=image_list
+        )
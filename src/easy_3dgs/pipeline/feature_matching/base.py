@@ -1,13 +1,20 @@
 # src/easy_3dgs/pipeline/feature_matching/base.py
 from abc import ABC, abstractmethod
 from pathlib import Path
+from typing import Optional
 
 
 class AbstractFeatureMatcher(ABC):
     """Abstract class to match features between image pairs."""
 
     @abstractmethod
-    def run(self, pairs_path: Path, feature_output_name: str, output_dir: Path):
+    def run(
+        self,
+        pairs_path: Path,
+        feature_output_name: str,
+        output_dir: Path,
+        match_path: Optional[Path] = None,
+    ):
         pass
 
 
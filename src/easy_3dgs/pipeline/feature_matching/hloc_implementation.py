@@ -1,6 +1,7 @@
 # src/easy_3dgs/pipeline/feature_matching/hloc_implementation.py
 import logging
 from pathlib import Path
+from typing import Optional
 from hloc import match_features, match_dense
 from .base import AbstractFeatureMatcher, AbstractDenseFeatureMatcher
 
@@ -11,10 +12,16 @@ class HlocFeatureMatcher(AbstractFeatureMatcher):
     def __init__(self, config: dict):
         self.config = config
 
-    def run(self, pairs_path: Path, feature_output_name: str, output_dir: Path):
+    def run(
+        self,
+        pairs_path: Path,
+        feature_output_name: str,
+        output_dir: Path,
+        match_path: Optional[Path] = None,
+    ):
         logging.info("Step 4/6: Matching features...")
         return match_features.main(
-            self.config, pairs_path, feature_output_name, output_dir
+            self.config, pairs_path, feature_output_name, output_dir, matches=match_path
         )
 
 
@@ -1,9 +1,12 @@
 # src/easy_3dgs/pipeline/feature_retrieval/base.py
 from abc import ABC, abstractmethod
 from pathlib import Path
+from typing import List, Optional
 
 class AbstractFeatureRetriever(ABC):
     """Abstract class to extract global features for image retrieval."""
     @abstractmethod
-    def run(self, image_dir: Path, output_dir: Path):
+    def run(
+        self, image_dir: Path, output_dir: Path, image_list: Optional[List[str]] = None
+    ):
         pass
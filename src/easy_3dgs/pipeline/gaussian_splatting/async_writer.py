@@ -0,0 +1,217 @@
+import atexit
+import os
+import queue
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import imageio
+import torch
+from torch import Tensor
+
+from .exporter import write_splats
+
+
+class AsyncWriter:
+    """Writes checkpoints, splat files and images on background threads.
+
+    `save`, `export_splats` and `save_image` snapshot their tensors into pinned
+    host buffers with asynchronous copies queued on the current CUDA stream, so
+    training can go on modifying the originals right away, and serialize the
+    snapshot on a worker thread. Files are written to a temporary path and
+    renamed once complete. At most `max_pending` snapshots are held, further
+    submissions block until one is written. Pending writes are flushed by
+    `close`, which also runs at interpreter exit.
+    """
+
+    def __init__(
+        self, max_pending: int = 2, num_workers: int = 1, synchronous: bool = False
+    ):
+        """
+        Args:
+            max_pending (int): The maximum number of snapshots waiting to be written.
+            num_workers (int): The number of threads writing files concurrently.
+            synchronous (bool): If True, writes in the calling thread instead.
+        """
+        self.synchronous = synchronous
+        self.error: Optional[BaseException] = None
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.threads = []
+        if not synchronous:
+            for _ in range(num_workers):
+                thread = threading.Thread(target=self._run, daemon=True)
+                thread.start()
+                self.threads.append(thread)
+            atexit.register(self.close)
+
+    def save(self, obj: Any, path: str):
+        """Writes `obj` with `torch.save` to `path`."""
+        self._submit(torch.save, obj, path)
+
+    def export_splats(self, path: str, splats: Dict[str, Tensor], **kwargs):
+        """Writes the splats (means, scales, quats, opacities, sh0, shN) with
+        `exporter.write_splats`, to which `kwargs` are passed."""
+
+        def write(splats, path):
+            write_splats(path, splats, **kwargs)
+
+        self._submit(write, splats, path)
+
+    def save_image(self, path: str, image: Tensor):
+        """Encodes the uint8 image [H, W, C] to `path`, in the format of its
+        extension."""
+
+        def write(image, path):
+            imageio.imwrite(path, image.cpu().numpy())
+
+        self._submit(write, image, path)
+
+    def flush(self):
+        """Waits until every submitted file is written."""
+        if not self.synchronous:
+            self.queue.join()
+        self._raise_error()
+
+    def close(self):
+        """Flushes the pending writes and stops the worker thread."""
+        if not self.threads:
+            return
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        self._raise_error()
+
+    def _submit(self, fn: Callable[[Any, str], None], obj: Any, path: str):
+        self._raise_error()
+        if self.synchronous:
+            _write(fn, obj, path)
+            return
+        devices = set()
+        snapshot = _snapshot(obj, devices)
+        events = []
+        for device in devices:
+            # Marks the end of the copies queued on the stream of each device.
+            event = torch.cuda.Event()
+            event.record(torch.cuda.current_stream(device))
+            events.append(event)
+        self.queue.put((fn, snapshot, path, events))
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                fn, snapshot, path, events = item
+                for event in events:
+                    event.synchronize()
+                _write(fn, snapshot, path)
+            except BaseException as e:
+                print(f"[AsyncWriter] Failed to write {path}: {e}")
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError("A background write failed.") from error
+
+
+class AsyncVideoWriter:
+    """Encodes the frames of a video on a background thread.
+
+    Frames are snapshot into pinned host buffers like in `AsyncWriter` and
+    appended in order by a single worker, so the device can render the next
+    frames while the previous ones are encoded. At most `max_pending` batches of
+    frames are held, further appends block until one is encoded.
+    """
+
+    def __init__(self, path: str, fps: float = 30, max_pending: int = 4):
+        """
+        Args:
+            path (str): The path of the video, whose extension sets the format.
+            fps (float): The frame rate of the video.
+            max_pending (int): The maximum number of batches waiting to be encoded.
+        """
+        self.writer = imageio.get_writer(path, fps=fps)
+        self.error: Optional[BaseException] = None
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def append(self, frames: Tensor):
+        """Appends the uint8 frames [B, H, W, C] to the video."""
+        self._raise_error()
+        devices = set()
+        snapshot = _snapshot(frames, devices)
+        events = []
+        for device in devices:
+            event = torch.cuda.Event()
+            event.record(torch.cuda.current_stream(device))
+            events.append(event)
+        self.queue.put((snapshot, events))
+
+    def close(self):
+        """Encodes the pending frames and finalizes the video."""
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        self.writer.close()
+        self._raise_error()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            if self.error is not None:
+                # Keep consuming so that `append` does not block.
+                continue
+            frames, events = item
+            try:
+                for event in events:
+                    event.synchronize()
+                for frame in frames.numpy():
+                    self.writer.append_data(frame)
+            except BaseException as e:
+                print(f"[AsyncVideoWriter] Failed to encode frames: {e}")
+                self.error = e
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise RuntimeError("Encoding the video failed.") from self.error
+
+
+def _write(fn: Callable[[Any, str], None], obj: Any, path: str):
+    # Keep the extension, from which some writers infer the format.
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.tmp{ext}"
+    fn(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _snapshot(obj: Any, devices: set) -> Any:
+    """Copies the tensors of a nested structure to host memory.
+
+    CUDA tensors are copied asynchronously into pinned buffers, which torch's
+    pinned memory allocator recycles across snapshots, and their devices are
+    added to `devices`.
+    """
+    if isinstance(obj, Tensor):
+        if obj.is_cuda:
+            devices.add(obj.device)
+            buffer = torch.empty(obj.shape, dtype=obj.dtype, pin_memory=True)
+            return buffer.copy_(obj.detach(), non_blocking=True)
+        return obj.detach().clone()
+    if isinstance(obj, dict):
+        return type(obj)((k, _snapshot(v, devices)) for k, v in obj.items())
+    if isinstance(obj, list):
+        return [_snapshot(v, devices) for v in obj]
+    if isinstance(obj, tuple):
+        values = [_snapshot(v, devices) for v in obj]
+        return type(obj)(*values) if hasattr(obj, "_fields") else tuple(values)
+    return obj
@@ -0,0 +1,219 @@
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Literal, Tuple, Union
+
+import numpy as np
+import torch
+from torch import Tensor
+
+from .datasets.colmap import Parser
+
+
+@dataclass
+class Block:
+    """A spatial cell of the scene and the images that see it.
+
+    The core bounds of the cells partition the space: the outer cells extend to
+    infinity, and so does the axis that is not split. A cell is trained on its
+    bounds expanded by the overlap, and keeps the GSs of its core bounds when the
+    cells are merged.
+    """
+
+    id: int
+    # Core bounds [3] of the cell
+    lower: np.ndarray
+    upper: np.ndarray
+    # Bounds [3] expanded by the overlap, used for training
+    expanded_lower: np.ndarray
+    expanded_upper: np.ndarray
+    # Indices of the parser images that see the cell
+    image_indices: np.ndarray
+
+    def contains(
+        self, points: Union[np.ndarray, Tensor], expanded: bool = False
+    ) -> Union[np.ndarray, Tensor]:
+        """Returns which points [N, 3] are inside the core or expanded bounds."""
+        lower, upper = self.lower, self.upper
+        if expanded:
+            lower, upper = self.expanded_lower, self.expanded_upper
+        if isinstance(points, Tensor):
+            lower = torch.as_tensor(lower, dtype=points.dtype, device=points.device)
+            upper = torch.as_tensor(upper, dtype=points.dtype, device=points.device)
+        return ((points >= lower) & (points < upper)).all(-1)
+
+    def to_dict(self, parser: Parser) -> dict:
+        return {
+            "id": self.id,
+            "lower": self.lower.tolist(),
+            "upper": self.upper.tolist(),
+            "expanded_lower": self.expanded_lower.tolist(),
+            "expanded_upper": self.expanded_upper.tolist(),
+            "images": [parser.image_names[i] for i in self.image_indices],
+        }
+
+
+def partition_scene(
+    parser: Parser,
+    grid: Tuple[int, int],
+    overlap: float = 0.2,
+    min_points: int = 50,
+) -> List[Block]:
+    """Splits the scene into a grid of cells and assigns them the images that see them.
+
+    The two widest axes of the SfM points (the ground plane of normalized scenes)
+    are split at quantiles of the points, so that the cells hold about as many
+    points. An image sees a cell if at least `min_points` of the points it
+    observes are in the expanded bounds of the cell, or if the camera is inside
+    the cell.
+
+    Args:
+        parser (Parser): The scene.
+        grid (Tuple[int, int]): The number of cells along the two widest axes.
+        overlap (float): The fraction of a cell's size added on each side for training.
+        min_points (int): The number of observed points for an image to see a cell.
+    """
+    points = parser.points
+    low, high = np.percentile(points, [1, 99], axis=0)
+    axis0, axis1 = np.argsort(high - low)[::-1][:2]
+
+    blocks = []
+    edges0 = _quantile_edges(points[:, axis0], grid[0])
+    for i in range(grid[0]):
+        in_slab = (points[:, axis0] >= edges0[i]) & (points[:, axis0] < edges0[i + 1])
+        edges1 = _quantile_edges(points[in_slab, axis1], grid[1])
+        for j in range(grid[1]):
+            lower = np.full(3, -np.inf)
+            upper = np.full(3, np.inf)
+            lower[axis0], upper[axis0] = edges0[i], edges0[i + 1]
+            lower[axis1], upper[axis1] = edges1[j], edges1[j + 1]
+            # The overlap is relative to the extent of the points in the cell.
+            size = np.maximum(np.minimum(upper, high) - np.maximum(lower, low), 0)
+            blocks.append(
+                Block(
+                    id=len(blocks),
+                    lower=lower,
+                    upper=upper,
+                    expanded_lower=lower - overlap * size,
+                    expanded_upper=upper + overlap * size,
+                    image_indices=np.zeros(0, dtype=np.int64),
+                )
+            )
+
+    image_indices = [[] for _ in blocks]
+    for index, name in enumerate(parser.image_names):
+        observed = points[parser.point_indices[name]]
+        center = parser.camtoworlds[index, :3, 3][None]
+        for block, indices in zip(blocks, image_indices):
+            num_seen = block.contains(observed, expanded=True).sum()
+            if num_seen >= min_points or block.contains(center)[0]:
+                indices.append(index)
+    for block, indices in zip(blocks, image_indices):
+        block.image_indices = np.array(indices, dtype=np.int64)
+    return blocks
+
+
+def save_blocks(path: str, blocks: List[Block], parser: Parser):
+    """Writes the bounds and images of the cells as JSON."""
+    with open(path, "w") as f:
+        json.dump([block.to_dict(parser) for block in blocks], f, indent=2)
+
+
+class BlockStore:
+    """Holds the state of the trained cells out of the device.
+
+    With "cpu", the splats and optimizer states are moved to host memory. With
+    "disk", the final checkpoint written by the cell's training is kept on disk
+    and memory-mapped when the cell is loaded again, so nothing is held in
+    memory. Ranks only share cells on disk.
+    """
+
+    def __init__(self, offload: Literal["cpu", "disk"] = "disk"):
+        if offload not in ("cpu", "disk"):
+            raise ValueError(f"Unknown block offload: {offload}")
+        self.offload = offload
+        self.states: Dict[int, Union[str, dict]] = {}
+
+    def page_out(self, block_id: int, runner):
+        """Takes the state of a trained `Runner` off the device."""
+        if self.offload == "disk":
+            runner.async_writer.flush()
+            self.states[block_id] = str(latest_checkpoint(runner.ckpt_dir))
+            return
+        self.states[block_id] = {
+            "splats": {k: v.detach().cpu() for k, v in runner.splats.items()},
+            "optimizers": {
+                k: _to_cpu(optimizer.state_dict())
+                for k, optimizer in runner.optimizers.items()
+            },
+        }
+
+    def add_checkpoint(self, block_id: int, path: str):
+        """Registers a cell trained by another rank, from its checkpoint."""
+        self.states[block_id] = path
+
+    def load(self, block_id: int) -> dict:
+        """Returns the state of a cell, with its tensors on the host."""
+        state = self.states[block_id]
+        if isinstance(state, str):
+            return torch.load(state, map_location="cpu", mmap=True, weights_only=True)
+        return state
+
+
+@torch.no_grad()
+def merge_blocks(blocks: List[Block], store: BlockStore) -> Dict[str, Tensor]:
+    """Gathers the GSs of every cell within its core bounds, on the host.
+
+    The cells are read twice, to count the kept GSs and then to copy them, so the
+    merged splats are allocated once and only one cell is read at a time.
+    """
+    keeps = {}
+    for block in blocks:
+        if block.id in store.states:
+            means = store.load(block.id)["splats"]["means"]
+            keeps[block.id] = block.contains(means.float())
+    block_ids = list(keeps)
+
+    num_gs = sum(int(keep.sum()) for keep in keeps.values())
+    merged = {}
+    start = 0
+    for block_id in block_ids:
+        splats = store.load(block_id)["splats"]
+        keep = keeps[block_id]
+        num_kept = int(keep.sum())
+        for k, v in splats.items():
+            if k not in merged:
+                merged[k] = torch.empty((num_gs, *v.shape[1:]), dtype=v.dtype)
+            merged[k][start : start + num_kept] = v[keep]
+        start += num_kept
+    return merged
+
+
+def latest_checkpoint(ckpt_dir: str, rank: int = 0) -> Path:
+    """Returns the checkpoint of the last step in `ckpt_dir`."""
+    ckpts = sorted(
+        Path(ckpt_dir).glob(f"ckpt_*_rank{rank}.pt"),
+        key=lambda p: int(p.stem.split("_")[1]),
+    )
+    if not ckpts:
+        raise FileNotFoundError(f"No checkpoint found in {ckpt_dir}.")
+    return ckpts[-1]
+
+
+def _quantile_edges(values: np.ndarray, num_cells: int) -> np.ndarray:
+    if len(values) == 0:
+        edges = np.full(num_cells + 1, np.inf)
+    else:
+        edges = np.quantile(values, np.linspace(0, 1, num_cells + 1))
+    edges[0], edges[-1] = -np.inf, np.inf
+    return edges
+
+
+def _to_cpu(obj):
+    if isinstance(obj, Tensor):
+        return obj.cpu()
+    if isinstance(obj, dict):
+        return {k: _to_cpu(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_to_cpu(v) for v in obj]
+    return obj
@@ -0,0 +1,337 @@
+from typing import Any, Dict, Hashable, Optional, Sequence
+
+import torch
+from torch import Tensor
+
+# Half extent of a GS in standard deviations, the largest one rasterized by gsplat.
+GAUSSIAN_EXTENT = 3.33
+
+
+def frustum_planes(
+    camtoworlds: Tensor,
+    Ks: Tensor,
+    width: int,
+    height: int,
+    near_plane: float = 0.01,
+    far_plane: float = 1e10,
+    pixel_margin: float = 0.0,
+) -> Tensor:
+    """Computes the world-space planes bounding the view frustum of pinhole cameras.
+
+    A point `x` is inside plane `[n, d]` when `n @ x + d >= 0`. The first four
+    planes are the left, right, top and bottom sides and the last two are the
+    near and far planes. The near and far normals are unit vectors, and the side
+    normals are shortened so that `n @ x + d` is the distance to the plane divided
+    by how much the rasterizer stretches a GS at `x`: a GS whose extent is larger
+    than this distance may be seen.
+
+    Args:
+        camtoworlds (Tensor): The camera poses [C, 4, 4].
+        Ks (Tensor): The intrinsics [C, 3, 3].
+        width (int): The image width.
+        height (int): The image height.
+        near_plane (float): The depth of the near plane.
+        far_plane (float): The depth of the far plane.
+        pixel_margin (float): Pixels added around the image.
+
+    Returns:
+        Tensor: The planes [C, 6, 4].
+    """
+    fx, fy = Ks[:, 0, 0], Ks[:, 1, 1]
+    cx, cy = Ks[:, 0, 2], Ks[:, 1, 2]
+    left = (-pixel_margin - cx) / fx
+    right = (width + pixel_margin - cx) / fx
+    top = (-pixel_margin - cy) / fy
+    bottom = (height + pixel_margin - cy) / fy
+    zeros, ones = torch.zeros_like(fx), torch.ones_like(fx)
+    # Normals in camera space, for x / z in [left, right] and y / z in [top, bottom].
+    normals = torch.stack(
+        [
+            torch.stack([ones, zeros, -left], -1),
+            torch.stack([-ones, zeros, right], -1),
+            torch.stack([zeros, ones, -top], -1),
+            torch.stack([zeros, -ones, bottom], -1),
+            torch.stack([zeros, zeros, ones], -1),
+            torch.stack([zeros, zeros, -ones], -1),
+        ],
+        1,
+    )  # [C, 6, 3]
+    normals = torch.nn.functional.normalize(normals, dim=-1)
+
+    # The projection of gsplat linearizes the GSs at their mean, with the slope
+    # clamped to the image sides plus 30% of the field of view, which stretches
+    # the footprint of the GSs on the sides by up to sqrt(1 + slope^2).
+    tan_fovx, tan_fovy = 0.5 * width / fx, 0.5 * height / fy
+    slopes = torch.stack([left, right, top, bottom], 1)
+    lims = torch.stack(
+        [
+            cx / fx + 0.3 * tan_fovx,
+            (width - cx) / fx + 0.3 * tan_fovx,
+            cy / fy + 0.3 * tan_fovy,
+            (height - cy) / fy + 0.3 * tan_fovy,
+        ],
+        1,
+    )
+    stretches = torch.sqrt((1 + lims**2) / (1 + slopes**2)).clamp_min(1.0)
+    normals[:, :4] /= stretches[..., None]
+    offsets = torch.stack(
+        [zeros, zeros, zeros, zeros, -near_plane * ones, far_plane * ones], 1
+    )  # [C, 6]
+
+    rotations = camtoworlds[:, :3, :3]
+    translations = camtoworlds[:, :3, 3]
+    normals = torch.einsum("cij,cpj->cpi", rotations, normals)
+    offsets = offsets - torch.einsum("cpi,ci->cp", normals, translations)
+    return torch.cat([normals, offsets[..., None]], -1)
+
+
+def boxes_in_frustum(
+    lower: Tensor, upper: Tensor, planes: Tensor, padding: Optional[Tensor] = None
+) -> Tensor:
+    """Returns which axis-aligned boxes may intersect the frusta.
+
+    The test is conservative: boxes near the frustum corners may be kept while
+    outside of it, but a box inside or crossing the frustum is always kept.
+
+    Args:
+        lower (Tensor): The lower corners of the boxes [M, 3].
+        upper (Tensor): The upper corners of the boxes [M, 3].
+        planes (Tensor): The frustum planes [C, 6, 4] from `frustum_planes`.
+        padding (Optional[Tensor]): Distances [M] by which the boxes are grown
+            against the side planes only, for the extent of the GSs whose means
+            they bound: gsplat culls a GS on the depth of its mean.
+
+    Returns:
+        Tensor: The visibility of the boxes [C, M].
+    """
+    centers = (lower + upper) / 2
+    half_sizes = (upper - lower) / 2
+    normals, offsets = planes[..., :3], planes[..., 3]
+    distances = torch.einsum("cpi,mi->cpm", normals, centers) + offsets[..., None]
+    reach = torch.einsum("cpi,mi->cpm", normals.abs(), half_sizes)
+    if padding is not None:
+        reach[:, :4] += padding
+    return (distances + reach >= 0).all(1)
+
+
+class GaussianGrid:
+    """A uniform grid over the GS means to cull the GSs outside of camera frusta.
+
+    The GSs are sorted by cell, and each cell keeps the bounds of its means and
+    the largest extent of its GSs, so that a frustum is tested against the cells
+    and the visible GSs are gathered from the ranges of the visible cells. GSs
+    larger than a cell are tested on their own. The visible cells of cameras
+    rendered again, like the training cameras, are cached until the grid is
+    rebuilt.
+
+    The grid is built from the GSs at one time, with room for them to move by
+    `slack` cells and to grow by `slack` of their extent: `covers` checks that
+    they have not moved or grown further. It must be rebuilt when it does not
+    cover the GSs anymore, when GSs are added, removed or relocated, and is
+    rebuilt after `refresh_every` steps to keep the cells tight.
+
+    Args:
+        resolution (int): The number of cells along each axis.
+        refresh_every (int): The number of steps after which the grid is stale.
+        pixel_margin (float): Pixels added around the images, for the footprint
+            of the GSs rounded up and blurred by the rasterizer.
+        slack (float): The room left for the GSs to move, in cells, and to grow,
+            relative to their extent.
+    """
+
+    def __init__(
+        self,
+        resolution: int = 32,
+        refresh_every: int = 100,
+        pixel_margin: float = 3.0,
+        slack: float = 0.25,
+    ):
+        self.resolution = resolution
+        self.refresh_every = refresh_every
+        self.pixel_margin = pixel_margin
+        self.slack = slack
+        self.num_gaussians = None
+        self.age = 0
+        self.cache: Dict[Hashable, Tensor] = {}
+
+    def needs_rebuild(self, num_gaussians: int) -> bool:
+        return self.num_gaussians != num_gaussians or self.age >= self.refresh_every
+
+    def invalidate(self):
+        self.num_gaussians = None
+        self.cache.clear()
+
+    def tick(self):
+        """Ages the grid by one optimization step."""
+        self.age += 1
+
+    @torch.no_grad()
+    def covers(self, means: Tensor, scales: Tensor) -> bool:
+        """Returns whether the GSs are within the room left when the grid was built.
+
+        Args:
+            means (Tensor): The GS means [N, 3].
+            scales (Tensor): The GS scales [N, 3], not in log space.
+        """
+        moved = (means.detach().float() - self.built_means).abs().amax()
+        extents = GAUSSIAN_EXTENT * scales.detach().float().amax(-1)
+        grown = extents > self.built_extents * (1 + self.slack)
+        return bool((moved <= self.margin) & ~grown.any())
+
+    @torch.no_grad()
+    def build(self, means: Tensor, scales: Tensor):
+        """Builds the grid over the GSs.
+
+        Args:
+            means (Tensor): The GS means [N, 3].
+            scales (Tensor): The GS scales [N, 3], not in log space.
+        """
+        means = means.detach().float()
+        extents = GAUSSIAN_EXTENT * scales.detach().float().amax(-1)
+        res = self.resolution
+        self.built_means = means.clone()
+        self.built_extents = extents
+
+        # The grid spans most of the means, the others are in the border cells.
+        sample = means[:: max(len(means) // (1 << 16), 1)]
+        low = torch.quantile(sample, 0.01, dim=0)
+        high = torch.quantile(sample, 0.99, dim=0)
+        cell_size = ((high - low) / res).clamp_min(1e-6)
+        coords = ((means - low) / cell_size).floor().long().clamp(0, res - 1)
+        keys = (coords[:, 0] * res + coords[:, 1]) * res + coords[:, 2]
+        self.margin = self.slack * cell_size.min().item()
+        extents = extents * (1 + self.slack)
+
+        large = extents > cell_size.min()
+        self.large_ids = large.nonzero().squeeze(1)
+        self.large_lower = means[self.large_ids] - self.margin
+        self.large_upper = means[self.large_ids] + self.margin
+        self.large_extents = extents[self.large_ids]
+
+        ids = (~large).nonzero().squeeze(1)
+        keys, order = keys[ids].sort()
+        self.order = ids[order]
+        _, inverse, counts = torch.unique_consecutive(
+            keys, return_inverse=True, return_counts=True
+        )
+        self.counts = counts
+        self.starts = counts.cumsum(0) - counts
+
+        num_cells = len(counts)
+        sorted_means = means[self.order]
+        index = inverse[:, None].expand(-1, 3)
+        self.lower = means.new_full((num_cells, 3), float("inf"))
+        self.lower.scatter_reduce_(0, index, sorted_means, "amin")
+        self.upper = means.new_full((num_cells, 3), -float("inf"))
+        self.upper.scatter_reduce_(0, index, sorted_means, "amax")
+        self.lower -= self.margin
+        self.upper += self.margin
+        self.padding = means.new_zeros(num_cells)
+        self.padding.scatter_reduce_(0, inverse, extents[self.order], "amax")
+
+        self.num_gaussians = len(means)
+        self.age = 0
+        self.cache.clear()
+
+    @torch.no_grad()
+    def visible(
+        self,
+        camtoworlds: Tensor,
+        Ks: Tensor,
+        width: int,
+        height: int,
+        near_plane: float = 0.01,
+        far_plane: float = 1e10,
+        cache_keys: Optional[Sequence[Hashable]] = None,
+    ) -> Tensor:
+        """Returns the indices of the GSs that may be visible from any of the cameras.
+
+        Args:
+            camtoworlds (Tensor): The camera poses [C, 4, 4].
+            Ks (Tensor): The intrinsics [C, 3, 3].
+            width (int): The image width.
+            height (int): The image height.
+            near_plane (float): The depth of the near plane.
+            far_plane (float): The depth of the far plane.
+            cache_keys (Optional[Sequence[Hashable]]): Keys of the C cameras, to
+                cache their visible cells while the grid is not rebuilt.
+
+        Returns:
+            Tensor: The GS indices [V], not sorted.
+        """
+        if cache_keys is not None:
+            cache_keys = [
+                (key, width, height, near_plane, far_plane) for key in cache_keys
+            ]
+            missing = [i for i, key in enumerate(cache_keys) if key not in self.cache]
+        else:
+            missing = list(range(len(camtoworlds)))
+
+        masks = []
+        if missing:
+            planes = frustum_planes(
+                camtoworlds[missing].float(),
+                Ks[missing].float(),
+                width,
+                height,
+                near_plane,
+                far_plane,
+                self.pixel_margin,
+            )
+            cells = boxes_in_frustum(self.lower, self.upper, planes, self.padding)
+            large = boxes_in_frustum(
+                self.large_lower, self.large_upper, planes, self.large_extents
+            )
+            masks = list(torch.cat([cells, large], 1))
+            if cache_keys is not None:
+                for i, mask in zip(missing, masks):
+                    self.cache[cache_keys[i]] = mask
+        if cache_keys is not None:
+            masks = [self.cache[key] for key in cache_keys]
+        mask = torch.stack(masks).any(0)
+
+        num_cells = len(self.counts)
+        cells, large = mask[:num_cells], mask[num_cells:]
+        counts = self.counts[cells]
+        # The sorted positions of the GSs in the ranges of the visible cells
+        shifts = self.starts[cells] - (counts.cumsum(0) - counts)
+        positions = torch.arange(int(counts.sum()), device=counts.device)
+        positions += torch.repeat_interleave(shifts, counts)
+        return torch.cat([self.order[positions], self.large_ids[large]])
+
+
+def uncull_info(
+    info: Dict[str, Any], ids: Tensor, num_gaussians: int, packed: bool
+) -> Dict[str, Any]:
+    """Maps the rasterization info of the GSs `ids` back to all the GSs.
+
+    Call after backward: the 2D means of the culled GSs get zero gradients and
+    radii, as if they were rasterized without being seen, so that the
+    densification strategies and the sparse optimizers see all the GSs.
+
+    Args:
+        info (Dict[str, Any]): The info returned by the rasterization of `ids`.
+        ids (Tensor): The indices [V] of the rasterized GSs.
+        num_gaussians (int): The number of GSs.
+        packed (bool): Whether the rasterization was packed.
+    """
+    info = dict(info)
+    if packed:
+        info["gaussian_ids"] = ids[info["gaussian_ids"]]
+        return info
+
+    radii = info["radii"]  # [C, V, 2]
+    info["radii"] = radii.new_zeros((radii.shape[0], num_gaussians, *radii.shape[2:]))
+    info["radii"][:, ids] = radii
+
+    means2d = info["means2d"]  # [C, V, 2]
+    shape = (means2d.shape[0], num_gaussians, *means2d.shape[2:])
+    full_means2d = means2d.new_zeros(shape)
+    for name in ["grad", "absgrad"]:
+        grad = getattr(means2d, name, None)
+        if grad is not None:
+            full_grad = grad.new_zeros(shape)
+            full_grad[:, ids] = grad
+            setattr(full_means2d, name, full_grad)
+    info["means2d"] = full_means2d
+    return info
@@ -1,6 +1,9 @@
+import hashlib
 import json
 import os
-from typing import Any, Dict, List, Optional
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import cv2
 import imageio.v2 as imageio
@@ -11,6 +14,7 @@ from pycolmap_ext import SceneManager
 from tqdm import tqdm
 from typing_extensions import assert_never
 
+from easy_3dgs.pipeline.gaussian_splatting.datasets.image_cache import ImageCache
 from easy_3dgs.pipeline.gaussian_splatting.datasets.normalize import (
     align_principal_axes,
     similarity_from_cameras,
@@ -28,31 +32,94 @@ def _get_rel_paths(path_dir: str) -> List[str]:
     return paths
 
 
-def _resize_image_folder(image_dir: str, resized_dir: str, factor: int) -> str:
-    """Resize image folder."""
+def _resize_image(
+    image_path: str, resized_path: str, factor: int, png_compress_level: int
+):
+    """Resize a single image and write it atomically as a PNG."""
+    image = imageio.imread(image_path)[..., :3]
+    resized_size = (
+        int(round(image.shape[1] / factor)),
+        int(round(image.shape[0] / factor)),
+    )
+    resized_image = Image.fromarray(image).resize(resized_size, Image.BICUBIC)
+    # Write then rename, so an interrupted run never leaves a truncated PNG behind.
+    os.makedirs(os.path.dirname(resized_path), exist_ok=True)
+    tmp_path = f"{resized_path}.{os.getpid()}.tmp"
+    resized_image.save(tmp_path, format="PNG", compress_level=png_compress_level)
+    os.replace(tmp_path, resized_path)
+
+
+# Age after which a temporary file is considered left by an interrupted run.
+STALE_TMP_SECONDS = 3600
+
+
+def _is_stale(path: str) -> bool:
+    try:
+        return time.time() - os.path.getmtime(path) > STALE_TMP_SECONDS
+    except FileNotFoundError:
+        return False
+
+
+def _resize_image_folder(
+    image_dir: str,
+    resized_dir: str,
+    factor: int,
+    num_workers: Optional[int] = None,
+    png_compress_level: int = 6,
+) -> str:
+    """Resize image folder.
+
+    Images are resized by a pool of `num_workers` processes, each holding a single
+    image at a time. Images already present in `resized_dir` are skipped, so an
+    interrupted run resumes where it stopped. PNGs are lossless at every
+    `png_compress_level`; 1 is much faster to write than the default 6 and 0
+    disables compression entirely.
+    """
     print(f"Downscaling images by {factor}x from {image_dir} to {resized_dir}.")
     os.makedirs(resized_dir, exist_ok=True)
 
-    image_files = _get_rel_paths(image_dir)
-    for image_file in tqdm(image_files):
+    # Remove partial files left by interrupted runs. Recent ones may be written
+    # by another process resizing the same folder, so they are left alone.
+    for rel_path in _get_rel_paths(resized_dir):
+        tmp_path = os.path.join(resized_dir, rel_path)
+        if rel_path.endswith(".tmp") and _is_stale(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass  # Removed by another process meanwhile.
+
+    jobs = []
+    for image_file in _get_rel_paths(image_dir):
         image_path = os.path.join(image_dir, image_file)
         resized_path = os.path.join(
             resized_dir, os.path.splitext(image_file)[0] + ".png"
         )
         if os.path.isfile(resized_path):
             continue
-        image = imageio.imread(image_path)[..., :3]
-        resized_size = (
-            int(round(image.shape[1] / factor)),
-            int(round(image.shape[0] / factor)),
-        )
-        resized_image = np.array(
-            Image.fromarray(image).resize(resized_size, Image.BICUBIC)
-        )
-        imageio.imwrite(resized_path, resized_image)
+        jobs.append((image_path, resized_path))
+
+    num_workers = min(num_workers or os.cpu_count() or 1, max(len(jobs), 1))
+    if num_workers == 1:
+        for image_path, resized_path in tqdm(jobs):
+            _resize_image(image_path, resized_path, factor, png_compress_level)
+        return resized_dir
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [
+            executor.submit(
+                _resize_image, image_path, resized_path, factor, png_compress_level
+            )
+            for image_path, resized_path in jobs
+        ]
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            future.result()
     return resized_dir
 
 
+# Bump when the layout of the cached Parser state changes.
+PARSER_CACHE_VERSION = 3
+
+
 class Parser:
     """COLMAP parser."""
 
@@ -62,11 +129,15 @@ class Parser:
         factor: int = 1,
         normalize: bool = False,
         test_every: int = 8,
+        use_cache: bool = True,
+        png_compress_level: int = 6,
+        cache_dir: Optional[str] = None,
     ):
         self.data_dir = data_dir
         self.factor = factor
         self.normalize = normalize
         self.test_every = test_every
+        self.png_compress_level = png_compress_level
 
         colmap_dir = os.path.join(data_dir, "sparse/0/")
         if not os.path.exists(colmap_dir):
@@ -75,33 +146,131 @@ class Parser:
             colmap_dir
         ), f"COLMAP directory {colmap_dir} does not exist."
 
+        # Load extended metadata. Used by Bilarf dataset.
+        self.extconf = {
+            "spiral_radius_scale": 1.0,
+            "no_factor_suffix": False,
+        }
+        extconf_file = os.path.join(data_dir, "ext_metadata.json")
+        if os.path.exists(extconf_file):
+            with open(extconf_file) as f:
+                self.extconf.update(json.load(f))
+
+        # Load bounds if possible (only used in forward facing scenes).
+        self.bounds = np.array([0.01, 1.0])
+        posefile = os.path.join(data_dir, "poses_bounds.npy")
+        if os.path.exists(posefile):
+            self.bounds = np.load(posefile)[:, -2:]
+
+        # Load images.
+        if factor > 1 and not self.extconf["no_factor_suffix"]:
+            image_dir_suffix = f"_{factor}"
+        else:
+            image_dir_suffix = ""
+        colmap_image_dir = os.path.join(data_dir, "images")
+        image_dir = os.path.join(data_dir, "images" + image_dir_suffix)
+        for d in [image_dir, colmap_image_dir]:
+            if not os.path.exists(d):
+                raise ValueError(f"Image folder {d} does not exist.")
+
+        # The parsed scene is cached next to the COLMAP model, unless another
+        # directory is given.
+        cache_path = os.path.join(
+            cache_dir or os.path.dirname(os.path.normpath(colmap_dir)),
+            f"parser_cache_{factor}{'_normalized' if normalize else ''}.npz",
+        )
+        cache_key = _parser_cache_key(
+            [colmap_dir, image_dir], factor=factor, normalize=normalize
+        )
+        # Undistortion maps are cached on disk and memory-mapped on first use, next
+        # to the COLMAP model unless another directory is given.
+        self.map_cache_dir = os.path.join(
+            cache_dir or os.path.dirname(os.path.normpath(colmap_dir)),
+            "undistort_maps",
+        )
+        self._undistort_maps = dict()
+
+        state = _load_parser_cache(cache_path, cache_key) if use_cache else None
+        if state is None:
+            state = self._parse(colmap_dir, colmap_image_dir, image_dir)
+            if use_cache:
+                _save_parser_cache(cache_path, cache_key, state)
+        else:
+            print(f"[Parser] Loaded cached scene from {cache_path}.")
+        self.__dict__.update(state)
+
+        # Per-image views into the CSR point index.
+        offsets = self.point_index_offsets
+        self.point_indices = {
+            name: self.point_index_data[offsets[i] : offsets[i + 1]]
+            for i, name in enumerate(self.image_names)
+        }  # Dict[str, np.ndarray], image_name -> [M,]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Workers memory-map the maps themselves instead of receiving a copy.
+        state["_undistort_maps"] = dict()
+        return state
+
+    def undistort_maps(self, camera_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the fixed-point (CV_16SC2) undistortion maps of a camera.
+
+        The maps are computed the first time a camera is used and cached on disk,
+        so later launches and dataloader workers memory-map them instead. If the
+        cache directory is not writable, the maps are kept in memory.
+        """
+        maps = self._undistort_maps.get(camera_id)
+        if maps is None:
+            spec = self.undistort_dict[camera_id]
+            prefix = self._undistort_map_prefix(**spec)
+            if os.path.exists(prefix + "_map2.npy"):
+                maps = (
+                    np.load(prefix + "_map1.npy", mmap_mode="r"),
+                    np.load(prefix + "_map2.npy", mmap_mode="r"),
+                )
+            else:
+                mapx, mapy = _compute_undistort_maps(**spec)
+                maps = _save_undistort_maps(prefix, mapx, mapy)
+            self._undistort_maps[camera_id] = maps
+        return maps
+
+    def _undistort_map_prefix(
+        self,
+        camtype: str,
+        K: np.ndarray,
+        params: np.ndarray,
+        K_undist: np.ndarray,
+        size: Tuple[int, int],
+    ) -> str:
+        """Path prefix of the cached maps for these camera parameters."""
+        key = hashlib.sha1()
+        key.update(f"{camtype}:{size}:{self.factor}".encode())
+        for array in [K, params, K_undist]:
+            key.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+        return os.path.join(self.map_cache_dir, key.hexdigest())
+
+    def _parse(
+        self, colmap_dir: str, colmap_image_dir: str, image_dir: str
+    ) -> Dict[str, Any]:
+        """Parses the COLMAP model and returns the Parser state."""
+        factor = self.factor
+
         manager = SceneManager(colmap_dir)
         manager.load_cameras()
         manager.load_images()
         manager.load_points3D()
 
-        # Extract extrinsic matrices in world-to-camera format.
         imdata = manager.images
-        w2c_mats = []
-        camera_ids = []
+        if len(imdata) == 0:
+            raise ValueError("No images found in COLMAP.")
+
+        # Camera intrinsics and distortion parameters, once per camera.
         Ks_dict = dict()
         params_dict = dict()
         imsize_dict = dict()  # width, height
         mask_dict = dict()
-        bottom = np.array([0, 0, 0, 1]).reshape(1, 4)
-        for k in imdata:
-            im = imdata[k]
-            rot = im.R()
-            trans = im.tvec.reshape(3, 1)
-            w2c = np.concatenate([np.concatenate([rot, trans], 1), bottom], axis=0)
-            w2c_mats.append(w2c)
-
-            # support different camera intrinsics
-            camera_id = im.camera_id
-            camera_ids.append(camera_id)
-
-            # camera intrinsics
-            cam = manager.cameras[camera_id]
+        camtype_dict = dict()
+        for camera_id, cam in manager.cameras.items():
             fx, fy, cx, cy = cam.fx, cam.fy, cam.cx, cam.cy
             K = np.array([[fx, 0, cx], [0, fy, cy], [0, 0, 1]])
             K[:2, :] /= factor
@@ -134,23 +303,27 @@ class Parser:
             params_dict[camera_id] = params
             imsize_dict[camera_id] = (cam.width // factor, cam.height // factor)
             mask_dict[camera_id] = None
+            camtype_dict[camera_id] = camtype
+            if len(params) > 0:
+                print("Warning: COLMAP Camera is not PINHOLE. Images have distortion.")
+
+        # Extract extrinsic matrices in world-to-camera format.
+        image_ids = list(imdata.keys())
+        camera_ids = [imdata[k].camera_id for k in image_ids]
         print(
             f"[Parser] {len(imdata)} images, taken by {len(set(camera_ids))} cameras."
         )
-
-        if len(imdata) == 0:
-            raise ValueError("No images found in COLMAP.")
-        if not (type_ == 0 or type_ == 1):
-            print("Warning: COLMAP Camera is not PINHOLE. Images have distortion.")
-
-        w2c_mats = np.stack(w2c_mats, axis=0)
+        w2c_mats = np.zeros((len(image_ids), 4, 4))
+        w2c_mats[:, :3, :3] = np.stack([imdata[k].R() for k in image_ids])
+        w2c_mats[:, :3, 3] = np.stack([imdata[k].tvec for k in image_ids])
+        w2c_mats[:, 3, 3] = 1.0
 
         # Convert extrinsics to camera-to-world.
         camtoworlds = np.linalg.inv(w2c_mats)
 
         # Image names from COLMAP. No need for permuting the poses according to
         # image names anymore.
-        image_names = [imdata[k].name for k in imdata]
+        image_names = [imdata[k].name for k in image_ids]
 
         # Previous Nerf results were generated with images sorted by filename,
         # ensure metrics are reported on the same test set.
@@ -158,33 +331,7 @@ class Parser:
         image_names = [image_names[i] for i in inds]
         camtoworlds = camtoworlds[inds]
         camera_ids = [camera_ids[i] for i in inds]
-
-        # Load extended metadata. Used by Bilarf dataset.
-        self.extconf = {
-            "spiral_radius_scale": 1.0,
-            "no_factor_suffix": False,
-        }
-        extconf_file = os.path.join(data_dir, "ext_metadata.json")
-        if os.path.exists(extconf_file):
-            with open(extconf_file) as f:
-                self.extconf.update(json.load(f))
-
-        # Load bounds if possible (only used in forward facing scenes).
-        self.bounds = np.array([0.01, 1.0])
-        posefile = os.path.join(data_dir, "poses_bounds.npy")
-        if os.path.exists(posefile):
-            self.bounds = np.load(posefile)[:, -2:]
-
-        # Load images.
-        if factor > 1 and not self.extconf["no_factor_suffix"]:
-            image_dir_suffix = f"_{factor}"
-        else:
-            image_dir_suffix = ""
-        colmap_image_dir = os.path.join(data_dir, "images")
-        image_dir = os.path.join(data_dir, "images" + image_dir_suffix)
-        for d in [image_dir, colmap_image_dir]:
-            if not os.path.exists(d):
-                raise ValueError(f"Image folder {d} does not exist.")
+        image_ids = np.array(image_ids)[inds]
 
         # Downsampled images may have different names vs images used for COLMAP,
         # so we need to map between the two sorted lists of files.
@@ -192,30 +339,24 @@ class Parser:
         image_files = sorted(_get_rel_paths(image_dir))
         if factor > 1 and os.path.splitext(image_files[0])[1].lower() == ".jpg":
             image_dir = _resize_image_folder(
-                colmap_image_dir, image_dir + "_png", factor=factor
+                colmap_image_dir,
+                image_dir + "_png",
+                factor=factor,
+                png_compress_level=self.png_compress_level,
             )
             image_files = sorted(_get_rel_paths(image_dir))
         colmap_to_image = dict(zip(colmap_files, image_files))
         image_paths = [os.path.join(image_dir, colmap_to_image[f]) for f in image_names]
 
-        # 3D points and {image_name -> [point_idx]}
+        # 3D points and a CSR index {image -> [point_idx]} built from the flat
+        # (image, point) observations of every track.
         points = manager.points3D.astype(np.float32)
         points_err = manager.point3D_errors.astype(np.float32)
         points_rgb = manager.point3D_colors.astype(np.uint8)
-        point_indices = dict()
-
-        image_id_to_name = {v: k for k, v in manager.name_to_image_id.items()}
-        for point_id, data in manager.point3D_id_to_images.items():
-            for image_id, _ in data:
-                image_name = image_id_to_name[image_id]
-                point_idx = manager.point3D_id_to_point3D_idx[point_id]
-                point_indices.setdefault(image_name, []).append(point_idx)
-        point_indices = {
-            k: np.array(v).astype(np.int32) for k, v in point_indices.items()
-        }
+        point_index_data, point_index_offsets = _build_point_index(manager, image_ids)
 
         # Normalize the world space.
-        if normalize:
+        if self.normalize:
             T1 = similarity_from_cameras(camtoworlds)
             camtoworlds = transform_cameras(T1, camtoworlds)
             points = transform_points(T1, points)
@@ -245,78 +386,47 @@ class Parser:
         else:
             transform = np.eye(4)
 
-        self.image_names = image_names  # List[str], (num_images,)
-        self.image_paths = image_paths  # List[str], (num_images,)
-        self.camtoworlds = camtoworlds  # np.ndarray, (num_images, 4, 4)
-        self.camera_ids = camera_ids  # List[int], (num_images,)
-        self.Ks_dict = Ks_dict  # Dict of camera_id -> K
-        self.params_dict = params_dict  # Dict of camera_id -> params
-        self.imsize_dict = imsize_dict  # Dict of camera_id -> (width, height)
-        self.mask_dict = mask_dict  # Dict of camera_id -> mask
-        self.points = points  # np.ndarray, (num_points, 3)
-        self.points_err = points_err  # np.ndarray, (num_points,)
-        self.points_rgb = points_rgb  # np.ndarray, (num_points, 3)
-        self.point_indices = point_indices  # Dict[str, np.ndarray], image_name -> [M,]
-        self.transform = transform  # np.ndarray, (4, 4)
-
         # load one image to check the size. In the case of tanksandtemples dataset, the
         # intrinsics stored in COLMAP corresponds to 2x upsampled images.
-        actual_image = imageio.imread(self.image_paths[0])[..., :3]
+        actual_image = imageio.imread(image_paths[0])[..., :3]
         actual_height, actual_width = actual_image.shape[:2]
-        colmap_width, colmap_height = self.imsize_dict[self.camera_ids[0]]
+        colmap_width, colmap_height = imsize_dict[camera_ids[0]]
         s_height, s_width = actual_height / colmap_height, actual_width / colmap_width
-        for camera_id, K in self.Ks_dict.items():
+        for camera_id, K in Ks_dict.items():
             K[0, :] *= s_width
             K[1, :] *= s_height
-            self.Ks_dict[camera_id] = K
-            width, height = self.imsize_dict[camera_id]
-            self.imsize_dict[camera_id] = (int(width * s_width), int(height * s_height))
-
-        # undistortion
-        self.mapx_dict = dict()
-        self.mapy_dict = dict()
-        self.roi_undist_dict = dict()
-        for camera_id in self.params_dict.keys():
-            params = self.params_dict[camera_id]
+            Ks_dict[camera_id] = K
+            width, height = imsize_dict[camera_id]
+            imsize_dict[camera_id] = (int(width * s_width), int(height * s_height))
+
+        # undistortion, the maps themselves are computed lazily by `undistort_maps`
+        undistort_dict = dict()
+        roi_undist_dict = dict()
+        for camera_id in params_dict.keys():
+            params = params_dict[camera_id]
             if len(params) == 0:
                 continue  # no distortion
-            assert camera_id in self.Ks_dict, f"Missing K for camera {camera_id}"
-            assert (
-                camera_id in self.params_dict
-            ), f"Missing params for camera {camera_id}"
-            K = self.Ks_dict[camera_id]
-            width, height = self.imsize_dict[camera_id]
+            assert camera_id in Ks_dict, f"Missing K for camera {camera_id}"
+            assert camera_id in params_dict, f"Missing params for camera {camera_id}"
+            K = Ks_dict[camera_id]
+            width, height = imsize_dict[camera_id]
+            camtype = camtype_dict[camera_id]
 
             if camtype == "perspective":
                 K_undist, roi_undist = cv2.getOptimalNewCameraMatrix(
                     K, params, (width, height), 0
                 )
-                mapx, mapy = cv2.initUndistortRectifyMap(
-                    K, params, None, K_undist, (width, height), cv2.CV_32FC1
-                )
                 mask = None
             elif camtype == "fisheye":
-                fx = K[0, 0]
-                fy = K[1, 1]
-                cx = K[0, 2]
-                cy = K[1, 2]
-                grid_x, grid_y = np.meshgrid(
-                    np.arange(width, dtype=np.float32),
-                    np.arange(height, dtype=np.float32),
-                    indexing="xy",
+                # The ROI is defined by the maps, store them while we have them.
+                mapx, mapy = _compute_undistort_maps(
+                    camtype, K, params, K, (width, height)
                 )
-                x1 = (grid_x - cx) / fx
-                y1 = (grid_y - cy) / fy
-                theta = np.sqrt(x1**2 + y1**2)
-                r = (
-                    1.0
-                    + params[0] * theta**2
-                    + params[1] * theta**4
-                    + params[2] * theta**6
-                    + params[3] * theta**8
+                _save_undistort_maps(
+                    self._undistort_map_prefix(camtype, K, params, K, (width, height)),
+                    mapx,
+                    mapy,
                 )
-                mapx = (fx * x1 * r + width // 2).astype(np.float32)
-                mapy = (fy * y1 * r + height // 2).astype(np.float32)
 
                 # Use mask to define ROI
                 mask = np.logical_and(
@@ -334,18 +444,245 @@ class Parser:
             else:
                 assert_never(camtype)
 
-            self.mapx_dict[camera_id] = mapx
-            self.mapy_dict[camera_id] = mapy
-            self.Ks_dict[camera_id] = K_undist
-            self.roi_undist_dict[camera_id] = roi_undist
-            self.imsize_dict[camera_id] = (roi_undist[2], roi_undist[3])
-            self.mask_dict[camera_id] = mask
+            # For fisheye cameras the maps are computed with the original K.
+            undistort_dict[camera_id] = {
+                "camtype": camtype,
+                "K": K,
+                "params": params,
+                "K_undist": K_undist if camtype == "perspective" else K,
+                "size": (width, height),
+            }
+            Ks_dict[camera_id] = K_undist
+            roi_undist_dict[camera_id] = roi_undist
+            imsize_dict[camera_id] = (roi_undist[2], roi_undist[3])
+            mask_dict[camera_id] = mask
 
         # size of the scene measured by cameras
         camera_locations = camtoworlds[:, :3, 3]
         scene_center = np.mean(camera_locations, axis=0)
         dists = np.linalg.norm(camera_locations - scene_center, axis=1)
-        self.scene_scale = np.max(dists)
+        scene_scale = np.max(dists)
+
+        return {
+            "image_names": image_names,  # List[str], (num_images,)
+            "image_paths": image_paths,  # List[str], (num_images,)
+            "camtoworlds": camtoworlds,  # np.ndarray, (num_images, 4, 4)
+            "camera_ids": camera_ids,  # List[int], (num_images,)
+            "Ks_dict": Ks_dict,  # Dict of camera_id -> K
+            "params_dict": params_dict,  # Dict of camera_id -> params
+            "imsize_dict": imsize_dict,  # Dict of camera_id -> (width, height)
+            "mask_dict": mask_dict,  # Dict of camera_id -> mask
+            "camtype_dict": camtype_dict,  # Dict of camera_id -> camera type
+            "points": points,  # np.ndarray, (num_points, 3)
+            "points_err": points_err,  # np.ndarray, (num_points,)
+            "points_rgb": points_rgb,  # np.ndarray, (num_points, 3)
+            "point_index_data": point_index_data,  # np.ndarray, (num_observations,)
+            "point_index_offsets": point_index_offsets,  # np.ndarray, (num_images + 1,)
+            "transform": transform,  # np.ndarray, (4, 4)
+            "undistort_dict": undistort_dict,  # Dict of camera_id -> map inputs
+            "roi_undist_dict": roi_undist_dict,  # Dict of camera_id -> roi
+            "scene_scale": scene_scale,  # float
+        }
+
+
+def _compute_undistort_maps(
+    camtype: str,
+    K: np.ndarray,
+    params: np.ndarray,
+    K_undist: np.ndarray,
+    size: Tuple[int, int],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Computes the float32 undistortion maps of a camera."""
+    width, height = size
+    if camtype == "perspective":
+        mapx, mapy = cv2.initUndistortRectifyMap(
+            K, params, None, K_undist, (width, height), cv2.CV_32FC1
+        )
+    elif camtype == "fisheye":
+        fx = K[0, 0]
+        fy = K[1, 1]
+        cx = K[0, 2]
+        cy = K[1, 2]
+        grid_x, grid_y = np.meshgrid(
+            np.arange(width, dtype=np.float32),
+            np.arange(height, dtype=np.float32),
+            indexing="xy",
+        )
+        x1 = (grid_x - cx) / fx
+        y1 = (grid_y - cy) / fy
+        theta = np.sqrt(x1**2 + y1**2)
+        r = (
+            1.0
+            + params[0] * theta**2
+            + params[1] * theta**4
+            + params[2] * theta**6
+            + params[3] * theta**8
+        )
+        mapx = (fx * x1 * r + width // 2).astype(np.float32)
+        mapy = (fy * y1 * r + height // 2).astype(np.float32)
+    else:
+        assert_never(camtype)
+    return mapx, mapy
+
+
+def _save_undistort_maps(
+    prefix: str, mapx: np.ndarray, mapy: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Converts the maps to the compact CV_16SC2 format and writes them atomically.
+
+    Returns the converted maps, which are only kept in memory if they cannot be
+    written (e.g. on a read-only dataset).
+    """
+    map1, map2 = cv2.convertMaps(mapx, mapy, cv2.CV_16SC2)
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(prefix), exist_ok=True)
+        # map2 is written last, its presence marks a complete entry.
+        for suffix, array in [("_map1.npy", map1), ("_map2.npy", map2)]:
+            tmp_path = f"{prefix}{suffix}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, prefix + suffix)
+    except OSError as e:
+        print(f"[Parser] Cannot cache the undistortion maps at {prefix}: {e}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return map1, map2
+
+
+def _build_point_index(manager: SceneManager, image_ids: np.ndarray):
+    """Builds a CSR index of the points observed by each image.
+
+    Args:
+        manager: The loaded COLMAP scene.
+        image_ids: (num_images,) COLMAP image ids in Parser order.
+
+    Returns:
+        data: (num_observations,) int32 point indices, grouped by image.
+        offsets: (num_images + 1,) int64, the points of image i are
+            data[offsets[i] : offsets[i + 1]].
+    """
+    tracks = list(manager.point3D_id_to_images.items())
+    if len(tracks) == 0:
+        return np.empty(0, np.int32), np.zeros(len(image_ids) + 1, np.int64)
+
+    # Flat (image_id, point_idx) arrays over every observation.
+    track_point_idx = np.fromiter(
+        (manager.point3D_id_to_point3D_idx[point_id] for point_id, _ in tracks),
+        dtype=np.int64,
+        count=len(tracks),
+    )
+    track_lengths = np.fromiter(
+        (len(data) for _, data in tracks), dtype=np.int64, count=len(tracks)
+    )
+    obs_image_ids = np.concatenate(
+        [np.asarray(data).reshape(-1, 2)[:, 0] for _, data in tracks]
+    )
+    obs_point_idx = np.repeat(track_point_idx, track_lengths)
+
+    # Map COLMAP image ids to their position in image_ids.
+    id_order = np.argsort(image_ids)
+    pos = np.searchsorted(image_ids, obs_image_ids, sorter=id_order)
+    pos = np.clip(pos, 0, len(image_ids) - 1)
+    obs_image_pos = id_order[pos]
+    valid = image_ids[obs_image_pos] == obs_image_ids
+    obs_image_pos, obs_point_idx = obs_image_pos[valid], obs_point_idx[valid]
+
+    # Stable sort keeps the track order within each image.
+    sort = np.argsort(obs_image_pos, kind="stable")
+    data = obs_point_idx[sort].astype(np.int32)
+    offsets = np.zeros(len(image_ids) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(obs_image_pos, minlength=len(image_ids)))
+    return data, offsets
+
+
+def _parser_cache_key(dirs: List[str], **kwargs) -> str:
+    """Hashes the cache version, Parser options and the files of `dirs`."""
+    entries = [PARSER_CACHE_VERSION, sorted(kwargs.items())]
+    for d in dirs:
+        for rel_path in sorted(_get_rel_paths(d)):
+            if rel_path.startswith("parser_cache_"):
+                continue
+            stat = os.stat(os.path.join(d, rel_path))
+            entries.append([rel_path, stat.st_size, stat.st_mtime_ns])
+    return hashlib.sha1(json.dumps(entries).encode()).hexdigest()
+
+
+def _load_parser_cache(cache_path: str, cache_key: str) -> Optional[Dict[str, Any]]:
+    """Loads a Parser state saved by `_save_parser_cache`, or None if stale."""
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with np.load(cache_path, allow_pickle=False) as cache:
+            if str(cache["__key__"]) != cache_key:
+                return None
+            state = _decode_state(json.loads(str(cache["__meta__"])), cache)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[Parser] Ignoring unreadable cache {cache_path}: {e}")
+        return None
+    if not all(os.path.exists(path) for path in state["image_paths"]):
+        return None
+    return state
+
+
+def _save_parser_cache(cache_path: str, cache_key: str, state: Dict[str, Any]):
+    """Writes the Parser state atomically: arrays as npz entries, the rest as JSON.
+
+    Nothing is pickled, so that loading a cache cannot run code. The cache is
+    skipped if it cannot be written (e.g. on a read-only dataset).
+    """
+    arrays = {}
+    meta = json.dumps(_encode_state(state, arrays))
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            np.savez(f, __key__=np.array(cache_key), __meta__=np.array(meta), **arrays)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"[Parser] Cannot write the cache {cache_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _encode_state(value: Any, arrays: Dict[str, np.ndarray]) -> Any:
+    """Converts `value` to JSON, moving its arrays to `arrays`.
+
+    Arrays are replaced by their name in `arrays`, and dicts and tuples are
+    tagged so that `_decode_state` restores their keys and types.
+    """
+    if isinstance(value, np.ndarray):
+        name = str(len(arrays))
+        arrays[name] = value
+        return {"array": name}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        items = [
+            [_encode_state(k, arrays), _encode_state(v, arrays)]
+            for k, v in value.items()
+        ]
+        return {"dict": items}
+    if isinstance(value, tuple):
+        return {"tuple": [_encode_state(v, arrays) for v in value]}
+    if isinstance(value, list):
+        return [_encode_state(v, arrays) for v in value]
+    return value
+
+
+def _decode_state(value: Any, arrays: Any) -> Any:
+    """Inverse of `_encode_state`, reading the arrays from the npz `arrays`."""
+    if isinstance(value, list):
+        return [_decode_state(v, arrays) for v in value]
+    if isinstance(value, dict):
+        if "array" in value:
+            return arrays[value["array"]]
+        if "tuple" in value:
+            return tuple(_decode_state(v, arrays) for v in value["tuple"])
+        return {
+            _decode_state(k, arrays): _decode_state(v, arrays) for k, v in value["dict"]
+        }
+    return value
 
 
 class Dataset:
@@ -357,6 +694,11 @@ class Dataset:
         split: str = "train",
         patch_size: Optional[int] = None,
         load_depths: bool = False,
+        cache_images: bool = False,
+        cache_ram_gb: float = 8.0,
+        cache_disk_gb: float = 32.0,
+        cache_dir: Optional[str] = None,
+        image_indices: Optional[Sequence[int]] = None,
     ):
         self.parser = parser
         self.split = split
@@ -367,29 +709,57 @@ class Dataset:
             self.indices = indices[indices % self.parser.test_every != 0]
         else:
             self.indices = indices[indices % self.parser.test_every == 0]
+        if image_indices is not None:
+            # Only the images of a spatial cell, see `blocks.partition_scene`.
+            self.indices = self.indices[np.isin(self.indices, image_indices)]
+
+        # Decoded, undistorted and cropped images shared by the dataloader workers.
+        self.image_cache = None
+        if cache_images:
+            image_shapes = []
+            for index in self.indices:
+                width, height = self.parser.imsize_dict[self.parser.camera_ids[index]]
+                image_shapes.append((height, width, 3))
+            self.image_cache = ImageCache(
+                image_shapes,
+                ram_budget=cache_ram_gb * 1024**3,
+                disk_budget=cache_disk_gb * 1024**3,
+                cache_dir=cache_dir or os.path.join(parser.data_dir, "cache"),
+            )
 
     def __len__(self):
         return len(self.indices)
 
-    def __getitem__(self, item: int) -> Dict[str, Any]:
+    def _load_image(self, item: int) -> np.ndarray:
+        """Decodes and undistorts image `item`, going through the image cache."""
+        if self.image_cache is not None:
+            image = self.image_cache.get(item)
+            if image is not None:
+                return image
+
         index = self.indices[item]
         image = imageio.imread(self.parser.image_paths[index])[..., :3]
         camera_id = self.parser.camera_ids[index]
-        K = self.parser.Ks_dict[camera_id].copy()  # undistorted K
         params = self.parser.params_dict[camera_id]
-        camtoworlds = self.parser.camtoworlds[index]
-        mask = self.parser.mask_dict[camera_id]
-
         if len(params) > 0:
             # Images are distorted. Undistort them.
-            mapx, mapy = (
-                self.parser.mapx_dict[camera_id],
-                self.parser.mapy_dict[camera_id],
-            )
-            image = cv2.remap(image, mapx, mapy, cv2.INTER_LINEAR)
+            map1, map2 = self.parser.undistort_maps(camera_id)
+            image = cv2.remap(image, map1, map2, cv2.INTER_LINEAR)
             x, y, w, h = self.parser.roi_undist_dict[camera_id]
             image = image[y : y + h, x : x + w]
 
+        if self.image_cache is not None:
+            self.image_cache.put(item, np.ascontiguousarray(image))
+        return image
+
+    def __getitem__(self, item: int) -> Dict[str, Any]:
+        index = self.indices[item]
+        image = self._load_image(item)
+        camera_id = self.parser.camera_ids[index]
+        K = self.parser.Ks_dict[camera_id].copy()  # undistorted K
+        camtoworlds = self.parser.camtoworlds[index]
+        mask = self.parser.mask_dict[camera_id]
+
         if self.patch_size is not None:
             # Random crop.
             h, w = image.shape[:2]
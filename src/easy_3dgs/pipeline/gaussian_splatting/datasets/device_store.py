@@ -0,0 +1,169 @@
+from typing import Any, Dict, Iterator, Optional, Union
+
+import numpy as np
+import torch
+from tqdm import tqdm
+
+from easy_3dgs.pipeline.gaussian_splatting.datasets.colmap import Dataset
+
+
+class DeviceImageStore:
+    """All frames of a dataset held in a single uint8 tensor on one device.
+
+    Iterating over the store yields shuffled batches with the same keys as a
+    `torch.utils.data.DataLoader` over the dataset, but sampling, random patch
+    crops and the sparse depth projection all run on the store's device, without
+    worker processes or per-step host-to-device copies. With `device="cpu"` the
+    same layout is kept in host memory.
+    """
+
+    def __init__(
+        self,
+        dataset: Dataset,
+        batch_size: int = 1,
+        device: Union[str, torch.device] = "cuda",
+        generator: Optional[torch.Generator] = None,
+        sampler: Optional[torch.utils.data.Sampler] = None,
+    ):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.device = torch.device(device)
+        self.generator = generator
+        # Sets the order of the items when given, e.g. to resume an epoch.
+        self.sampler = sampler
+        parser = dataset.parser
+        indices = dataset.indices
+
+        sizes = {parser.imsize_dict[parser.camera_ids[i]] for i in indices}
+        if len(sizes) > 1:
+            raise ValueError(
+                f"DeviceImageStore needs images of a single size, got {sorted(sizes)}."
+            )
+        width, height = sizes.pop()
+
+        images = torch.empty(
+            (len(indices), height, width, 3), dtype=torch.uint8, device=self.device
+        )
+        for item in tqdm(range(len(indices)), desc=f"Loading images to {device}"):
+            image = dataset._load_image(item)
+            images[item] = torch.from_numpy(np.ascontiguousarray(image)).to(
+                self.device
+            )
+        self.images = images  # [N, H, W, 3]
+        print(
+            f"[DeviceImageStore] {len(indices)} images "
+            f"({images.numel() / 1024**3:.2f} GB) on {self.device}."
+        )
+
+        self.Ks = torch.from_numpy(
+            np.stack([parser.Ks_dict[parser.camera_ids[i]] for i in indices])
+        ).float().to(self.device)  # [N, 3, 3]
+        self.camtoworlds = torch.from_numpy(parser.camtoworlds[indices]).float().to(
+            self.device
+        )  # [N, 4, 4]
+        masks = [parser.mask_dict[parser.camera_ids[i]] for i in indices]
+        self.masks = None
+        if any(mask is not None for mask in masks):
+            self.masks = torch.from_numpy(
+                np.stack(
+                    [
+                        mask if mask is not None else np.ones((height, width), bool)
+                        for mask in masks
+                    ]
+                )
+            ).to(self.device)  # [N, H, W]
+
+        # Sparse points seen by every image, stored CSR-style.
+        self.points = None
+        if dataset.load_depths:
+            point_indices = [
+                parser.point_indices.get(parser.image_names[i], np.empty(0, np.int32))
+                for i in indices
+            ]
+            offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(p) for p in point_indices])
+            self.points = torch.from_numpy(parser.points).float().to(self.device)
+            self.point_offsets = offsets
+            self.point_indices = torch.from_numpy(
+                np.concatenate(point_indices).astype(np.int64)
+            ).to(self.device)
+
+    def __len__(self) -> int:
+        num_items = len(self.sampler) if self.sampler is not None else len(self.images)
+        return (num_items + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        if self.sampler is not None:
+            perm = torch.tensor(list(self.sampler), dtype=torch.int64)
+        else:
+            perm = torch.randperm(len(self.images), generator=self.generator)
+        perm = perm.to(self.device)
+        for start in range(0, len(perm), self.batch_size):
+            yield self.get_batch(perm[start : start + self.batch_size])
+
+    def get_batch(self, image_ids: torch.Tensor) -> Dict[str, Any]:
+        """Gathers the batch of dataset items `image_ids` on the store's device."""
+        images = self.images[image_ids]  # [B, H, W, 3]
+        Ks = self.Ks[image_ids].clone()  # [B, 3, 3]
+        masks = self.masks[image_ids] if self.masks is not None else None
+
+        patch_size = self.dataset.patch_size
+        if patch_size is not None:
+            # Random crop, one offset per image.
+            B, h, w = images.shape[:3]
+            x = torch.randint(
+                0, max(w - patch_size, 1), (B,), generator=self.generator
+            ).to(self.device)
+            y = torch.randint(
+                0, max(h - patch_size, 1), (B,), generator=self.generator
+            ).to(self.device)
+            offsets = torch.arange(patch_size, device=self.device)
+            ys = (y[:, None] + offsets).clamp(max=h - 1)[:, :, None]  # [B, P, 1]
+            xs = (x[:, None] + offsets).clamp(max=w - 1)[:, None, :]  # [B, 1, P]
+            batch = torch.arange(B, device=self.device)[:, None, None]
+            images = images[batch, ys, xs]
+            if masks is not None:
+                masks = masks[batch, ys, xs]
+            Ks[:, 0, 2] -= x
+            Ks[:, 1, 2] -= y
+
+        data = {
+            "K": Ks,
+            "camtoworld": self.camtoworlds[image_ids],
+            "image": images.float(),
+            "image_id": image_ids,
+        }
+        if masks is not None:
+            data["mask"] = masks
+
+        if self.points is not None:
+            assert len(image_ids) == 1, "Depth loss only supports a batch size of 1."
+            item = int(image_ids[0])
+            start, end = self.point_offsets[item], self.point_offsets[item + 1]
+            points, depths = self._project_points(
+                self.point_indices[start:end],
+                torch.linalg.inv(data["camtoworld"][0]),
+                Ks[0],
+                images.shape[2],
+                images.shape[1],
+            )
+            data["points"] = points[None]
+            data["depths"] = depths[None]
+        return data
+
+    def _project_points(self, point_indices, worldtocam, K, width, height):
+        """Projects the sparse points seen by an image, as in `Dataset.__getitem__`."""
+        points_world = self.points[point_indices]  # [M, 3]
+        points_cam = points_world @ worldtocam[:3, :3].T + worldtocam[:3, 3]
+        points_proj = points_cam @ K.T
+        points = points_proj[:, :2] / points_proj[:, 2:3]  # [M, 2]
+        depths = points_cam[:, 2]  # [M,]
+        # filter out points outside the image
+        selector = (
+            (points[:, 0] >= 0)
+            & (points[:, 0] < width)
+            & (points[:, 1] >= 0)
+            & (points[:, 1] < height)
+            & (depths > 0)
+        )
+        return points[selector], depths[selector]
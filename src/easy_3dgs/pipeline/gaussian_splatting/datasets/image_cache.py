@@ -0,0 +1,146 @@
+import multiprocessing
+import os
+import weakref
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+
+
+class ImageCache:
+    """Decoded image cache shared zero-copy by the DataLoader workers.
+
+    Images are stored as uint8 arrays in fixed-size slots of a single buffer. The
+    buffer lives in shared memory when the whole dataset fits into `ram_budget`
+    bytes, otherwise in a memory-mapped file under `cache_dir` holding at most
+    `disk_budget` bytes, in which case the least recently used images are evicted.
+    The slot table is kept in shared tensors guarded by a process lock, so images
+    decoded by one worker are visible to every other worker. The file is removed
+    by `close`, or once the cache is garbage collected or the process exits.
+    """
+
+    def __init__(
+        self,
+        image_shapes: Sequence[Tuple[int, int, int]],
+        ram_budget: float,
+        disk_budget: float,
+        cache_dir: Optional[str] = None,
+    ):
+        n = len(image_shapes)
+        self.slot_size = max(int(np.prod(shape)) for shape in image_shapes)
+        self.path = None
+        self._finalizer = None
+        if n * self.slot_size <= ram_budget:
+            self.num_slots = n
+            self.buffer = torch.empty(n * self.slot_size, dtype=torch.uint8)
+            self.buffer.share_memory_()
+            print(f"[ImageCache] Caching {n} images in RAM.")
+        else:
+            assert cache_dir is not None, "A cache directory is needed on disk."
+            self.num_slots = min(n, int(disk_budget // self.slot_size))
+            os.makedirs(cache_dir, exist_ok=True)
+            self.path = os.path.join(cache_dir, f"images_{os.getpid()}_{id(self)}.bin")
+            self._open_file(create=True)
+            self._finalizer = weakref.finalize(
+                self, _remove_file, self.path, os.getpid()
+            )
+            print(
+                f"[ImageCache] Caching {self.num_slots}/{n} images on disk "
+                f"at {self.path}."
+            )
+        # Evict only when the slots cannot hold every image.
+        self.evict = self.num_slots < n
+
+        self.shapes = torch.tensor(image_shapes, dtype=torch.int64).share_memory_()
+        self.slot_of_image = torch.full((n,), -1, dtype=torch.int64).share_memory_()
+        self.image_of_slot = torch.full(
+            (self.num_slots,), -1, dtype=torch.int64
+        ).share_memory_()
+        self.last_used = torch.zeros(self.num_slots, dtype=torch.int64).share_memory_()
+        self.clock = torch.zeros(1, dtype=torch.int64).share_memory_()
+        self.lock = multiprocessing.Lock()
+
+    def _open_file(self, create: bool = False):
+        nbytes = self.num_slots * self.slot_size
+        if create:
+            with open(self.path, "wb") as f:
+                f.truncate(nbytes)
+        self.buffer = torch.from_file(
+            self.path, shared=True, size=nbytes, dtype=torch.uint8
+        )
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Only the process which created the file removes it.
+        state["_finalizer"] = None
+        if self.path is not None:
+            # Re-map the file in the worker instead of pickling its content.
+            del state["buffer"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.path is not None:
+            self._open_file()
+
+    def __len__(self) -> int:
+        return int((self.slot_of_image >= 0).sum())
+
+    def _view(self, slot: int, index: int) -> np.ndarray:
+        shape = tuple(self.shapes[index].tolist())
+        start = slot * self.slot_size
+        data = self.buffer[start : start + int(np.prod(shape))]
+        return data.numpy().reshape(shape)
+
+    def get(self, index: int) -> Optional[np.ndarray]:
+        """Returns the cached image `index` or None on a miss."""
+        if not self.evict:
+            # Slots are never reused, the image can be read without a copy.
+            if self.slot_of_image[index] < 0:
+                return None
+            return self._view(index, index)
+        with self.lock:
+            slot = int(self.slot_of_image[index])
+            if slot < 0:
+                return None
+            self.clock += 1
+            self.last_used[slot] = self.clock
+            return self._view(slot, index).copy()
+
+    def put(self, index: int, image: np.ndarray):
+        """Stores image `index`, evicting the least recently used one if needed."""
+        if image.dtype != np.uint8 or image.size > self.slot_size:
+            return
+        if not self.evict:
+            self.shapes[index] = torch.tensor(image.shape)
+            self._view(index, index)[...] = image
+            self.slot_of_image[index] = index
+            return
+        with self.lock:
+            if self.slot_of_image[index] >= 0:
+                return
+            if self.num_slots == 0:
+                return
+            free = torch.nonzero(self.image_of_slot < 0)
+            if len(free) > 0:
+                slot = int(free[0])
+            else:
+                slot = int(torch.argmin(self.last_used))
+                self.slot_of_image[self.image_of_slot[slot]] = -1
+            self.shapes[index] = torch.tensor(image.shape)
+            self._view(slot, index)[...] = image
+            self.clock += 1
+            self.last_used[slot] = self.clock
+            self.image_of_slot[slot] = index
+            self.slot_of_image[index] = slot
+
+    def close(self):
+        """Removes the on-disk cache file, if any."""
+        if self._finalizer is not None:
+            self._finalizer()
+
+
+def _remove_file(path: str, owner_pid: int):
+    # Forked workers inherit the finalizer of their parent.
+    if os.getpid() == owner_pid and os.path.exists(path):
+        os.remove(path)
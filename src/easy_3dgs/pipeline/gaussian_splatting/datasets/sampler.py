@@ -0,0 +1,60 @@
+from typing import Iterator, List
+
+import torch
+
+
+class ResumableRandomSampler(torch.utils.data.Sampler):
+    """Shuffles the dataset with a permutation seeded by `seed` and the epoch.
+
+    Every call to `__iter__` starts a new epoch. The order of an epoch only
+    depends on the seed and its number, so training can be resumed in the middle
+    of an epoch with `set_position`.
+    """
+
+    def __init__(self, num_items: int, seed: int = 0):
+        self.num_items = num_items
+        self.seed = seed
+        self.epoch = 0
+        self.start = 0
+
+    def set_position(self, epoch: int, start: int):
+        """Makes the next epoch be `epoch`, skipping its first `start` items."""
+        self.epoch = epoch
+        self.start = start
+
+    def __len__(self) -> int:
+        return self.num_items - self.start
+
+    def __iter__(self) -> Iterator[int]:
+        generator = torch.Generator()
+        generator.manual_seed(self.seed + self.epoch)
+        perm = torch.randperm(self.num_items, generator=generator).tolist()
+        start = self.start
+        self.epoch += 1
+        self.start = 0
+        return iter(perm[start:])
+
+
+class CameraBatchSampler(torch.utils.data.Sampler):
+    """Batches the items of a `Dataset` taken by the same camera.
+
+    The images of a camera share their resolution, intrinsics and mask, so each
+    batch can be stacked and rendered by a single rasterization call. Items keep
+    their order within a camera.
+    """
+
+    def __init__(self, dataset, batch_size: int):
+        self.batches = []
+        items_by_camera = {}
+        for item, index in enumerate(dataset.indices):
+            camera_id = dataset.parser.camera_ids[index]
+            items_by_camera.setdefault(camera_id, []).append(item)
+        for items in items_by_camera.values():
+            for start in range(0, len(items), batch_size):
+                self.batches.append(items[start : start + batch_size])
+
+    def __len__(self) -> int:
+        return len(self.batches)
+
+    def __iter__(self) -> Iterator[List[int]]:
+        return iter(self.batches)
@@ -0,0 +1,387 @@
+import json
+import math
+from typing import Dict, Literal, Tuple, Union
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch import Tensor
+
+EXTENSIONS = {"ply": ".ply", "compact": ".csplat"}
+SPLAT_KEYS = ["means", "scales", "quats", "opacities", "sh0", "shN"]
+
+COMPACT_MAGIC = b"CSPLAT1\n"
+# Ranges of the quantized log scales and opacity logits. Beyond them, GSs are
+# either invisible or fully opaque.
+MAX_LOG_SCALE_RANGE = 16.0
+OPACITY_LOGIT_RANGE = (-10.0, 10.0)
+
+
+def write_splats(
+    path: str,
+    splats: Dict[str, Tensor],
+    format: Literal["ply", "compact"] = "ply",
+    means_dtype: Literal["float32", "float16"] = "float32",
+    chunk_size: int = 1 << 18,
+):
+    """Writes the splats to `path`, streaming them by chunks of `chunk_size` GSs.
+
+    Only a chunk is converted at a time, on the device of the splats. GSs with
+    non-finite values are skipped, like `gsplat.export_splats` does.
+
+    The "ply" format is the standard 3DGS PLY file, with float32 properties. The
+    "compact" format stores each property contiguously after a JSON header: the
+    means as `means_dtype`, the log scales and opacity logits as 8 bits over
+    their range, the normalized quaternions as 8 bits, and the SH coefficients as
+    8 bits over the range of their band. Both are read by `read_splats`.
+
+    Args:
+        path (str): The output file.
+        splats (Dict[str, Tensor]): The means [N, 3], scales [N, 3], quats [N, 4],
+            opacities [N], sh0 [N, 1, 3] and shN [N, K, 3].
+        format (Literal["ply", "compact"]): The file format.
+        means_dtype (Literal["float32", "float16"]): The dtype of the means in the
+            compact format.
+        chunk_size (int): The number of GSs converted at a time.
+    """
+    if format not in EXTENSIONS:
+        raise ValueError(f"Unknown splat format: {format}")
+    splats = {k: splats[k].detach() for k in SPLAT_KEYS}
+    valid, ranges = _scan(splats, chunk_size, with_ranges=format == "compact")
+    num_valid = int(valid.sum())
+    num_sh = 1 + splats["shN"].shape[1]
+
+    with open(path, "wb") as f:
+        if format == "ply":
+            f.write(_ply_header(num_valid, num_sh).encode())
+            for chunk in _valid_chunks(splats, valid, chunk_size):
+                rows = torch.cat(
+                    [
+                        chunk["means"],
+                        chunk["sh"][:, 0],
+                        # f_rest properties are channel-major
+                        chunk["sh"][:, 1:].transpose(1, 2).flatten(1),
+                        chunk["opacities"][:, None],
+                        chunk["scales"],
+                        chunk["quats"],
+                    ],
+                    dim=1,
+                )
+                f.write(rows.cpu().numpy().astype("<f4").tobytes())
+            return
+
+        sections = {
+            "means": (means_dtype, [3]),
+            "scales": ("uint8", [3]),
+            "opacities": ("uint8", []),
+            "quats": ("int8", [4]),
+            "sh": ("uint8", [num_sh, 3]),
+        }
+        header = {
+            "num_gaussians": num_valid,
+            "ranges": ranges,
+            "sections": {},
+        }
+        # Sections start after the header, 64-byte aligned.
+        offset = 0
+        for name, (dtype, shape) in sections.items():
+            header["sections"][name] = {
+                "offset": offset,
+                "dtype": dtype,
+                "shape": shape,
+            }
+            row_bytes = np.dtype(dtype).itemsize * math.prod(shape)
+            offset += _align(num_valid * row_bytes)
+        header_bytes = json.dumps(header).encode()
+        data_offset = _align(len(COMPACT_MAGIC) + 4 + len(header_bytes))
+        f.write(COMPACT_MAGIC)
+        f.write(np.uint32(len(header_bytes)).astype("<u4").tobytes())
+        f.write(header_bytes)
+
+        written = 0
+        for chunk in _valid_chunks(splats, valid, chunk_size):
+            for name, array in _quantize(chunk, ranges, means_dtype).items():
+                section = header["sections"][name]
+                row_bytes = array[0].nbytes if len(array) else 0
+                f.seek(data_offset + section["offset"] + written * row_bytes)
+                f.write(array.tobytes())
+            written += len(chunk["means"])
+        f.truncate(data_offset + offset)
+
+
+def read_splats(
+    path: str,
+    device: Union[str, torch.device] = "cpu",
+    chunk_size: int = 1 << 18,
+) -> Dict[str, Tensor]:
+    """Loads splats written by `write_splats`, or by `gsplat.export_splats` as PLY.
+
+    The file is memory-mapped and decoded by chunks of `chunk_size` GSs straight
+    into float32 tensors on `device`, so the host never holds the whole scene
+    besides the page cache.
+
+    Args:
+        path (str): The PLY or compact file.
+        device (Union[str, torch.device]): The device of the returned tensors.
+        chunk_size (int): The number of GSs decoded at a time.
+
+    Returns:
+        Dict[str, Tensor]: The means, scales, quats, opacities, sh0 and shN.
+    """
+    with open(path, "rb") as f:
+        is_compact = f.read(len(COMPACT_MAGIC)) == COMPACT_MAGIC
+    if is_compact:
+        return _read_compact(path, device, chunk_size)
+    return _read_ply(path, device, chunk_size)
+
+
+def _scan(
+    splats: Dict[str, Tensor], chunk_size: int, with_ranges: bool
+) -> Tuple[Tensor, dict]:
+    """Returns which GSs are finite and, if `with_ranges`, the quantization ranges."""
+    num_gs = len(splats["means"])
+    valid = torch.empty(num_gs, dtype=torch.bool, device=splats["means"].device)
+    lows = {}
+    highs = {}
+    for start in range(0, num_gs, chunk_size):
+        chunk = _chunk(splats, slice(start, start + chunk_size))
+        is_finite = torch.stack(
+            [torch.isfinite(v.reshape(len(v), -1)).all(1) for v in chunk.values()]
+        ).all(0)
+        valid[start : start + chunk_size] = is_finite
+        if not with_ranges:
+            continue
+        for name, dims in [("scales", 0), ("sh", (0, 2))]:
+            mask = is_finite.view(-1, *[1] * (chunk[name].dim() - 1))
+            low = torch.where(mask, chunk[name], math.inf).amin(dim=dims)
+            high = torch.where(mask, chunk[name], -math.inf).amax(dim=dims)
+            lows[name] = torch.minimum(lows[name], low) if name in lows else low
+            highs[name] = torch.maximum(highs[name], high) if name in highs else high
+    if not with_ranges:
+        return valid, {}
+
+    if not bool(valid.any()):
+        return valid, {
+            "scales": [[0.0, 0.0]] * 3,
+            "opacities": list(OPACITY_LOGIT_RANGE),
+            "sh": [[0.0, 0.0]] * (_sh_band(splats["shN"].shape[1]) + 1),
+        }
+    scales_high = highs["scales"].tolist()
+    scales_low = [
+        max(low, high - MAX_LOG_SCALE_RANGE)
+        for low, high in zip(lows["scales"].tolist(), scales_high)
+    ]
+    # One range per band, over its coefficients and channels.
+    sh_low = lows["sh"].tolist()
+    sh_high = highs["sh"].tolist()
+    bands = [_sh_band(i) for i in range(len(sh_low))]
+    sh_ranges = []
+    for band in range(bands[-1] + 1):
+        indices = [i for i, b in enumerate(bands) if b == band]
+        sh_ranges.append(
+            [min(sh_low[i] for i in indices), max(sh_high[i] for i in indices)]
+        )
+    return valid, {
+        "scales": [list(r) for r in zip(scales_low, scales_high)],
+        "opacities": list(OPACITY_LOGIT_RANGE),
+        "sh": sh_ranges,
+    }
+
+
+def _chunk(splats: Dict[str, Tensor], rows: slice) -> Dict[str, Tensor]:
+    """Returns the rows of the splats in float32, with sh0 and shN as "sh"."""
+    chunk = {k: v[rows].float() for k, v in splats.items()}
+    chunk["sh"] = torch.cat([chunk.pop("sh0"), chunk.pop("shN")], 1)
+    return chunk
+
+
+def _valid_chunks(splats: Dict[str, Tensor], valid: Tensor, chunk_size: int):
+    for start in range(0, len(valid), chunk_size):
+        chunk = _chunk(splats, slice(start, start + chunk_size))
+        is_valid = valid[start : start + chunk_size]
+        yield {k: v[is_valid] for k, v in chunk.items()}
+
+
+def _quantize(
+    chunk: Dict[str, Tensor], ranges: dict, means_dtype: str
+) -> Dict[str, np.ndarray]:
+    quats = F.normalize(chunk["quats"], dim=-1)
+    sh_low, sh_high = _sh_range_tensors(
+        ranges, chunk["sh"].shape[1], chunk["sh"].device
+    )
+    scales_low, scales_high = torch.tensor(
+        ranges["scales"], device=chunk["scales"].device
+    ).unbind(1)
+    arrays = {
+        "means": chunk["means"].to(getattr(torch, means_dtype)),
+        "scales": _to_uint8(chunk["scales"], scales_low, scales_high),
+        "opacities": _to_uint8(chunk["opacities"], *ranges["opacities"]),
+        "quats": (quats * 127).round().clamp(-127, 127).to(torch.int8),
+        "sh": _to_uint8(chunk["sh"], sh_low, sh_high),
+    }
+    return {k: v.cpu().numpy() for k, v in arrays.items()}
+
+
+def _read_compact(
+    path: str, device: Union[str, torch.device], chunk_size: int
+) -> Dict[str, Tensor]:
+    with open(path, "rb") as f:
+        f.seek(len(COMPACT_MAGIC))
+        header_size = int(np.frombuffer(f.read(4), dtype="<u4")[0])
+        header = json.loads(f.read(header_size))
+    data_offset = _align(len(COMPACT_MAGIC) + 4 + header_size)
+    num_gs = header["num_gaussians"]
+    ranges = header["ranges"]
+    sections = {}
+    for name, section in header["sections"].items():
+        shape = (num_gs, *section["shape"])
+        if num_gs == 0:
+            # Empty files cannot be mapped.
+            sections[name] = np.zeros(shape, section["dtype"])
+            continue
+        sections[name] = np.memmap(
+            path,
+            dtype=section["dtype"],
+            mode="r",
+            offset=data_offset + section["offset"],
+            shape=shape,
+        )
+
+    num_sh = header["sections"]["sh"]["shape"][0]
+    splats = _empty_splats(num_gs, num_sh, device)
+    sh_low, sh_high = _sh_range_tensors(ranges, num_sh, device)
+    scales_low, scales_high = torch.tensor(ranges["scales"], device=device).unbind(1)
+    for start in range(0, num_gs, chunk_size):
+        rows = slice(start, start + chunk_size)
+        chunk = {
+            k: torch.from_numpy(np.array(v[rows])).to(device)
+            for k, v in sections.items()
+        }
+        splats["means"][rows] = chunk["means"].float()
+        splats["scales"][rows] = _from_uint8(chunk["scales"], scales_low, scales_high)
+        splats["opacities"][rows] = _from_uint8(
+            chunk["opacities"], *ranges["opacities"]
+        )
+        splats["quats"][rows] = chunk["quats"].float() / 127
+        sh = _from_uint8(chunk["sh"], sh_low, sh_high)
+        splats["sh0"][rows] = sh[:, :1]
+        splats["shN"][rows] = sh[:, 1:]
+    return splats
+
+
+def _read_ply(
+    path: str, device: Union[str, torch.device], chunk_size: int
+) -> Dict[str, Tensor]:
+    with open(path, "rb") as f:
+        if f.readline().strip() != b"ply":
+            raise ValueError(f"{path} is neither a PLY nor a compact splat file.")
+        num_gs = 0
+        properties = []
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError(f"{path} has no end_header.")
+            words = line.decode().split()
+            if words[0] == "format" and words[1] != "binary_little_endian":
+                raise ValueError(f"Unsupported PLY format: {words[1]}")
+            if words[:2] == ["element", "vertex"]:
+                num_gs = int(words[2])
+            elif words[0] == "property":
+                if words[1] != "float":
+                    raise ValueError(f"Unsupported PLY property type: {words[1]}")
+                properties.append(words[2])
+            elif words[0] == "end_header":
+                break
+        data_offset = f.tell()
+
+    columns = {name: i for i, name in enumerate(properties)}
+    num_rest = sum(name.startswith("f_rest_") for name in properties)
+    indices = {
+        "means": [columns[c] for c in ["x", "y", "z"]],
+        "sh0": [columns[f"f_dc_{i}"] for i in range(3)],
+        "shN": [columns[f"f_rest_{i}"] for i in range(num_rest)],
+        "opacities": [columns["opacity"]],
+        "scales": [columns[f"scale_{i}"] for i in range(3)],
+        "quats": [columns[f"rot_{i}"] for i in range(4)],
+    }
+    shape = (num_gs, len(properties))
+    if num_gs == 0:
+        rows_array = np.zeros(shape, "<f4")
+    else:
+        rows_array = np.memmap(
+            path, dtype="<f4", mode="r", offset=data_offset, shape=shape
+        )
+
+    splats = _empty_splats(num_gs, 1 + num_rest // 3, device)
+    for start in range(0, num_gs, chunk_size):
+        rows = slice(start, start + chunk_size)
+        chunk = torch.from_numpy(np.array(rows_array[rows])).to(device)
+        for name, index in indices.items():
+            values = chunk[:, index]
+            if name == "opacities":
+                values = values[:, 0]
+            elif name == "sh0":
+                values = values[:, None]
+            elif name == "shN":
+                # f_rest properties are channel-major
+                values = values.view(len(values), 3, -1).transpose(1, 2)
+            splats[name][rows] = values
+    return splats
+
+
+def _empty_splats(
+    num_gs: int, num_sh: int, device: Union[str, torch.device]
+) -> Dict[str, Tensor]:
+    shapes = {
+        "means": [3],
+        "scales": [3],
+        "quats": [4],
+        "opacities": [],
+        "sh0": [1, 3],
+        "shN": [num_sh - 1, 3],
+    }
+    return {k: torch.empty((num_gs, *s), device=device) for k, s in shapes.items()}
+
+
+def _sh_band(index: int) -> int:
+    """Returns the degree of the SH coefficient `index`."""
+    return math.isqrt(index)
+
+
+def _sh_range_tensors(
+    ranges: dict, num_sh: int, device: Union[str, torch.device]
+) -> Tuple[Tensor, Tensor]:
+    """Returns the low and high values [K, 1] of each SH coefficient, from its band."""
+    bands = torch.tensor([_sh_band(i) for i in range(num_sh)], device=device)
+    sh_ranges = torch.tensor(ranges["sh"], device=device)[bands]
+    return sh_ranges[:, :1], sh_ranges[:, 1:]
+
+
+def _to_uint8(
+    values: Tensor, low: Union[float, Tensor], high: Union[float, Tensor]
+) -> Tensor:
+    scale = 255 / torch.clamp(torch.as_tensor(high - low), min=1e-12)
+    return ((values - low) * scale).round().clamp(0, 255).to(torch.uint8)
+
+
+def _from_uint8(
+    codes: Tensor, low: Union[float, Tensor], high: Union[float, Tensor]
+) -> Tensor:
+    return low + codes.float() * ((high - low) / 255)
+
+
+def _ply_header(num_gs: int, num_sh: int) -> str:
+    properties = ["x", "y", "z"]
+    properties += [f"f_dc_{i}" for i in range(3)]
+    properties += [f"f_rest_{i}" for i in range((num_sh - 1) * 3)]
+    properties += ["opacity"]
+    properties += [f"scale_{i}" for i in range(3)]
+    properties += [f"rot_{i}" for i in range(4)]
+    lines = ["ply", "format binary_little_endian 1.0", f"element vertex {num_gs}"]
+    lines += [f"property float {name}" for name in properties]
+    lines += ["end_header"]
+    return "\n".join(lines) + "\n"
+
+
+def _align(size: int, alignment: int = 64) -> int:
+    return (size + alignment - 1) // alignment * alignment
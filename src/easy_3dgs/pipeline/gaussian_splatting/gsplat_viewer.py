@@ -1,14 +1,32 @@
+import math
+import threading
 import viser
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Literal
+from typing import Dict, Literal, Optional
 from typing import Tuple, Callable
 from nerfview import Viewer, RenderTabState
+from nerfview._renderer import Renderer, RenderTask
+from torch import Tensor
+
+from .culling import GaussianGrid
+
+
+@dataclass
+class SplatSnapshot:
+    """A copy of the splats rendered by the viewer while training updates them."""
+
+    splats: Dict[str, Tensor]
+    # Culling grid over the copy, built on its first render
+    culling_grid: Optional[GaussianGrid] = None
 
 
 class GsplatRenderTabState(RenderTabState):
     # non-controlable parameters
     total_gs_count: int = 0
     rendered_gs_count: int = 0
+    # SH degree limit of the frame being rendered, set by `ProgressiveRenderer`
+    sh_degree_limit: Optional[int] = None
 
     # controlable parameters
     max_sh_degree: int = 5
@@ -29,9 +47,68 @@ class GsplatRenderTabState(RenderTabState):
     camera_model: Literal["pinhole", "ortho", "fisheye"] = "pinhole"
 
 
+class ProgressiveRenderer(Renderer):
+    """Renders coarse frames within a frame-time budget, refined once the camera stops.
+
+    The frames rendered while the camera moves (the "low_move" state of nerfview)
+    use at most `move_sh_degree`, at a resolution scaled after each of them so that
+    they take `frame_time`, as measured on the previous one. Once the camera stops,
+    a frame is rendered at twice this resolution ("low_static"), then one at the
+    full resolution and SH degree ("high").
+    """
+
+    def __init__(
+        self,
+        viewer: "GsplatViewer",
+        client: viser.ClientHandle,
+        lock: threading.Lock,
+        frame_time: float = 1 / 30,
+        move_sh_degree: int = 0,
+    ):
+        super().__init__(viewer, client, lock)
+        self.frame_time = frame_time
+        self.move_sh_degree = move_sh_degree
+        # Size of the moving frames, relative to the viewer resolution
+        self._move_scale = 0.25
+        self._last_state = None
+
+    def _get_img_wh(self, aspect: float) -> Tuple[int, int]:
+        # Called in the render lock, before each frame.
+        state = self.viewer.render_tab_state
+        min_scale = min(64 / state.viewer_res, 1.0)
+        if self._last_state == "low_move" and self._state == "low_move":
+            # The size of the previous frame is still in the state.
+            last_time = (
+                state.viewer_width * state.viewer_height / state.num_view_rays_per_sec
+            )
+            factor = math.sqrt(self.frame_time / max(last_time, 1e-6))
+            self._move_scale *= min(max(factor, 0.5), 2.0)
+            self._move_scale = min(max(self._move_scale, min_scale), 1.0)
+        self._last_state = self._state
+
+        if self._state == "low_move":
+            scale = self._move_scale
+            state.sh_degree_limit = self.move_sh_degree
+        elif self._state == "low_static":
+            scale = min(2 * self._move_scale, 1.0)
+            state.sh_degree_limit = None
+        else:
+            scale = 1.0
+            state.sh_degree_limit = None
+        size = max(int(scale * state.viewer_res), 1)
+        if aspect > 1:
+            return size, max(int(size / aspect), 1)
+        return max(int(size * aspect), 1), size
+
+
 class GsplatViewer(Viewer):
     """
     Viewer for gsplat.
+
+    The frames are rendered by `ProgressiveRenderer`s, which take `render_lock`
+    instead of the lock of the training steps: `render_fn` should render splats
+    that training does not update, such as a `SplatSnapshot`. Training does not
+    pause either while the camera moves.
     """
 
     def __init__(
@@ -40,10 +117,32 @@ class GsplatViewer(Viewer):
         render_fn: Callable,
         output_dir: Path,
         mode: Literal["rendering", "training"] = "rendering",
+        frame_time: float = 1 / 30,
+        move_sh_degree: int = 0,
     ):
+        self.render_lock = threading.Lock()
+        self.frame_time = frame_time
+        self.move_sh_degree = move_sh_degree
         super().__init__(server, render_fn, output_dir, mode)
         server.gui.set_panel_label("gsplat viewer")
 
+    def _connect_client(self, client: viser.ClientHandle):
+        client_id = client.client_id
+        self._renderers[client_id] = ProgressiveRenderer(
+            viewer=self,
+            client=client,
+            lock=self.render_lock,
+            frame_time=self.frame_time,
+            move_sh_degree=self.move_sh_degree,
+        )
+        self._renderers[client_id].start()
+
+        @client.camera.on_update
+        def _(_: viser.CameraHandle):
+            with self.server.atomic():
+                camera_state = self.get_camera_state(client)
+                self._renderers[client_id].submit(RenderTask("move", camera_state))
+
     def _init_rendering_tab(self):
         self.render_tab_state = GsplatRenderTabState()
         self._rendering_tab_handles = {}
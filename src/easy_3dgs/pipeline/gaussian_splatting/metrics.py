@@ -0,0 +1,52 @@
+import threading
+from typing import Dict, Tuple, Union
+
+import torch
+
+_METRICS: Dict[Tuple[str, torch.device], torch.nn.Module] = {}
+_LOCK = threading.Lock()
+
+
+def get_metric(name: str, device: Union[str, torch.device]) -> torch.nn.Module:
+    """Returns the image metric `name` on `device`, built on first use.
+
+    A metric is built once per process and device, then shared by every caller,
+    so that several `Runner`s do not each hold their own LPIPS network. Their
+    running states are shared too: callers should only use the values returned
+    for their batches, from one thread at a time.
+
+    Args:
+        name (str): "psnr", "ssim", "lpips_alex" or "lpips_vgg".
+        device (Union[str, torch.device]): The device of the metric.
+    """
+    key = (name, torch.device(device))
+    with _LOCK:
+        if key not in _METRICS:
+            _METRICS[key] = _build_metric(name).to(key[1])
+        return _METRICS[key]
+
+
+def release_metrics():
+    """Drops the shared metrics, freeing their memory once no longer referenced."""
+    with _LOCK:
+        _METRICS.clear()
+
+
+def _build_metric(name: str) -> torch.nn.Module:
+    # torchmetrics and the LPIPS weights are only loaded by runs that evaluate.
+    from torchmetrics.image import (
+        PeakSignalNoiseRatio,
+        StructuralSimilarityIndexMeasure,
+    )
+    from torchmetrics.image.lpip import LearnedPerceptualImagePatchSimilarity
+
+    if name == "psnr":
+        return PeakSignalNoiseRatio(data_range=1.0)
+    if name == "ssim":
+        return StructuralSimilarityIndexMeasure(data_range=1.0)
+    if name == "lpips_alex":
+        return LearnedPerceptualImagePatchSimilarity(net_type="alex", normalize=True)
+    if name == "lpips_vgg":
+        # The 3DGS official repo uses lpips vgg, which is equivalent with the following:
+        return LearnedPerceptualImagePatchSimilarity(net_type="vgg", normalize=False)
+    raise ValueError(f"Unknown metric: {name}")
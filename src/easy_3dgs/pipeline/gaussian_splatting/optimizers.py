@@ -0,0 +1,234 @@
+from collections import defaultdict
+from typing import Dict, Tuple
+
+import torch
+from torch import Tensor
+
+
+class GroupedAdam:
+    """Steps a set of single-parameter `torch.optim.Adam` optimizers at once.
+
+    The update of every parameter is computed with multi-tensor (foreach)
+    kernels, so a step launches a handful of kernels for all the splat tensors
+    instead of a handful per tensor. The optimizers keep owning their parameter
+    groups and state: learning rates set by schedulers are honoured, and the
+    densification strategies can keep replacing parameters and resizing their
+    moments in `optimizers[name]`. The math follows the single-tensor Adam
+    implementation, with which results are identical on CPU. `LowPrecisionAdam`
+    optimizers are stepped on their own.
+    """
+
+    def __init__(self, optimizers: Dict[str, torch.optim.Optimizer]):
+        """
+        Args:
+            optimizers (Dict[str, torch.optim.Optimizer]): The optimizers, looked up
+                on every step so that the strategies' changes are seen.
+        """
+        for name, optimizer in optimizers.items():
+            if type(optimizer) is LowPrecisionAdam:
+                continue
+            if type(optimizer) is not torch.optim.Adam:
+                raise ValueError(
+                    f"GroupedAdam only supports torch.optim.Adam, got "
+                    f"{type(optimizer).__name__} for '{name}'."
+                )
+            for group in optimizer.param_groups:
+                if group["weight_decay"] != 0 or group["amsgrad"] or group["maximize"]:
+                    raise ValueError(
+                        "GroupedAdam does not support weight decay, amsgrad or maximize."
+                    )
+        self.optimizers = optimizers
+
+    @torch.no_grad()
+    def step(self):
+        # Parameters sharing betas and eps are updated by the same kernels.
+        buckets = defaultdict(lambda: defaultdict(list))
+        for optimizer in self.optimizers.values():
+            if type(optimizer) is LowPrecisionAdam:
+                optimizer.step()
+                continue
+            for group in optimizer.param_groups:
+                for param in group["params"]:
+                    if param.grad is None:
+                        continue
+                    if param.grad.is_sparse:
+                        raise ValueError(
+                            "GroupedAdam does not support sparse gradients."
+                        )
+                    state = optimizer.state[param]
+                    if len(state) == 0:
+                        # Same lazy state as torch.optim.Adam.
+                        state["step"] = torch.tensor(0.0, dtype=_scalar_dtype())
+                        state["exp_avg"] = torch.zeros_like(
+                            param, memory_format=torch.preserve_format
+                        )
+                        state["exp_avg_sq"] = torch.zeros_like(
+                            param, memory_format=torch.preserve_format
+                        )
+                    bucket = buckets[(*group["betas"], group["eps"])]
+                    bucket["params"].append(param)
+                    bucket["grads"].append(param.grad)
+                    bucket["exp_avgs"].append(state["exp_avg"])
+                    bucket["exp_avg_sqs"].append(state["exp_avg_sq"])
+                    bucket["steps"].append(state["step"])
+                    bucket["lrs"].append(group["lr"])
+
+        for (beta1, beta2, eps), bucket in buckets.items():
+            grads = bucket["grads"]
+            torch._foreach_add_(bucket["steps"], 1)
+            torch._foreach_lerp_(bucket["exp_avgs"], grads, 1 - beta1)
+            torch._foreach_mul_(bucket["exp_avg_sqs"], beta2)
+            torch._foreach_addcmul_(bucket["exp_avg_sqs"], grads, grads, 1 - beta2)
+
+            # The steps live on the host: reading them does not sync the device.
+            steps = [step.item() for step in bucket["steps"]]
+            step_sizes = [
+                -(lr / (1 - beta1**step)) for lr, step in zip(bucket["lrs"], steps)
+            ]
+            bias_correction2_sqrts = [(1 - beta2**step) ** 0.5 for step in steps]
+            denoms = torch._foreach_sqrt(bucket["exp_avg_sqs"])
+            torch._foreach_div_(denoms, bias_correction2_sqrts)
+            torch._foreach_add_(denoms, eps)
+            torch._foreach_addcdiv_(
+                bucket["params"], bucket["exp_avgs"], denoms, step_sizes
+            )
+
+    def zero_grad(self, set_to_none: bool = True):
+        for optimizer in self.optimizers.values():
+            optimizer.zero_grad(set_to_none=set_to_none)
+
+
+class LowPrecisionAdam(torch.optim.Optimizer):
+    """Adam for parameters stored in a low precision dtype, such as the SH
+    coefficients of the splats.
+
+    The update is computed in float32, then written back to the parameter, which
+    keeps its own dtype (float32, bfloat16 or float16). The moments are stored as
+    `moments`: "float32", "bfloat16", or "int8", quantized per row (one Gaussian)
+    with an absmax scale, the second moment being stored as its square root.
+    bfloat16 and int8 values are rounded stochastically, so that updates below
+    their resolution are kept on average. Quantized square roots never round to
+    zero, which would blow up the update.
+
+    The state tensors keep the leading dimension of the parameter, so the
+    densification strategies can index, concatenate and zero them like the
+    moments of `torch.optim.Adam`.
+    """
+
+    def __init__(
+        self,
+        params,
+        lr: float = 1e-3,
+        betas: Tuple[float, float] = (0.9, 0.999),
+        eps: float = 1e-8,
+        moments: str = "bfloat16",
+    ):
+        if moments not in ("float32", "bfloat16", "int8"):
+            raise ValueError(f"Unknown moments storage: {moments}")
+        defaults = dict(lr=lr, betas=betas, eps=eps)
+        super().__init__(params, defaults)
+        self.moments = moments
+
+    @torch.no_grad()
+    def step(self, closure=None):
+        for group in self.param_groups:
+            beta1, beta2 = group["betas"]
+            for param in group["params"]:
+                if param.grad is None:
+                    continue
+                state = self.state[param]
+                if len(state) == 0:
+                    state["step"] = torch.tensor(0.0, dtype=_scalar_dtype())
+                    for key in ["exp_avg", "exp_avg_sq"]:
+                        # Stored as is in float32: each moment needs its own zeros.
+                        zeros = torch.zeros_like(param, dtype=torch.float32)
+                        self._store_moment(state, key, zeros)
+                state["step"] += 1
+                step = state["step"].item()
+
+                grad = param.grad.float()
+                exp_avg = self._load_moment(state, "exp_avg")
+                exp_avg_sq = self._load_moment(state, "exp_avg_sq")
+                exp_avg.lerp_(grad, 1 - beta1)
+                exp_avg_sq.mul_(beta2).addcmul_(grad, grad, value=1 - beta2)
+                step_size = group["lr"] / (1 - beta1**step)
+                bias_correction2_sqrt = (1 - beta2**step) ** 0.5
+                denom = (exp_avg_sq.sqrt() / bias_correction2_sqrt).add_(group["eps"])
+                value = param.float().addcdiv_(exp_avg, denom, value=-step_size)
+                param.copy_(_round_to(value, param.dtype))
+                self._store_moment(state, "exp_avg", exp_avg)
+                self._store_moment(state, "exp_avg_sq", exp_avg_sq)
+
+    def load_state_dict(self, state_dict: dict):
+        super().load_state_dict(state_dict)
+        # Optimizer casts the state to the dtype of the parameter: restore the
+        # stored dtypes, of the quantized moments in particular.
+        params = [p for group in self.param_groups for p in group["params"]]
+        for index, saved in state_dict["state"].items():
+            for key, value in saved.items():
+                if key != "step" and torch.is_tensor(value):
+                    self.state[params[index]][key] = value.to(params[index].device)
+
+    def _store_moment(self, state: dict, key: str, value: Tensor):
+        if self.moments != "int8":
+            state[key] = _round_to(value, getattr(torch, self.moments))
+        elif key == "exp_avg_sq":
+            state[key], state[f"{key}_scale"] = _quantize(value.sqrt(), signed=False)
+        else:
+            state[key], state[f"{key}_scale"] = _quantize(value, signed=True)
+
+    def _load_moment(self, state: dict, key: str) -> Tensor:
+        # The strategies may have promoted the stored values (or int8 codes) to
+        # float32 when growing them, which decodes the same.
+        if self.moments != "int8":
+            return state[key].float()
+        if key == "exp_avg_sq":
+            return _dequantize(state[key], state[f"{key}_scale"], signed=False) ** 2
+        return _dequantize(state[key], state[f"{key}_scale"], signed=True)
+
+
+def param_bytes_per_row(row_numel: int, dtype: torch.dtype, moments: str) -> int:
+    """Bytes used by one row (Gaussian) of a parameter and its Adam moments."""
+    param_bytes = row_numel * torch.finfo(dtype).bits // 8
+    if moments == "int8":
+        # Two 8-bit codes per element and two float32 scales per row.
+        return param_bytes + 2 * row_numel + 2 * 4
+    return param_bytes + 2 * row_numel * torch.finfo(getattr(torch, moments)).bits // 8
+
+
+def _round_to(value: Tensor, dtype: torch.dtype) -> Tensor:
+    """Casts float32 `value` to `dtype`, stochastically rounding to bfloat16."""
+    if dtype == torch.bfloat16:
+        # Add random low bits before truncating the 16 low mantissa bits.
+        bits = value.contiguous().view(torch.int32)
+        noise = torch.randint_like(bits, 0, 1 << 16)
+        value = ((bits + noise) & -65536).view(torch.float32)
+    return value.to(dtype)
+
+
+def _quantize(value: Tensor, signed: bool) -> Tuple[Tensor, Tensor]:
+    """Quantizes each row to 8 bits with an absmax scale and stochastic rounding."""
+    levels = 127 if signed else 255
+    if value.dim() > 1:
+        scale = value.abs().amax(dim=tuple(range(1, value.dim())), keepdim=True)
+    else:
+        scale = value.abs()
+    codes = (value / scale.clamp(min=1e-30) * levels + torch.rand_like(value)).floor()
+    if signed:
+        codes = codes.clamp(-levels, levels).to(torch.int8)
+    else:
+        # A non-zero value must not vanish.
+        codes = torch.where(value > 0, codes.clamp(min=1), codes)
+        codes = codes.clamp(0, levels).to(torch.uint8)
+    return codes, scale
+
+
+def _dequantize(codes: Tensor, scale: Tensor, signed: bool) -> Tensor:
+    levels = 127 if signed else 255
+    return codes.float() * (scale.float() / levels)
+
+
+def _scalar_dtype() -> torch.dtype:
+    return (
+        torch.float64 if torch.get_default_dtype() == torch.float64 else torch.float32
+    )
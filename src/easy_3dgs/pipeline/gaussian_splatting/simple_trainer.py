@@ -1,9 +1,10 @@
+import copy
 import json
 import math
 import os
 import time
 from collections import defaultdict
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Union
 
@@ -15,36 +16,56 @@ import tqdm
 import tyro
 import viser
 import yaml
-from gsplat import export_splats
 from gsplat.compression import PngCompression
 from gsplat.distributed import cli
 from gsplat.optimizers import SelectiveAdam
 from gsplat.rendering import rasterization
 from gsplat.strategy import DefaultStrategy, MCMCStrategy
+from gsplat.strategy.ops import remove
 from nerfview import CameraState, RenderTabState, apply_float_colormap
 from pytorch_msssim import ssim
 from torch import Tensor
 from torch.nn.parallel import DistributedDataParallel as DDP
 from torch.utils.tensorboard import SummaryWriter
-from torchmetrics.image import PeakSignalNoiseRatio, StructuralSimilarityIndexMeasure
-from torchmetrics.image.lpip import LearnedPerceptualImagePatchSimilarity
 from typing_extensions import Literal, assert_never
 
 from easy_3dgs.pipeline.gaussian_splatting.utils import (
     AppearanceOptModule,
     CameraOptModule,
+    MetricsAccumulator,
+    get_rng_state,
     knn,
     rgb_to_sh,
     set_random_seed,
+    set_rng_state,
 )
 
+from .async_writer import AsyncVideoWriter, AsyncWriter
+from .blocks import (
+    Block,
+    BlockStore,
+    latest_checkpoint,
+    merge_blocks,
+    partition_scene,
+    save_blocks,
+)
+from .culling import GaussianGrid, uncull_info
 from .datasets.colmap import Dataset, Parser
+from .exporter import EXTENSIONS, read_splats, write_splats
+from .datasets.device_store import DeviceImageStore
+from .datasets.sampler import CameraBatchSampler, ResumableRandomSampler
 from .datasets.traj import (
     generate_ellipse_path_z,
     generate_interpolated_path,
     generate_spiral_path,
 )
-from .gsplat_viewer import GsplatRenderTabState, GsplatViewer
+from .gsplat_viewer import GsplatRenderTabState, GsplatViewer, SplatSnapshot
+from .metrics import get_metric
+from .optimizers import GroupedAdam, LowPrecisionAdam, param_bytes_per_row
+
+# Estimated bytes per GS and camera of the rasterization buffers (projections,
+# colors, tile intersections) and their gradients.
+RASTER_BYTES_PER_GAUSSIAN = 256
 
 
 @dataclass
@@ -53,10 +74,22 @@ class Config:
     disable_viewer: bool = False
     # Path to the .pt files. If provide, it will skip training and run evaluation only.
     ckpt: Optional[List[str]] = None
+    # Resume training from the checkpoint given in `ckpt` (one per rank) or else from
+    # the latest one in `result_dir/ckpts`, with its optimizer, scheduler, strategy,
+    # RNG and dataloader states
+    resume: bool = False
     # Name of compression strategy to use
     compression: Optional[Literal["png"]] = None
     # Render trajectory path
     render_traj_path: str = "interp"
+    # Number of trajectory frames rendered together
+    traj_batch_size: int = 8
+    # Frame rate of the trajectory video
+    traj_fps: float = 30
+    # Resolution of the trajectory video, relative to that of the first camera
+    traj_scale: float = 1.0
+    # Only render the colors of the trajectory video, without the depth panel
+    traj_rgb_only: bool = False
 
     # Path to the Mip-NeRF 360 dataset
     data_dir: str = "data/360_v2/garden"
@@ -74,9 +107,31 @@ class Config:
     normalize_world_space: bool = True
     # Camera model
     camera_model: Literal["pinhole", "ortho", "fisheye"] = "pinhole"
+    # PNG compression level (0-9, lossless) of the downscaled images written when
+    # only full resolution JPEGs are available. 1 is much faster to write than 6
+    png_compress_level: int = 6
+    # Cache the parsed COLMAP scene, so that later runs skip parsing it
+    parser_cache: bool = True
+    # Cache decoded training images, shared by the dataloader workers
+    cache_images: bool = False
+    # RAM budget (GB) of the image cache. Larger datasets are cached on disk
+    cache_ram_gb: float = 8.0
+    # Disk budget (GB) of the image cache, least recently used images are evicted
+    cache_disk_gb: float = 32.0
+    # Where training images are sampled from: a DataLoader with workers, or all
+    # frames preloaded once into the training device ("device") or host memory ("host")
+    image_store: Literal["dataloader", "device", "host"] = "dataloader"
 
     # Port for the viewer server
     port: int = 8080
+    # Copy the splats rendered by the viewer every this steps, so that the viewer
+    # renders without waiting for the training steps
+    viewer_snapshot_every: int = 100
+    # Time budget (s) of the viewer frames while the camera moves, met by lowering
+    # their resolution
+    viewer_frame_time: float = 1 / 30
+    # Maximum SH degree of the viewer frames while the camera moves
+    viewer_move_sh_degree: int = 0
 
     # Batch size for training. Learning rates are scaled automatically
     batch_size: int = 1
@@ -87,10 +142,32 @@ class Config:
     max_steps: int = 30_000
     # Steps to evaluate the model
     eval_steps: List[int] = field(default_factory=lambda: [-1])
+    # Number of validation views of a camera rendered together
+    eval_batch_size: int = 4
+    # Number of workers decoding the validation images and encoding the renders
+    eval_workers: int = 4
+    # Save the comparison images of the evaluation. Only compute metrics if False
+    eval_save_images: bool = True
     # Steps to save the model
     save_steps: List[int] = field(default_factory=lambda: [7_000, 30_000])
     # Whether to save ply file (storage size can be large)
     save_ply: bool = True
+    # Write checkpoints and ply files on a background thread while training goes on
+    async_save: bool = True
+    # Format of the exported splats: standard PLY, or compact with 8-bit quantized
+    # scales, opacities, rotations and SH coefficients
+    export_format: Literal["ply", "compact"] = "ply"
+    # Dtype of the means in the compact format
+    export_means_dtype: Literal["float32", "float16"] = "float16"
+    # Train the scene as a grid of spatial cells along its two widest axes, one
+    # after another or split across ranks, then merge them into a single export
+    block_grid: Optional[Tuple[int, int]] = None
+    # Fraction of a cell's size added on each side when training it
+    block_overlap: float = 0.2
+    # Number of SfM points of a cell an image must observe to train the cell
+    block_min_points: int = 50
+    # Where trained cells are paged out: host memory, or their checkpoints on disk
+    block_offload: Literal["cpu", "disk"] = "disk"
     # Steps to save the model as ply
     ply_steps: List[int] = field(default_factory=lambda: [30_000])
     # Whether to disable video generation during training and evaluation
@@ -117,17 +194,39 @@ class Config:
     near_plane: float = 0.01
     # Far plane clipping distance
     far_plane: float = 1e10
+    # Cull the GSs outside of the camera frusta before rasterization, with a grid
+    # over their means. Only used for pinhole cameras without UT, on a single GPU
+    frustum_culling: bool = False
+    # Number of cells of the culling grid along each axis
+    culling_resolution: int = 32
+    # Rebuild the culling grid every this steps, besides when GSs are added or removed
+    # or move out of the room left for them
+    culling_refresh_every: int = 100
 
     # Strategy for GS densification
     strategy: Union[DefaultStrategy, MCMCStrategy] = field(
         default_factory=DefaultStrategy
     )
+    # Maximum number of GSs. Densification slows down as the budget is approached,
+    # and the least opaque GSs are pruned beyond it
+    max_gaussians: Optional[int] = None
+    # Maximum GPU memory (GB) of training, converted into a number of GSs from the
+    # peak memory and the projected memory of each additional GS
+    max_memory_gb: Optional[float] = None
     # Use packed mode for rasterization, this leads to less memory usage but slightly slower.
     packed: bool = False
     # Use sparse gradients for optimization. (experimental)
     sparse_grad: bool = False
     # Use visible adam from Taming 3DGS. (experimental)
     visible_adam: bool = False
+    # Storage dtype of the higher-order SH coefficients (shN), updated with float32
+    # math. bfloat16 is rounded stochastically; float16 gradients may underflow
+    shN_dtype: Literal["float32", "bfloat16", "float16"] = "float32"
+    # Storage of the Adam moments of shN, int8 being quantized per Gaussian
+    shN_moments: Literal["float32", "bfloat16", "int8"] = "float32"
+    # Update all the splat parameters with multi-tensor Adam kernels, keeping their
+    # learning rates. Not compatible with sparse_grad and visible_adam
+    grouped_adam: bool = False
     # Anti-aliasing in rasterization. Might slightly hurt quantitative metrics.
     antialiased: bool = False
 
@@ -182,6 +281,8 @@ class Config:
 
     # Dump information to tensorboard every this steps
     tb_every: int = 100
+    # Sync the running training losses to the progress bar every this steps
+    metrics_every: int = 10
     # Save training images to tensorboard
     tb_save_image: bool = False
 
@@ -232,11 +333,14 @@ def create_splats_with_optimizers(
     sh_degree: int = 3,
     sparse_grad: bool = False,
     visible_adam: bool = False,
+    shN_dtype: str = "float32",
+    shN_moments: str = "float32",
     batch_size: int = 1,
     feature_dim: Optional[int] = None,
     device: str = "cuda",
     world_rank: int = 0,
     world_size: int = 1,
+    block: Optional[Block] = None,
 ) -> Tuple[torch.nn.ParameterDict, Dict[str, torch.optim.Optimizer]]:
     if init_type == "sfm":
         points = torch.from_numpy(parser.points).float()
@@ -246,9 +350,14 @@ def create_splats_with_optimizers(
         rgbs = torch.rand((init_num_pts, 3))
     else:
         raise ValueError("Please specify a correct init_type: sfm or random")
+    if block is not None:
+        # Only the points of the spatial cell, with its overlap
+        in_block = block.contains(points, expanded=True)
+        points = points[in_block]
+        rgbs = rgbs[in_block]
 
     # Initialize the GS size to be the average dist of the 3 nearest neighbors
-    dist2_avg = (knn(points, 4)[:, 1:] ** 2).mean(dim=-1)  # [N,]
+    dist2_avg = (knn(points.to(device), 4)[:, 1:] ** 2).mean(dim=-1).cpu()  # [N,]
     dist_avg = torch.sqrt(dist2_avg)
     scales = torch.log(dist_avg * init_scale).unsqueeze(-1).repeat(1, 3)  # [N, 3]
 
@@ -282,6 +391,17 @@ def create_splats_with_optimizers(
         colors = torch.logit(rgbs)  # [N, 3]
         params.append(("colors", torch.nn.Parameter(colors), sh0_lr))
 
+    low_precision_shN = feature_dim is None and (
+        shN_dtype != "float32" or shN_moments != "float32"
+    )
+    if low_precision_shN:
+        if sparse_grad or visible_adam:
+            raise ValueError(
+                "Low precision shN is not compatible with sparse_grad and visible_adam."
+            )
+        shN = params[-1][1].data.to(getattr(torch, shN_dtype))
+        params[-1] = ("shN", torch.nn.Parameter(shN), shN_lr)
+
     splats = torch.nn.ParameterDict({n: v for n, v, _ in params}).to(device)
     # Scale learning rate based on batch size, reference:
     # https://www.cs.princeton.edu/~smalladi/blog/2024/01/22/SDEs-ScalingRules/
@@ -304,6 +424,14 @@ def create_splats_with_optimizers(
         )
         for name, _, lr in params
     }
+    if low_precision_shN:
+        # Float32 math on the stored shN and its stored (or quantized) moments.
+        optimizers["shN"] = LowPrecisionAdam(
+            [{"params": splats["shN"], "lr": shN_lr * math.sqrt(BS), "name": "shN"}],
+            eps=1e-15 / math.sqrt(BS),
+            betas=(1 - BS * (1 - 0.9), 1 - BS * (1 - 0.999)),
+            moments=shN_moments,
+        )
     return splats, optimizers
 
 
@@ -311,11 +439,18 @@ class Runner:
     """Engine for training and testing."""
 
     def __init__(
-        self, local_rank: int, world_rank, world_size: int, cfg: Config
+        self,
+        local_rank: int,
+        world_rank,
+        world_size: int,
+        cfg: Config,
+        block: Optional[Block] = None,
     ) -> None:
         set_random_seed(42 + local_rank)
 
-        self.cfg = cfg
+        # The strategy thresholds are adjusted while training, see
+        # `limit_densification`, so the strategy of `cfg` is left untouched.
+        self.cfg = replace(cfg, strategy=copy.deepcopy(cfg.strategy))
         self.world_rank = world_rank
         self.local_rank = local_rank
         self.world_size = world_size
@@ -337,20 +472,41 @@ class Runner:
         # Tensorboard
         self.writer = SummaryWriter(log_dir=f"{cfg.result_dir}/tb")
 
+        # Checkpoints and PLY files are written in the background.
+        self.async_writer = AsyncWriter(synchronous=not cfg.async_save)
+        # Evaluation images are encoded by a pool of threads.
+        self.image_writer = AsyncWriter(
+            max_pending=2 * max(cfg.eval_workers, 1),
+            num_workers=max(cfg.eval_workers, 1),
+            synchronous=not cfg.async_save,
+        )
+
         # Load data: Training data should contain initial points and colors.
         self.parser = Parser(
             data_dir=cfg.data_dir,
             factor=cfg.data_factor,
             normalize=cfg.normalize_world_space,
             test_every=cfg.test_every,
+            use_cache=cfg.parser_cache,
+            png_compress_level=cfg.png_compress_level,
+            cache_dir=f"{cfg.result_dir}/cache",
         )
         self.trainset = Dataset(
             self.parser,
             split="train",
             patch_size=cfg.patch_size,
             load_depths=cfg.depth_loss,
+            cache_images=cfg.cache_images,
+            cache_ram_gb=cfg.cache_ram_gb,
+            cache_disk_gb=cfg.cache_disk_gb,
+            cache_dir=f"{cfg.result_dir}/cache",
+            image_indices=block.image_indices if block is not None else None,
+        )
+        self.valset = Dataset(
+            self.parser,
+            split="val",
+            image_indices=block.image_indices if block is not None else None,
         )
-        self.valset = Dataset(self.parser, split="val")
         self.scene_scale = self.parser.scene_scale * 1.1 * cfg.global_scale
         print("Scene scale:", self.scene_scale)
 
@@ -373,13 +529,31 @@ class Runner:
             sh_degree=cfg.sh_degree,
             sparse_grad=cfg.sparse_grad,
             visible_adam=cfg.visible_adam,
+            shN_dtype=cfg.shN_dtype,
+            shN_moments=cfg.shN_moments,
             batch_size=cfg.batch_size,
             feature_dim=feature_dim,
             device=self.device,
             world_rank=world_rank,
             world_size=world_size,
+            block=block,
         )
         print("Model initialized. Number of GS:", len(self.splats["means"]))
+        if "shN" in self.splats and isinstance(
+            self.optimizers["shN"], LowPrecisionAdam
+        ):
+            row_numel = self.splats["shN"][0].numel()
+            full = param_bytes_per_row(row_numel, torch.float32, "float32")
+            reduced = param_bytes_per_row(
+                row_numel, self.splats["shN"].dtype, cfg.shN_moments
+            )
+            print(
+                f"shN and its Adam moments: {reduced * 1e6 / 1024**2:.0f} MB per "
+                f"million GS instead of {full * 1e6 / 1024**2:.0f} MB "
+                f"({(full - reduced) * 1e6 / 1024**2:.0f} MB saved)."
+            )
+        # Step the optimizers of all the splat parameters together.
+        self.grouped_adam = GroupedAdam(self.optimizers) if cfg.grouped_adam else None
 
         # Densification Strategy
         self.cfg.strategy.check_sanity(self.splats, self.optimizers)
@@ -388,11 +562,30 @@ class Runner:
             self.strategy_state = self.cfg.strategy.initialize_state(
                 scene_scale=self.scene_scale
             )
+            # Raised while the GS count is close to the budget.
+            self.grow_grad2d = self.cfg.strategy.grow_grad2d
         elif isinstance(self.cfg.strategy, MCMCStrategy):
             self.strategy_state = self.cfg.strategy.initialize_state()
+            # Lowered to the GS budget.
+            self.cap_max = self.cfg.strategy.cap_max
         else:
             assert_never(self.cfg.strategy)
 
+        # Grid to cull the GSs outside of the rendered frusta
+        self.culling_grid = None
+        # SH coefficients [N, K, 3] passed to the rasterizer, see `_sh_colors`.
+        self._sh_buffer = None
+        if (
+            cfg.frustum_culling
+            and cfg.camera_model == "pinhole"
+            and not cfg.with_ut
+            and world_size == 1
+        ):
+            self.culling_grid = GaussianGrid(
+                resolution=cfg.culling_resolution,
+                refresh_every=cfg.culling_refresh_every,
+            )
+
         # Compression Strategy
         self.compression_method = None
         if cfg.compression is not None:
@@ -460,31 +653,76 @@ class Runner:
                 ),
             ]
 
-        # Losses & Metrics.
-        self.ssim = StructuralSimilarityIndexMeasure(data_range=1.0).to(self.device)
-        self.psnr = PeakSignalNoiseRatio(data_range=1.0).to(self.device)
-
-        if cfg.lpips_net == "alex":
-            self.lpips = LearnedPerceptualImagePatchSimilarity(
-                net_type="alex", normalize=True
-            ).to(self.device)
-        elif cfg.lpips_net == "vgg":
-            # The 3DGS official repo uses lpips vgg, which is equivalent with the following:
-            self.lpips = LearnedPerceptualImagePatchSimilarity(
-                net_type="vgg", normalize=False
-            ).to(self.device)
-        else:
+        # Metrics are built on first use, see `ssim`, `psnr` and `lpips`.
+        if cfg.lpips_net not in ("alex", "vgg"):
             raise ValueError(f"Unknown LPIPS network: {cfg.lpips_net}")
 
-        # Viewer
-        if not self.cfg.disable_viewer:
-            self.server = viser.ViserServer(port=cfg.port, verbose=False)
-            self.viewer = GsplatViewer(
+        # Training state restored by `load_train_state`, consumed by `train`.
+        self.resume_state = None
+
+        # Viewer, started on first use, see `viewer`, and the splats it renders.
+        self.server = None
+        self._viewer = None
+        self._viewer_snapshot = None
+
+    @property
+    def ssim(self) -> torch.nn.Module:
+        return get_metric("ssim", self.device)
+
+    @property
+    def psnr(self) -> torch.nn.Module:
+        return get_metric("psnr", self.device)
+
+    @property
+    def lpips(self) -> torch.nn.Module:
+        return get_metric(f"lpips_{self.cfg.lpips_net}", self.device)
+
+    @property
+    def viewer(self) -> GsplatViewer:
+        """The viewer, whose server is started on first use."""
+        if self._viewer is None:
+            self.server = viser.ViserServer(port=self.cfg.port, verbose=False)
+            self._viewer = GsplatViewer(
                 server=self.server,
                 render_fn=self._viewer_render_fn,
-                output_dir=Path(cfg.result_dir),
+                output_dir=Path(self.cfg.result_dir),
                 mode="training",
+                frame_time=self.cfg.viewer_frame_time,
+                move_sh_degree=self.cfg.viewer_move_sh_degree,
             )
+        return self._viewer
+
+    @torch.no_grad()
+    def snapshot_splats(self, copy: bool = True):
+        """Sets the splats rendered by the viewer to the current ones.
+
+        Training updates the splats in place, so they are copied unless they are
+        not trained anymore.
+        """
+        splats = {
+            k: v.detach().clone() if copy else v.detach()
+            for k, v in self.splats.items()
+        }
+        culling_grid = None
+        if self.culling_grid is not None:
+            culling_grid = GaussianGrid(resolution=self.cfg.culling_resolution)
+        self._viewer_snapshot = SplatSnapshot(splats, culling_grid)
+
+    def _sh_colors(self, sh0: Tensor, shN: Tensor) -> Tensor:
+        """Copies sh0 [N, 1, 3] and shN [N, K - 1, 3] into a buffer kept across the
+        training steps, which is only reallocated when K changes or N exceeds it.
+        """
+        N, K = len(sh0), 1 + shN.shape[1]
+        buffer = self._sh_buffer
+        if buffer is None or buffer.shape[1] != K or len(buffer) < N:
+            buffer = torch.empty((N, K, 3), dtype=sh0.dtype, device=sh0.device)
+            self._sh_buffer = buffer
+        # Detached, so that the graph of the previous step is dropped. The copies
+        # into it are differentiable.
+        colors = buffer.detach()[:N]
+        colors[:, :1] = sh0
+        colors[:, 1:] = shN
+        return colors
 
     def rasterize_splats(
         self,
@@ -495,27 +733,65 @@ class Runner:
         masks: Optional[Tensor] = None,
         rasterize_mode: Optional[Literal["classic", "antialiased"]] = None,
         camera_model: Optional[Literal["pinhole", "ortho", "fisheye"]] = None,
+        cull: bool = True,
+        cache_keys: Optional[List[int]] = None,
+        snapshot: Optional[SplatSnapshot] = None,
         **kwargs,
     ) -> Tuple[Tensor, Tensor, Dict]:
-        means = self.splats["means"]  # [N, 3]
-        # quats = F.normalize(self.splats["quats"], dim=-1)  # [N, 4]
+        # The splats being trained, or a copy of them rendered by the viewer
+        source = self.splats if snapshot is None else snapshot.splats
+
+        # Only rasterize the GSs that may be visible. Their indices are returned
+        # as info["visible_ids"], to map the info back with `uncull_info`.
+        visible_ids = None
+        if cull:
+            visible_ids = self.visible_gaussians(
+                camtoworlds,
+                Ks,
+                width,
+                height,
+                near_plane=kwargs.get("near_plane", 0.01),
+                far_plane=kwargs.get("far_plane", 1e10),
+                cache_keys=cache_keys,
+                snapshot=snapshot,
+            )
+        splats = source
+        if visible_ids is not None:
+            # shN is gathered below, only for the SH bands in use.
+            splats = {k: v[visible_ids] for k, v in source.items() if k != "shN"}
+
+        means = splats["means"]  # [N, 3]
+        # quats = F.normalize(splats["quats"], dim=-1)  # [N, 4]
         # rasterization does normalization internally
-        quats = self.splats["quats"]  # [N, 4]
-        scales = torch.exp(self.splats["scales"])  # [N, 3]
-        opacities = torch.sigmoid(self.splats["opacities"])  # [N,]
+        quats = splats["quats"]  # [N, 4]
+        scales = torch.exp(splats["scales"])  # [N, 3]
+        opacities = torch.sigmoid(splats["opacities"])  # [N,]
 
         image_ids = kwargs.pop("image_ids", None)
         if self.cfg.app_opt:
             colors = self.app_module(
-                features=self.splats["features"],
+                features=splats["features"],
                 embed_ids=image_ids,
                 dirs=means[None, :, :] - camtoworlds[:, None, :3, 3],
                 sh_degree=kwargs.pop("sh_degree", self.cfg.sh_degree),
             )
-            colors = colors + self.splats["colors"]
+            colors = colors + splats["colors"]
             colors = torch.sigmoid(colors)
         else:
-            colors = torch.cat([self.splats["sh0"], self.splats["shN"]], 1)  # [N, K, 3]
+            # Only the SH bands of the degree in use are passed, so sh0 is passed as
+            # is at degree 0, and shN is not in the graph and skipped by the
+            # optimizers.
+            num_bands = (kwargs.get("sh_degree", self.cfg.sh_degree) + 1) ** 2 - 1
+            colors = splats["sh0"]  # [N, 1, 3]
+            if num_bands > 0:
+                shN = source["shN"][:, :num_bands]
+                if visible_ids is not None:
+                    shN = shN[visible_ids]
+                if torch.is_grad_enabled():
+                    colors = self._sh_colors(colors, shN)  # [N, K, 3]
+                else:
+                    # Renders without grad may run in the viewer thread.
+                    colors = torch.cat([colors, shN], 1)  # [N, K, 3]
 
         if rasterize_mode is None:
             rasterize_mode = "antialiased" if self.cfg.antialiased else "classic"
@@ -547,8 +823,212 @@ class Runner:
         )
         if masks is not None:
             render_colors[~masks] = 0
+        if visible_ids is not None:
+            info["visible_ids"] = visible_ids
         return render_colors, render_alphas, info
 
+    @torch.no_grad()
+    def visible_gaussians(
+        self,
+        camtoworlds: Tensor,
+        Ks: Tensor,
+        width: int,
+        height: int,
+        near_plane: float = 0.01,
+        far_plane: float = 1e10,
+        cache_keys: Optional[List[int]] = None,
+        snapshot: Optional[SplatSnapshot] = None,
+    ) -> Optional[Tensor]:
+        """Returns the indices of the GSs that may be seen by the cameras.
+
+        The culling grid is rebuilt when the GS count changed, it is stale, or a
+        GS moved or grew out of the room left for it. Returns None when the GSs
+        are not culled.
+        """
+        grid = self.culling_grid if snapshot is None else snapshot.culling_grid
+        if grid is None:
+            return None
+        splats = self.splats if snapshot is None else snapshot.splats
+        means, scales = splats["means"], torch.exp(splats["scales"])
+        if snapshot is not None:
+            # The copy does not move, so its grid is built once.
+            if grid.needs_rebuild(len(means)):
+                grid.build(means, scales)
+        elif grid.needs_rebuild(len(means)) or not grid.covers(means, scales):
+            grid.build(means, scales)
+        return grid.visible(
+            camtoworlds,
+            Ks,
+            width,
+            height,
+            near_plane=near_plane,
+            far_plane=far_plane,
+            cache_keys=cache_keys,
+        )
+
+    @torch.no_grad()
+    def load_splats(self, paths: List[str]) -> int:
+        """Loads the splats of checkpoints or exported files, concatenated in order.
+
+        Checkpoints are memory-mapped and exported files decoded by chunks, then
+        copied into the splat tensors one part at a time, so the scene is never
+        held twice. Returns the step of the first file, parsed from the name of
+        exported files.
+        """
+        parts = []
+        steps = []
+        for path in paths:
+            path = Path(path)
+            if path.suffix in EXTENSIONS.values():
+                parts.append(read_splats(str(path), device=self.device))
+                step = path.stem.rsplit("_", 1)[-1]
+                steps.append(int(step) if step.isdigit() else 0)
+            else:
+                ckpt = torch.load(
+                    path, map_location="cpu", mmap=True, weights_only=True
+                )
+                parts.append(ckpt["splats"])
+                steps.append(ckpt["step"])
+        for k, param in self.splats.items():
+            if any(k not in part for part in parts):
+                raise ValueError(f"The splats to load have no '{k}'.")
+            num_gs = sum(len(part[k]) for part in parts)
+            values = torch.empty(
+                (num_gs, *param.shape[1:]), dtype=param.dtype, device=self.device
+            )
+            start = 0
+            for part in parts:
+                values[start : start + len(part[k])] = part[k]
+                start += len(part[k])
+                del part[k]
+            param.data = values
+        if self.culling_grid is not None:
+            self.culling_grid.invalidate()
+        self._viewer_snapshot = None
+        return steps[0]
+
+    def load_train_state(self, path: str):
+        """Restores a checkpoint written by `train`, to resume after its step."""
+        ckpt = torch.load(path, map_location=self.device, weights_only=True)
+        if "optimizers" not in ckpt:
+            raise ValueError(f"{path} holds no training state and cannot be resumed.")
+        for k in self.splats.keys():
+            self.splats[k].data = ckpt["splats"][k]
+        if self.culling_grid is not None:
+            self.culling_grid.invalidate()
+        self._viewer_snapshot = None
+        for k, optimizer in self.optimizers.items():
+            optimizer.load_state_dict(ckpt["optimizers"][k])
+        if self.cfg.pose_opt:
+            if self.world_size > 1:
+                self.pose_adjust.module.load_state_dict(ckpt["pose_adjust"])
+            else:
+                self.pose_adjust.load_state_dict(ckpt["pose_adjust"])
+        if self.cfg.app_opt:
+            if self.world_size > 1:
+                self.app_module.module.load_state_dict(ckpt["app_module"])
+            else:
+                self.app_module.load_state_dict(ckpt["app_module"])
+        if self.cfg.use_bilateral_grid:
+            self.bil_grids.load_state_dict(ckpt["bil_grids"])
+        for optimizers, key in [
+            (self.pose_optimizers, "pose_optimizers"),
+            (self.app_optimizers, "app_optimizers"),
+            (self.bil_grid_optimizers, "bil_grid_optimizers"),
+        ]:
+            for optimizer, state in zip(optimizers, ckpt[key]):
+                optimizer.load_state_dict(state)
+        self.strategy_state = ckpt["strategy_state"]
+        self.resume_state = {
+            k: ckpt[k] for k in ["step", "schedulers", "rng", "dataloader"]
+        }
+        print(f"Resuming from {path} at step {ckpt['step'] + 1}.")
+
+    def bytes_per_gaussian(self) -> int:
+        """Projected GPU memory of one more GS, in bytes.
+
+        Counts the parameters, their gradients, the optimizer and strategy states
+        holding a row per GS, and the rasterization buffers of a batch.
+        """
+        num_gs = len(self.splats["means"])
+        tensors = [p for p in self.splats.values()] * 2  # parameters and gradients
+        for optimizer in self.optimizers.values():
+            for state in optimizer.state.values():
+                tensors += [v for v in state.values() if isinstance(v, Tensor)]
+        tensors += [v for v in self.strategy_state.values() if isinstance(v, Tensor)]
+        num_bytes = sum(
+            v[0].numel() * v.element_size()
+            for v in tensors
+            if v.dim() > 0 and len(v) == num_gs
+        )
+        return num_bytes + RASTER_BYTES_PER_GAUSSIAN * self.cfg.batch_size
+
+    def gaussian_budget(self) -> Tuple[int, float]:
+        """Returns the number of GSs allowed by `max_gaussians` and `max_memory_gb`,
+        and the GPU memory (GB) projected at that number."""
+        cfg = self.cfg
+        num_gs = len(self.splats["means"])
+        peak_mem = torch.cuda.max_memory_allocated(self.device)
+        per_gs = self.bytes_per_gaussian()
+        budget = cfg.max_gaussians if cfg.max_gaussians is not None else math.inf
+        if cfg.max_memory_gb is not None:
+            free_mem = cfg.max_memory_gb * 1024**3 - peak_mem
+            budget = min(budget, num_gs + int(free_mem // per_gs))
+        budget = max(int(budget), 0)
+        projected_mem = (peak_mem + (budget - num_gs) * per_gs) / 1024**3
+        return budget, projected_mem
+
+    @torch.no_grad()
+    def limit_densification(self) -> int:
+        """Keeps the densification of the next refinement within the GS budget.
+
+        DefaultStrategy grows the GSs whose mean 2D gradient is above `grow_grad2d`,
+        adding one GS each: the threshold is raised so that at most the remaining
+        budget grows. MCMCStrategy stops adding GSs at `cap_max`, which is lowered
+        to the budget. Returns the budget.
+        """
+        strategy = self.cfg.strategy
+        budget, _ = self.gaussian_budget()
+        if isinstance(strategy, MCMCStrategy):
+            strategy.cap_max = min(self.cap_max, budget)
+            return budget
+
+        strategy.grow_grad2d = self.grow_grad2d
+        state = self.strategy_state
+        if state["grad2d"] is None:
+            return budget
+        grads = state["grad2d"] / state["count"].clamp_min(1)
+        remaining = budget - len(grads)
+        if remaining <= 0:
+            # Only prune until the count is back under budget.
+            strategy.grow_grad2d = math.inf
+        elif remaining < len(grads):
+            threshold = torch.topk(grads, remaining + 1, sorted=False).values.min()
+            strategy.grow_grad2d = max(self.grow_grad2d, threshold.item())
+        return budget
+
+    @torch.no_grad()
+    def prune_to_budget(self, budget: int):
+        """Removes the least opaque GSs beyond `budget`.
+
+        Only for DefaultStrategy, as the state of MCMCStrategy is not per GS and
+        its count never exceeds `cap_max`.
+        """
+        num_gs = len(self.splats["means"])
+        if num_gs <= budget or not isinstance(self.cfg.strategy, DefaultStrategy):
+            return
+        order = torch.argsort(self.splats["opacities"])
+        is_pruned = torch.zeros(num_gs, dtype=torch.bool, device=self.device)
+        is_pruned[order[: num_gs - budget]] = True
+        remove(
+            params=self.splats,
+            optimizers=self.optimizers,
+            state=self.strategy_state,
+            mask=is_pruned,
+        )
+        if self.cfg.strategy.verbose:
+            print(f"Pruned {num_gs - budget} GSs to stay within the budget.")
+
     def train(self):
         cfg = self.cfg
         device = self.device
@@ -562,6 +1042,10 @@ class Runner:
 
         max_steps = cfg.max_steps
         init_step = 0
+        use_budget = cfg.max_gaussians is not None or cfg.max_memory_gb is not None
+        resume_state = self.resume_state
+        if resume_state is not None:
+            init_step = resume_state["step"] + 1
 
         schedulers = [
             # means has a learning rate schedule, that end at 0.01 of the initial value
@@ -592,23 +1076,48 @@ class Runner:
                     ]
                 )
             )
-
-        trainloader = torch.utils.data.DataLoader(
-            self.trainset,
-            batch_size=cfg.batch_size,
-            shuffle=True,
-            num_workers=4,
-            persistent_workers=True,
-            pin_memory=True,
-        )
+        if resume_state is not None:
+            for scheduler, state in zip(schedulers, resume_state["schedulers"]):
+                scheduler.load_state_dict(state)
+
+        # Epochs are shuffled by a seeded sampler so that they can be resumed.
+        sampler = ResumableRandomSampler(len(self.trainset), seed=torch.initial_seed())
+        epoch, batch_in_epoch = 0, 0
+        if resume_state is not None:
+            epoch = resume_state["dataloader"]["epoch"]
+            batch_in_epoch = resume_state["dataloader"]["batch"]
+            sampler.set_position(epoch, batch_in_epoch * cfg.batch_size)
+        if cfg.image_store == "dataloader":
+            trainloader = torch.utils.data.DataLoader(
+                self.trainset,
+                batch_size=cfg.batch_size,
+                sampler=sampler,
+                num_workers=4,
+                persistent_workers=True,
+                pin_memory=True,
+            )
+        else:
+            trainloader = DeviceImageStore(
+                self.trainset,
+                batch_size=cfg.batch_size,
+                device=device if cfg.image_store == "device" else "cpu",
+                sampler=sampler,
+            )
         trainloader_iter = iter(trainloader)
+        if resume_state is not None:
+            # After the loader has drawn its worker seeds, as in the original run.
+            set_rng_state(resume_state["rng"], device)
+            self.resume_state = None
 
         # Training loop.
+        train_metrics = MetricsAccumulator()
         global_tic = time.time()
         pbar = tqdm.tqdm(range(init_step, max_steps))
         for step in pbar:
             if not cfg.disable_viewer:
                 while self.viewer.state == "paused":
+                    if self._viewer_snapshot is None and self.server.get_clients():
+                        self.snapshot_splats()
                     time.sleep(0.01)
                 self.viewer.lock.acquire()
                 tic = time.time()
@@ -618,6 +1127,8 @@ class Runner:
             except StopIteration:
                 trainloader_iter = iter(trainloader)
                 data = next(trainloader_iter)
+                epoch, batch_in_epoch = epoch + 1, 0
+            batch_in_epoch += 1
 
             camtoworlds = camtoworlds_gt = data["camtoworld"].to(device)  # [1, 4, 4]
             Ks = data["K"].to(device)  # [1, 3, 3]
@@ -654,6 +1165,14 @@ class Runner:
                 image_ids=image_ids,
                 render_mode="RGB+ED" if cfg.depth_loss else "RGB",
                 masks=masks,
+                # MCMC moves the GSs at every step, the grid would be rebuilt each time.
+                cull=isinstance(self.cfg.strategy, DefaultStrategy),
+                # The visible GSs of a training camera are cached while it is fixed.
+                cache_keys=(
+                    None
+                    if cfg.pose_opt or cfg.pose_noise
+                    else data["image_id"].tolist()
+                ),
             )
             if renders.shape[-1] == 4:
                 colors, depths = renders[..., 0:3], renders[..., 3:4]
@@ -729,15 +1248,29 @@ class Runner:
                 )
 
             loss.backward()
+            if "visible_ids" in info:
+                info = uncull_info(
+                    info, info["visible_ids"], len(self.splats["means"]), cfg.packed
+                )
 
-            desc = f"loss={loss.item():.3f}| " f"sh degree={sh_degree_to_use}| "
+            # Accumulate the metrics on the device, only sync to the host to log them.
+            train_metrics.add(loss=loss, l1loss=l1loss, ssimloss=ssimloss)
             if cfg.depth_loss:
-                desc += f"depth loss={depthloss.item():.6f}| "
+                train_metrics.add(depthloss=depthloss)
+            if cfg.use_bilateral_grid:
+                train_metrics.add(tvloss=tvloss)
             if cfg.pose_opt and cfg.pose_noise:
                 # monitor the pose error if we inject noise
-                pose_err = F.l1_loss(camtoworlds_gt, camtoworlds)
-                desc += f"pose err={pose_err.item():.6f}| "
-            pbar.set_description(desc)
+                train_metrics.add(pose_err=F.l1_loss(camtoworlds_gt, camtoworlds))
+            tb_step = cfg.tb_every > 0 and step % cfg.tb_every == 0
+            if tb_step or step % cfg.metrics_every == 0 or step == max_steps - 1:
+                metrics = train_metrics.materialize()
+                desc = f"loss={metrics['loss']:.3f}| sh degree={sh_degree_to_use}| "
+                if cfg.depth_loss:
+                    desc += f"depth loss={metrics['depthloss']:.6f}| "
+                if "pose_err" in metrics:
+                    desc += f"pose err={metrics['pose_err']:.6f}| "
+                pbar.set_description(desc)
 
             # write images (gt and render)
             # if world_rank == 0 and step % 800 == 0:
@@ -748,51 +1281,23 @@ class Runner:
             #         (canvas * 255).astype(np.uint8),
             #     )
 
-            if world_rank == 0 and cfg.tb_every > 0 and step % cfg.tb_every == 0:
+            if world_rank == 0 and tb_step:
                 mem = torch.cuda.max_memory_allocated() / 1024**3
-                self.writer.add_scalar("train/loss", loss.item(), step)
-                self.writer.add_scalar("train/l1loss", l1loss.item(), step)
-                self.writer.add_scalar("train/ssimloss", ssimloss.item(), step)
+                # means over the steps since the last log
+                for name, value in metrics.items():
+                    self.writer.add_scalar(f"train/{name}", value, step)
                 self.writer.add_scalar("train/num_GS", len(self.splats["means"]), step)
                 self.writer.add_scalar("train/mem", mem, step)
-                if cfg.depth_loss:
-                    self.writer.add_scalar("train/depthloss", depthloss.item(), step)
-                if cfg.use_bilateral_grid:
-                    self.writer.add_scalar("train/tvloss", tvloss.item(), step)
+                if use_budget:
+                    budget, projected_mem = self.gaussian_budget()
+                    self.writer.add_scalar("train/num_GS_budget", budget, step)
+                    self.writer.add_scalar("train/projected_mem", projected_mem, step)
                 if cfg.tb_save_image:
                     canvas = torch.cat([pixels, colors], dim=2).detach().cpu().numpy()
                     canvas = canvas.reshape(-1, *canvas.shape[2:])
                     self.writer.add_image("train/render", canvas, step)
                 self.writer.flush()
 
-            # save checkpoint before updating the model
-            if step in [i - 1 for i in cfg.save_steps] or step == max_steps - 1:
-                mem = torch.cuda.max_memory_allocated() / 1024**3
-                stats = {
-                    "mem": mem,
-                    "ellipse_time": time.time() - global_tic,
-                    "num_GS": len(self.splats["means"]),
-                }
-                print("Step: ", step, stats)
-                with open(
-                    f"{self.stats_dir}/train_step{step:04d}_rank{self.world_rank}.json",
-                    "w",
-                ) as f:
-                    json.dump(stats, f)
-                data = {"step": step, "splats": self.splats.state_dict()}
-                if cfg.pose_opt:
-                    if world_size > 1:
-                        data["pose_adjust"] = self.pose_adjust.module.state_dict()
-                    else:
-                        data["pose_adjust"] = self.pose_adjust.state_dict()
-                if cfg.app_opt:
-                    if world_size > 1:
-                        data["app_module"] = self.app_module.module.state_dict()
-                    else:
-                        data["app_module"] = self.app_module.state_dict()
-                torch.save(
-                    data, f"{self.ckpt_dir}/ckpt_{step}_rank{self.world_rank}.pt"
-                )
             if (
                 step in [i - 1 for i in cfg.ply_steps] or step == max_steps - 1
             ) and cfg.save_ply:
@@ -817,15 +1322,19 @@ class Runner:
                 scales = self.splats["scales"]
                 quats = self.splats["quats"]
                 opacities = self.splats["opacities"]
-                export_splats(
-                    means=means,
-                    scales=scales,
-                    quats=quats,
-                    opacities=opacities,
-                    sh0=sh0,
-                    shN=shN,
-                    format="ply",
-                    save_to=f"{self.ply_dir}/point_cloud_{step}.ply",
+                extension = EXTENSIONS[cfg.export_format]
+                self.async_writer.export_splats(
+                    f"{self.ply_dir}/point_cloud_{step}{extension}",
+                    dict(
+                        means=means,
+                        scales=scales,
+                        quats=quats,
+                        opacities=opacities,
+                        sh0=sh0,
+                        shN=shN,
+                    ),
+                    format=cfg.export_format,
+                    means_dtype=cfg.export_means_dtype,
                 )
 
             # Turn Gradients into Sparse Tensor before running optimizer
@@ -854,12 +1363,16 @@ class Runner:
                     visibility_mask = (info["radii"] > 0).all(-1).any(0)
 
             # optimize
-            for optimizer in self.optimizers.values():
-                if cfg.visible_adam:
-                    optimizer.step(visibility_mask)
-                else:
-                    optimizer.step()
-                optimizer.zero_grad(set_to_none=True)
+            if self.grouped_adam is not None:
+                self.grouped_adam.step()
+                self.grouped_adam.zero_grad(set_to_none=True)
+            else:
+                for optimizer in self.optimizers.values():
+                    if cfg.visible_adam:
+                        optimizer.step(visibility_mask)
+                    else:
+                        optimizer.step()
+                    optimizer.zero_grad(set_to_none=True)
             for optimizer in self.pose_optimizers:
                 optimizer.step()
                 optimizer.zero_grad(set_to_none=True)
@@ -872,6 +1385,11 @@ class Runner:
             for scheduler in schedulers:
                 scheduler.step()
 
+            # Cap the densification to the GS budget
+            budget = None
+            if use_budget and step % self.cfg.strategy.refine_every == 0:
+                budget = self.limit_densification()
+
             # Run post-backward steps after backward and optimizer
             if isinstance(self.cfg.strategy, DefaultStrategy):
                 self.cfg.strategy.step_post_backward(
@@ -893,6 +1411,59 @@ class Runner:
                 )
             else:
                 assert_never(self.cfg.strategy)
+            if budget is not None:
+                self.prune_to_budget(budget)
+            if self.culling_grid is not None:
+                self.culling_grid.tick()
+                if isinstance(self.cfg.strategy, MCMCStrategy):
+                    # Relocated and noised GSs, the grid is rebuilt on the next render.
+                    self.culling_grid.invalidate()
+
+            # save checkpoint after updating the model, so that training can resume
+            # from the next step
+            if step in [i - 1 for i in cfg.save_steps] or step == max_steps - 1:
+                mem = torch.cuda.max_memory_allocated() / 1024**3
+                stats = {
+                    "mem": mem,
+                    "ellipse_time": time.time() - global_tic,
+                    "num_GS": len(self.splats["means"]),
+                }
+                print("Step: ", step, stats)
+                with open(
+                    f"{self.stats_dir}/train_step{step:04d}_rank{self.world_rank}.json",
+                    "w",
+                ) as f:
+                    json.dump(stats, f)
+                data = {"step": step, "splats": self.splats.state_dict()}
+                if cfg.pose_opt:
+                    if world_size > 1:
+                        data["pose_adjust"] = self.pose_adjust.module.state_dict()
+                    else:
+                        data["pose_adjust"] = self.pose_adjust.state_dict()
+                if cfg.app_opt:
+                    if world_size > 1:
+                        data["app_module"] = self.app_module.module.state_dict()
+                    else:
+                        data["app_module"] = self.app_module.state_dict()
+                if cfg.use_bilateral_grid:
+                    data["bil_grids"] = self.bil_grids.state_dict()
+                # training state, for resuming
+                data["optimizers"] = {
+                    k: optimizer.state_dict()
+                    for k, optimizer in self.optimizers.items()
+                }
+                data["pose_optimizers"] = [o.state_dict() for o in self.pose_optimizers]
+                data["app_optimizers"] = [o.state_dict() for o in self.app_optimizers]
+                data["bil_grid_optimizers"] = [
+                    o.state_dict() for o in self.bil_grid_optimizers
+                ]
+                data["schedulers"] = [s.state_dict() for s in schedulers]
+                data["strategy_state"] = self.strategy_state
+                data["rng"] = get_rng_state(device)
+                data["dataloader"] = {"epoch": epoch, "batch": batch_in_epoch}
+                self.async_writer.save(
+                    data, f"{self.ckpt_dir}/ckpt_{step}_rank{self.world_rank}.pt"
+                )
 
             # eval the full set
             if step in [i - 1 for i in cfg.eval_steps]:
@@ -904,6 +1475,12 @@ class Runner:
                 self.run_compression(step=step)
 
             if not cfg.disable_viewer:
+                if (
+                    self._viewer_snapshot is None
+                    or step % cfg.viewer_snapshot_every == 0
+                    or step == max_steps - 1
+                ) and self.server.get_clients():
+                    self.snapshot_splats()
                 self.viewer.lock.release()
                 num_train_steps_per_sec = 1.0 / (max(time.time() - tic, 1e-10))
                 num_train_rays_per_sec = (
@@ -916,29 +1493,59 @@ class Runner:
                 # Update the scene.
                 self.viewer.update(step, num_train_rays_per_step)
 
+        self.async_writer.flush()
+        self.image_writer.flush()
+
+    @torch.no_grad()
+    def image_metrics(self, colors: Tensor, pixels: Tensor) -> Dict[str, Tensor]:
+        """Returns the PSNR, SSIM and LPIPS of each image [C, 3, H, W], as [C] tensors."""
+        num_images = len(colors)
+        # The PSNR of a batch is that of its total error: compute it per image.
+        psnr = torch.stack(
+            [self.psnr(c[None], p[None]) for c, p in zip(colors, pixels)]
+        )
+        # SSIM and LPIPS are means over the batch, which weighs images equally.
+        return {
+            "psnr": psnr,
+            "ssim": self.ssim(colors, pixels).repeat(num_images),
+            "lpips": self.lpips(colors, pixels).repeat(num_images),
+        }
+
     @torch.no_grad()
     def eval(self, step: int, stage: str = "val"):
         """Entry for evaluation."""
+        if len(self.valset) == 0:
+            print("No validation image, skipping evaluation.")
+            return
         print("Running evaluation...")
         cfg = self.cfg
         device = self.device
         world_rank = self.world_rank
         world_size = self.world_size
 
+        # Views of a camera are rendered by batches while the workers decode the
+        # next images.
         valloader = torch.utils.data.DataLoader(
-            self.valset, batch_size=1, shuffle=False, num_workers=1
+            self.valset,
+            batch_sampler=CameraBatchSampler(self.valset, cfg.eval_batch_size),
+            num_workers=cfg.eval_workers,
+            pin_memory=True,
         )
-        ellipse_time = 0
+        render_events = []
         metrics = defaultdict(list)
-        for i, data in enumerate(valloader):
-            camtoworlds = data["camtoworld"].to(device)
-            Ks = data["K"].to(device)
-            pixels = data["image"].to(device) / 255.0
-            masks = data["mask"].to(device) if "mask" in data else None
+        for data in valloader:
+            camtoworlds = data["camtoworld"].to(device, non_blocking=True)
+            Ks = data["K"].to(device, non_blocking=True)
+            pixels = data["image"].to(device, non_blocking=True) / 255.0
+            masks = (
+                data["mask"].to(device, non_blocking=True) if "mask" in data else None
+            )
             height, width = pixels.shape[1:3]
 
-            torch.cuda.synchronize()
-            tic = time.time()
+            # Timed with events, so that the frames are not synchronized.
+            start = torch.cuda.Event(enable_timing=True)
+            end = torch.cuda.Event(enable_timing=True)
+            start.record()
             colors, _, _ = self.rasterize_splats(
                 camtoworlds=camtoworlds,
                 Ks=Ks,
@@ -948,38 +1555,39 @@ class Runner:
                 near_plane=cfg.near_plane,
                 far_plane=cfg.far_plane,
                 masks=masks,
-            )  # [1, H, W, 3]
-            torch.cuda.synchronize()
-            ellipse_time += max(time.time() - tic, 1e-10)
+            )  # [C, H, W, 3]
+            end.record()
+            render_events.append((start, end))
 
             colors = torch.clamp(colors, 0.0, 1.0)
-            canvas_list = [pixels, colors]
 
             if world_rank == 0:
-                # write images
-                canvas = torch.cat(canvas_list, dim=2).squeeze(0).cpu().numpy()
-                canvas = (canvas * 255).astype(np.uint8)
-                imageio.imwrite(
-                    f"{self.render_dir}/{stage}_step{step}_{i:04d}.png",
-                    canvas,
-                )
-
-                pixels_p = pixels.permute(0, 3, 1, 2)  # [1, 3, H, W]
-                colors_p = colors.permute(0, 3, 1, 2)  # [1, 3, H, W]
-                metrics["psnr"].append(self.psnr(colors_p, pixels_p))
-                metrics["ssim"].append(self.ssim(colors_p, pixels_p))
-                metrics["lpips"].append(self.lpips(colors_p, pixels_p))
+                if cfg.eval_save_images:
+                    # write images, encoded in the background
+                    canvas = torch.cat([pixels, colors], dim=2)
+                    canvas = (canvas * 255).to(torch.uint8)
+                    for image_id, image in zip(data["image_id"].tolist(), canvas):
+                        self.image_writer.save_image(
+                            f"{self.render_dir}/{stage}_step{step}_{image_id:04d}.png",
+                            image,
+                        )
+
+                # metrics stay on the device until the end of the evaluation
+                pixels_p = pixels.permute(0, 3, 1, 2)  # [C, 3, H, W]
+                colors_p = colors.permute(0, 3, 1, 2)  # [C, 3, H, W]
+                for k, v in self.image_metrics(colors_p, pixels_p).items():
+                    metrics[k].append(v)
                 if cfg.use_bilateral_grid:
                     cc_colors = color_correct(colors, pixels)
-                    cc_colors_p = cc_colors.permute(0, 3, 1, 2)  # [1, 3, H, W]
-                    metrics["cc_psnr"].append(self.psnr(cc_colors_p, pixels_p))
-                    metrics["cc_ssim"].append(self.ssim(cc_colors_p, pixels_p))
-                    metrics["cc_lpips"].append(self.lpips(cc_colors_p, pixels_p))
+                    cc_colors_p = cc_colors.permute(0, 3, 1, 2)  # [C, 3, H, W]
+                    for k, v in self.image_metrics(cc_colors_p, pixels_p).items():
+                        metrics[f"cc_{k}"].append(v)
 
+        torch.cuda.synchronize()
+        ellipse_time = sum(start.elapsed_time(end) for start, end in render_events)
+        ellipse_time /= 1000 * max(len(self.valset), 1)
         if world_rank == 0:
-            ellipse_time /= len(valloader)
-
-            stats = {k: torch.stack(v).mean().item() for k, v in metrics.items()}
+            stats = {k: torch.cat(v).mean().item() for k, v in metrics.items()}
             stats.update(
                 {
                     "ellipse_time": ellipse_time,
@@ -1008,13 +1616,36 @@ class Runner:
             self.writer.flush()
 
     @torch.no_grad()
-    def render_traj(self, step: int):
-        """Entry for trajectory rendering."""
+    def render_traj(
+        self,
+        step: int,
+        batch_size: Optional[int] = None,
+        fps: Optional[float] = None,
+        scale: Optional[float] = None,
+        rgb_only: Optional[bool] = None,
+    ):
+        """Entry for trajectory rendering.
+
+        Frames are rendered by batches and encoded in the background while the
+        next batch renders. The options default to the `traj_*` fields of the
+        config.
+
+        Args:
+            step (int): The training step, used to name the video.
+            batch_size (Optional[int]): The number of frames rendered together.
+            fps (Optional[float]): The frame rate of the video.
+            scale (Optional[float]): The resolution, relative to the first camera.
+            rgb_only (Optional[bool]): If True, leaves out the depth panel.
+        """
         if self.cfg.disable_video:
             return
         print("Running trajectory rendering...")
         cfg = self.cfg
         device = self.device
+        batch_size = batch_size if batch_size is not None else cfg.traj_batch_size
+        fps = fps if fps is not None else cfg.traj_fps
+        scale = scale if scale is not None else cfg.traj_scale
+        rgb_only = rgb_only if rgb_only is not None else cfg.traj_rgb_only
 
         camtoworlds_all = self.parser.camtoworlds[5:-5]
         if cfg.render_traj_path == "interp":
@@ -1050,14 +1681,19 @@ class Runner:
         camtoworlds_all = torch.from_numpy(camtoworlds_all).float().to(device)
         K = torch.from_numpy(list(self.parser.Ks_dict.values())[0]).float().to(device)
         width, height = list(self.parser.imsize_dict.values())[0]
+        if scale != 1.0:
+            K[:2] *= scale
+            width, height = round(width * scale), round(height * scale)
 
         # save to video
         video_dir = f"{cfg.result_dir}/videos"
         os.makedirs(video_dir, exist_ok=True)
-        writer = imageio.get_writer(f"{video_dir}/traj_{step}.mp4", fps=30)
-        for i in tqdm.trange(len(camtoworlds_all), desc="Rendering trajectory"):
-            camtoworlds = camtoworlds_all[i : i + 1]
-            Ks = K[None]
+        writer = AsyncVideoWriter(f"{video_dir}/traj_{step}.mp4", fps=fps)
+        for i in tqdm.trange(
+            0, len(camtoworlds_all), batch_size, desc="Rendering trajectory"
+        ):
+            camtoworlds = camtoworlds_all[i : i + batch_size]
+            Ks = K[None].expand(len(camtoworlds), -1, -1)
 
             renders, _, _ = self.rasterize_splats(
                 camtoworlds=camtoworlds,
@@ -1067,17 +1703,19 @@ class Runner:
                 sh_degree=cfg.sh_degree,
                 near_plane=cfg.near_plane,
                 far_plane=cfg.far_plane,
-                render_mode="RGB+ED",
-            )  # [1, H, W, 4]
-            colors = torch.clamp(renders[..., 0:3], 0.0, 1.0)  # [1, H, W, 3]
-            depths = renders[..., 3:4]  # [1, H, W, 1]
-            depths = (depths - depths.min()) / (depths.max() - depths.min())
-            canvas_list = [colors, depths.repeat(1, 1, 1, 3)]
-
-            # write images
-            canvas = torch.cat(canvas_list, dim=2).squeeze(0).cpu().numpy()
-            canvas = (canvas * 255).astype(np.uint8)
-            writer.append_data(canvas)
+                render_mode="RGB" if rgb_only else "RGB+ED",
+            )  # [B, H, W, 3 or 4]
+            canvas = torch.clamp(renders[..., 0:3], 0.0, 1.0)  # [B, H, W, 3]
+            if not rgb_only:
+                depths = renders[..., 3:4]  # [B, H, W, 1]
+                # normalized per frame
+                near = depths.amin(dim=(1, 2, 3), keepdim=True)
+                far = depths.amax(dim=(1, 2, 3), keepdim=True)
+                depths = (depths - near) / (far - near)
+                canvas = torch.cat([canvas, depths.repeat(1, 1, 1, 3)], dim=2)
+
+            # write images, encoded in the background
+            writer.append((canvas * 255).to(torch.uint8))
         writer.close()
         print(f"Video saved to {video_dir}/traj_{step}.mp4")
 
@@ -1090,12 +1728,14 @@ class Runner:
         compress_dir = f"{cfg.result_dir}/compression/rank{world_rank}"
         os.makedirs(compress_dir, exist_ok=True)
 
-        self.compression_method.compress(compress_dir, self.splats)
+        self.compression_method.compress(
+            compress_dir, {k: v.float() for k, v in self.splats.items()}
+        )
 
         # evaluate compression
         splats_c = self.compression_method.decompress(compress_dir)
         for k in splats_c.keys():
-            self.splats[k].data = splats_c[k].to(self.device)
+            self.splats[k].data = splats_c[k].to(self.device, self.splats[k].dtype)
         self.eval(step=step, stage="compress")
 
     @torch.no_grad()
@@ -1113,6 +1753,16 @@ class Runner:
         K = camera_state.get_K((width, height))
         c2w = torch.from_numpy(c2w).float().to(self.device)
         K = torch.from_numpy(K).float().to(self.device)
+        sh_degree = min(render_tab_state.max_sh_degree, self.cfg.sh_degree)
+        if render_tab_state.sh_degree_limit is not None:
+            if not render_tab_state.preview_render:
+                sh_degree = min(sh_degree, render_tab_state.sh_degree_limit)
+
+        # Render a copy of the splats, so that training steps are not waited for.
+        # It is only taken between training steps, nothing is rendered until then.
+        snapshot = self._viewer_snapshot
+        if snapshot is None:
+            return np.zeros((height, width, 3), dtype=np.float32)
 
         RENDER_MODE_MAP = {
             "rgb": "RGB",
@@ -1126,7 +1776,7 @@ class Runner:
             Ks=K[None],
             width=width,
             height=height,
-            sh_degree=min(render_tab_state.max_sh_degree, self.cfg.sh_degree),
+            sh_degree=sh_degree,
             near_plane=render_tab_state.near_plane,
             far_plane=render_tab_state.far_plane,
             radius_clip=render_tab_state.radius_clip,
@@ -1136,8 +1786,9 @@ class Runner:
             render_mode=RENDER_MODE_MAP[render_tab_state.render_mode],
             rasterize_mode=render_tab_state.rasterize_mode,
             camera_model=render_tab_state.camera_model,
+            snapshot=snapshot,
         )  # [1, H, W, 3]
-        render_tab_state.total_gs_count = len(self.splats["means"])
+        render_tab_state.total_gs_count = len(snapshot.splats["means"])
         render_tab_state.rendered_gs_count = (info["radii"] > 0).all(-1).sum().item()
 
         if render_tab_state.render_mode == "rgb":
@@ -1172,23 +1823,105 @@ class Runner:
         return renders
 
 
+def train_blocks(local_rank: int, world_rank: int, world_size: int, cfg: Config):
+    """Trains the scene cell by cell and merges the cells into a single export.
+
+    Each rank trains its share of the cells one after another, on its own. A
+    trained cell is paged out to host memory or disk before the next one is
+    built, so that a single cell has to fit on the device. Rank 0 then gathers
+    the GSs of every cell within its core bounds.
+    """
+    if cfg.app_opt:
+        raise ValueError("Block training does not support appearance optimization.")
+    offload = cfg.block_offload
+    if world_size > 1 and offload == "cpu":
+        print("Cells are shared between ranks on disk, ignoring block_offload.")
+        offload = "disk"
+
+    block_dir = f"{cfg.result_dir}/blocks"
+    os.makedirs(block_dir, exist_ok=True)
+    parser = Parser(
+        data_dir=cfg.data_dir,
+        factor=cfg.data_factor,
+        normalize=cfg.normalize_world_space,
+        test_every=cfg.test_every,
+        use_cache=cfg.parser_cache,
+        png_compress_level=cfg.png_compress_level,
+        cache_dir=f"{cfg.result_dir}/cache",
+    )
+    blocks = partition_scene(
+        parser, cfg.block_grid, cfg.block_overlap, cfg.block_min_points
+    )
+    if world_rank == 0:
+        save_blocks(f"{block_dir}/blocks.json", blocks, parser)
+    del parser
+
+    store = BlockStore(offload)
+    for block in blocks[world_rank::world_size]:
+        if len(block.image_indices) == 0:
+            print(f"[Block {block.id}] No image sees the cell, skipping it.")
+            continue
+        print(f"[Block {block.id}] Training on {len(block.image_indices)} images.")
+        block_cfg = replace(
+            cfg,
+            result_dir=f"{block_dir}/{block.id}",
+            disable_viewer=True,
+            disable_video=True,
+            block_grid=None,
+        )
+        runner = Runner(local_rank, 0, 1, block_cfg, block=block)
+        runner.train()
+        store.page_out(block.id, runner)
+        del runner
+        torch.cuda.empty_cache()
+
+    if world_size > 1:
+        torch.distributed.barrier()
+    if world_rank != 0:
+        return
+    for block in blocks:
+        if block.id not in store.states and len(block.image_indices) > 0:
+            ckpt = latest_checkpoint(f"{block_dir}/{block.id}/ckpts")
+            store.add_checkpoint(block.id, str(ckpt))
+    splats = merge_blocks(blocks, store)
+    ply_dir = f"{cfg.result_dir}/ply"
+    os.makedirs(ply_dir, exist_ok=True)
+    path = f"{ply_dir}/point_cloud_{cfg.max_steps - 1}{EXTENSIONS[cfg.export_format]}"
+    write_splats(
+        path, splats, format=cfg.export_format, means_dtype=cfg.export_means_dtype
+    )
+    print(f"Merged {len(splats['means'])} GSs of {len(store.states)} cells in {path}")
+
+
 def main(local_rank: int, world_rank, world_size: int, cfg: Config):
     if world_size > 1 and not cfg.disable_viewer:
         cfg.disable_viewer = True
         if world_rank == 0:
             print("Viewer is disabled in distributed training.")
 
+    if cfg.block_grid is not None and cfg.ckpt is None:
+        train_blocks(local_rank, world_rank, world_size, cfg)
+        return
+
     runner = Runner(local_rank, world_rank, world_size, cfg)
 
-    if cfg.ckpt is not None:
+    if cfg.resume:
+        ckpt = None
+        if cfg.ckpt is not None:
+            ckpt = cfg.ckpt[world_rank]
+        else:
+            try:
+                ckpt = latest_checkpoint(runner.ckpt_dir, world_rank)
+            except FileNotFoundError:
+                print(
+                    f"No checkpoint found in {runner.ckpt_dir}, training from scratch."
+                )
+        if ckpt is not None:
+            runner.load_train_state(ckpt)
+        runner.train()
+    elif cfg.ckpt is not None:
         # run eval only
-        ckpts = [
-            torch.load(file, map_location=runner.device, weights_only=True)
-            for file in cfg.ckpt
-        ]
-        for k in runner.splats.keys():
-            runner.splats[k].data = torch.cat([ckpt["splats"][k] for ckpt in ckpts])
-        step = ckpts[0]["step"]
+        step = runner.load_splats(cfg.ckpt)
         runner.eval(step=step)
         runner.render_traj(step=step)
         if cfg.compression is not None:
@@ -1197,6 +1930,8 @@ def main(local_rank: int, world_rank, world_size: int, cfg: Config):
         runner.train()
 
     if not cfg.disable_viewer:
+        # The splats are not trained anymore, the viewer renders them directly.
+        runner.snapshot_splats(copy=False)
         runner.viewer.complete()
         print("Viewer running... Ctrl+C to exit.")
         time.sleep(1000000)
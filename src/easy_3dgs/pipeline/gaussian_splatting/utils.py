@@ -1,8 +1,9 @@
+import math
 import random
+from typing import Dict, Optional, Tuple, Union
 
 import numpy as np
 import torch
-from sklearn.neighbors import NearestNeighbors
 from torch import Tensor
 import torch.nn.functional as F
 import matplotlib.pyplot as plt
@@ -114,6 +115,38 @@ class AppearanceOptModule(torch.nn.Module):
         return colors
 
 
+class MetricsAccumulator:
+    """Running means of scalar training metrics, kept on their device.
+
+    `add` only queues device-side additions, so it does not wait for the GPU.
+    `materialize` copies all the means to the host with a single synchronization
+    and starts a new window.
+    """
+
+    def __init__(self):
+        self.sums: Dict[str, Tensor] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add(self, **metrics: Tensor):
+        for name, value in metrics.items():
+            value = value.detach().float()
+            if name in self.sums:
+                self.sums[name] += value
+                self.counts[name] += 1
+            else:
+                self.sums[name] = value.clone()
+                self.counts[name] = 1
+
+    def materialize(self) -> Dict[str, float]:
+        """Returns the means since the last call and resets them."""
+        if not self.sums:
+            return {}
+        names = list(self.sums)
+        means = torch.stack([self.sums[n] / self.counts[n] for n in names]).tolist()
+        self.sums, self.counts = {}, {}
+        return dict(zip(names, means))
+
+
 def rotation_6d_to_matrix(d6: Tensor) -> Tensor:
     """
     Converts 6D rotation representation by Zhou et al. [1] to rotation matrix
@@ -138,11 +171,283 @@ def rotation_6d_to_matrix(d6: Tensor) -> Tensor:
     return torch.stack((b1, b2, b3), dim=-2)
 
 
-def knn(x: Tensor, K: int = 4) -> Tensor:
-    x_np = x.cpu().numpy()
-    model = NearestNeighbors(n_neighbors=K, metric="euclidean").fit(x_np)
-    distances, _ = model.kneighbors(x_np)
-    return torch.from_numpy(distances).to(x)
+def knn(
+    x: Tensor,
+    K: int = 4,
+    chunk_size: int = 65536,
+    max_candidates: int = 1 << 24,
+    max_radius: int = 4,
+    max_levels: int = 4,
+) -> Tensor:
+    """Distances to the K nearest neighbors of every point, itself included.
+
+    The points are bucketed into a uniform grid holding about K points per cell,
+    over the 1%-99% quantiles of the points so that outliers do not inflate the
+    cells: they fall in the border cells. The neighbors of each chunk of queries
+    are searched in the block of cells around them, which is grown until it
+    provably contains the K nearest points; queries still unresolved at
+    `max_radius` cells fall back to a grid with larger cells. Clustered points,
+    which would crowd a few cells, are first searched in finer grids; the
+    queries unresolved in the coarsest grid (isolated outliers) fall back to a
+    chunked brute-force search. Runs on the device of `x`.
+
+    On CPU, distances are computed in double precision and match
+    `sklearn.neighbors.NearestNeighbors` exactly, except for tiny inputs
+    (K >= N // 2): sklearn then switches to its brute-force algorithm, whose
+    distances expanded as |x|^2 - 2 x.y + |y|^2 may differ in the last bit.
+
+    Args:
+        x: (N, D) points.
+        K: number of neighbors.
+        chunk_size: maximum number of queries processed at once.
+        max_candidates: bound on the number of query-candidate pairs held in memory,
+            a query with more candidates scanning them in chunks.
+        max_radius: largest searched block, in cells around the query.
+        max_levels: largest number of grids, each `2 * max_radius` times finer
+            than the next one.
+
+    Returns:
+        distances: (N, K), in ascending order.
+    """
+    N, D = x.shape
+    assert N >= K, f"knn needs at least K={K} points, got {N}."
+    device = x.device
+    dtype = torch.float64 if device.type == "cpu" else x.dtype
+    points = x.detach().to(dtype)
+
+    # --- Grid bounds, and the cell size holding about K points on average ---
+    # Clamping the outliers into the border cells never brings two cells closer
+    # than their points are, so the search bounds below still hold.
+    sample = points[:: max(N // (1 << 16), 1)]
+    lo = torch.quantile(sample, 0.01, dim=0)
+    extent = torch.quantile(sample, 0.99, dim=0) - lo
+    spread = extent[extent > 0].double()
+    cell = 1.0
+    if len(spread) > 0:
+        cell = float((spread.log().sum() + math.log(K / N)) / len(spread))
+        cell = math.exp(cell)
+
+    # Clustered points crowd a few cells of that grid: the search then starts on
+    # finer grids, and the queries they leave unresolved move to coarser ones.
+    cells = [cell]
+    grid = _KnnGrid(points, lo, extent, cell)
+    while len(cells) < max_levels and grid.occupancy() > 8 * K:
+        finer = _KnnGrid(points, lo, extent, cells[0] / (2 * max_radius))
+        if finer.cell >= cells[0]:
+            break
+        grid = finer
+        cells.insert(0, grid.cell)
+
+    # --- Grid search, growing the block around unresolved queries ---
+    out = torch.full((N, K), float("inf"), dtype=dtype, device=device)
+    pending = torch.arange(N, device=device)
+    for level, cell in enumerate(cells):
+        if len(pending) == 0:
+            break
+        if level > 0:
+            grid = _KnnGrid(points, lo, extent, cell)
+        pending = grid.search(pending, out, K, chunk_size, max_candidates, max_radius)
+
+    # --- Brute force for the remaining outliers ---
+    if N > max_candidates:
+        everything = torch.tensor([0], device=device), torch.tensor([N], device=device)
+        for query in pending[:, None]:
+            out[query] = _knn_scan_ranges(
+                points, query, *everything, K, max_candidates
+            )[0]
+    else:
+        for queries in pending.split(max_candidates // N):
+            dists = _squared_distances(points[queries][:, None], points[None])
+            out[queries] = dists.topk(K, dim=-1, largest=False).values
+
+    return out.sqrt().to(x.dtype)
+
+
+class _KnnGrid:
+    """The points of `knn` sorted by cell of a uniform grid, every cell being a
+    contiguous range."""
+
+    def __init__(self, points: Tensor, lo: Tensor, extent: Tensor, cell: float):
+        D = points.shape[1]
+        dims = (extent.double() / cell).floor().long() + 1
+        while float(dims.double().prod()) > 2**62:
+            cell *= 2
+            dims = (extent.double() / cell).floor().long() + 1
+        strides = torch.ones(D, dtype=torch.long, device=points.device)
+        for d in range(D - 2, -1, -1):
+            strides[d] = strides[d + 1] * dims[d + 1]
+        coords = ((points - lo) / cell).floor().long()
+        coords = torch.minimum(coords.clamp_min(0), dims - 1)
+        self.keys, self.order = ((coords * strides).sum(dim=-1)).sort()
+        self.points, self.coords = points[self.order], coords[self.order]
+        self.cell, self.dims, self.strides = cell, dims, strides
+
+    def occupancy(self) -> float:
+        """Mean number of points in the cell of a point."""
+        counts = torch.unique_consecutive(self.keys, return_counts=True)[1]
+        return float((counts.double() ** 2).sum()) / len(self.keys)
+
+    def search(
+        self,
+        queries: Tensor,
+        out: Tensor,
+        K: int,
+        chunk_size: int,
+        max_candidates: int,
+        max_radius: int,
+    ) -> Tensor:
+        """Writes the squared distances of the resolved `queries` to `out`, and
+        returns the unresolved ones."""
+        N, D = self.points.shape
+        device = self.points.device
+        rank = torch.empty_like(self.order)
+        rank[self.order] = torch.arange(N, device=device)
+        pending = rank[queries]
+        r = 1
+        while len(pending) > 0 and r <= max_radius:
+            offsets = torch.arange(-r, r + 1, device=device)
+            offsets = torch.cartesian_prod(*([offsets] * D)).reshape(-1, D)  # [M, D]
+            step = max(1, min(chunk_size, max_candidates // (len(offsets) * D)))
+            unresolved = []
+            for chunk in pending.split(step):
+                dists, resolved = _knn_grid_search(
+                    self.points,
+                    self.coords,
+                    self.keys,
+                    chunk,
+                    offsets,
+                    self.dims,
+                    self.strides,
+                    K,
+                    max_candidates,
+                )
+                # Points outside the block are at least (r - margin) cells away.
+                resolved &= dists[:, -1] <= ((r - 1e-3) * self.cell) ** 2
+                out[self.order[chunk[resolved]]] = dists[resolved]
+                unresolved.append(chunk[~resolved])
+            pending = torch.cat(unresolved)
+            r *= 2
+        return self.order[pending]
+
+
+def _squared_distances(a: Tensor, b: Tensor) -> Tensor:
+    # Accumulate coordinate by coordinate, in the same order as sklearn.
+    diff = a - b
+    dists = diff[..., 0] ** 2
+    for d in range(1, diff.shape[-1]):
+        dists = dists + diff[..., d] ** 2
+    return dists
+
+
+def _knn_grid_search(
+    points: Tensor,
+    coords: Tensor,
+    keys: Tensor,
+    queries: Tensor,
+    offsets: Tensor,
+    dims: Tensor,
+    strides: Tensor,
+    K: int,
+    max_candidates: int,
+) -> Tuple[Tensor, Tensor]:
+    """K smallest squared distances from `queries` to the points of the cells
+    within `offsets` of theirs, and whether K candidates were found.
+
+    Points are sorted by cell `keys`, so every cell is a contiguous range.
+    """
+    B, M = len(queries), len(offsets)
+    neighbors = coords[queries][:, None, :] + offsets[None]  # [B, M, D]
+    valid = ((neighbors >= 0) & (neighbors < dims)).all(dim=-1)
+    neighbor_keys = (neighbors * strides).sum(dim=-1)
+    starts = torch.searchsorted(keys, neighbor_keys)
+    counts = torch.searchsorted(keys, neighbor_keys, right=True) - starts
+    counts = torch.where(valid, counts, 0).flatten()  # [B * M]
+    total = int(counts.sum())
+    if total > max_candidates and B > 1:
+        # Dense cells: split the chunk to bound memory.
+        half = B // 2
+        first = _knn_grid_search(
+            points,
+            coords,
+            keys,
+            queries[:half],
+            offsets,
+            dims,
+            strides,
+            K,
+            max_candidates,
+        )
+        second = _knn_grid_search(
+            points,
+            coords,
+            keys,
+            queries[half:],
+            offsets,
+            dims,
+            strides,
+            K,
+            max_candidates,
+        )
+        return torch.cat([first[0], second[0]]), torch.cat([first[1], second[1]])
+    if total > max_candidates:
+        # A single query in dense cells: scan its candidates by chunks.
+        return _knn_scan_ranges(
+            points,
+            queries,
+            starts.flatten()[counts > 0],
+            counts[counts > 0],
+            K,
+            max_candidates,
+        )
+
+    # Expand the cell ranges into (query, candidate) pairs.
+    segments = torch.repeat_interleave(
+        torch.arange(B * M, device=points.device), counts
+    )
+    segment_starts = torch.cumsum(counts, dim=0) - counts
+    candidates = starts.flatten()[segments] + (
+        torch.arange(total, device=points.device) - segment_starts[segments]
+    )
+    owners = segments // M
+    dists = _squared_distances(points[candidates], points[queries][owners])
+
+    # Sort by distance, then by query: each query's candidates become contiguous
+    # and ascending, and the first K of each are its nearest neighbors.
+    dists, perm = dists.sort(stable=True)
+    owners, perm = owners[perm].sort(stable=True)
+    dists = dists[perm]
+    num_candidates = counts.view(B, M).sum(dim=-1)
+    first = torch.cumsum(num_candidates, dim=0) - num_candidates
+    rank = torch.arange(K, device=points.device)
+    index = first[:, None] + rank[None]
+    found = rank[None] < num_candidates[:, None]
+    result = torch.full((B, K), float("inf"), dtype=points.dtype, device=points.device)
+    result[found] = dists[index[found]]
+    return result, num_candidates >= K
+
+
+def _knn_scan_ranges(
+    points: Tensor,
+    queries: Tensor,
+    starts: Tensor,
+    counts: Tensor,
+    K: int,
+    max_candidates: int,
+) -> Tuple[Tensor, Tensor]:
+    """K smallest squared distances from a single query to the points of the
+    ranges `starts`/`counts`, computed on at most `max_candidates` points at once.
+    """
+    query = points[queries]  # [1, D]
+    best = torch.full((K,), float("inf"), dtype=points.dtype, device=points.device)
+    for start, count in zip(starts.tolist(), counts.tolist()):
+        for begin in range(start, start + count, max_candidates):
+            end = min(begin + max_candidates, start + count)
+            dists = _squared_distances(points[begin:end], query)
+            best = torch.cat([best, dists]).topk(K, largest=False).values
+    num_candidates = int(counts.sum())
+    return best.sort().values[None], torch.tensor(
+        [num_candidates >= K], device=points.device
+    )
 
 
 def rgb_to_sh(rgb: Tensor) -> Tensor:
@@ -156,6 +461,55 @@ def set_random_seed(seed: int):
     torch.manual_seed(seed)
 
 
+def get_rng_state(device: Optional[Union[str, torch.device]] = None) -> dict:
+    """Snapshots the Python, NumPy, torch and CUDA (on `device`) RNG states.
+
+    The states are stored as tensors and plain Python values, so that checkpoints
+    holding them load with `torch.load(..., weights_only=True)`.
+    """
+    version, python_state, gauss_next = random.getstate()
+    name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    state = {
+        "python": {
+            "version": version,
+            "state": torch.tensor(python_state, dtype=torch.int64),
+            "gauss_next": gauss_next,
+        },
+        "numpy": {
+            "name": name,
+            "keys": torch.from_numpy(keys.astype(np.int64)),
+            "pos": int(pos),
+            "has_gauss": int(has_gauss),
+            "cached_gaussian": float(cached_gaussian),
+        },
+        "torch": torch.get_rng_state(),
+    }
+    if device is not None and torch.device(device).type == "cuda":
+        state["cuda"] = torch.cuda.get_rng_state(device)
+    return state
+
+
+def set_rng_state(state: dict, device: Optional[Union[str, torch.device]] = None):
+    """Restores RNG states saved by `get_rng_state`."""
+    python = state["python"]
+    random.setstate(
+        (python["version"], tuple(python["state"].tolist()), python["gauss_next"])
+    )
+    numpy = state["numpy"]
+    np.random.set_state(
+        (
+            numpy["name"],
+            numpy["keys"].cpu().numpy().astype(np.uint32),
+            numpy["pos"],
+            numpy["has_gauss"],
+            numpy["cached_gaussian"],
+        )
+    )
+    torch.set_rng_state(state["torch"].cpu())
+    if "cuda" in state and device is not None:
+        torch.cuda.set_rng_state(state["cuda"].cpu(), device)
+
+
 # ref: https://github.com/hbb1/2d-gaussian-splatting/blob/main/utils/general_utils.py#L163
 def colormap(img, cmap="jet"):
     W, H = img.shape[:2]
@@ -19,10 +19,20 @@ class GaussianSplattingPipeline:
         result_dir: str = "./results/",
         max_steps: int = 30_000,
         eval_steps: Optional[List[int]] = None,
+        eval_batch_size: int = 4,
+        eval_workers: int = 4,
+        eval_save_images: bool = True,
         save_steps: Optional[List[int]] = None,
         save_ply: bool = True,
+        export_format: Literal["ply", "compact"] = "ply",
+        export_means_dtype: Literal["float32", "float16"] = "float16",
+        async_save: bool = True,
         ply_steps: Optional[List[int]] = None,
         disable_video: bool = False,
+        traj_batch_size: int = 8,
+        traj_fps: float = 30,
+        traj_scale: float = 1.0,
+        traj_rgb_only: bool = False,
         init_type: str = "sfm",
         sh_degree: int = 3,
         sh_degree_interval: int = 1000,
@@ -30,7 +40,19 @@ class GaussianSplattingPipeline:
         init_scale: float = 1.0,
         ssim_lambda: float = 0.2,
         antialiased: bool = False,
+        frustum_culling: bool = False,
+        culling_resolution: int = 32,
+        culling_refresh_every: int = 100,
         random_bkgd: bool = False,
+        grouped_adam: bool = False,
+        shN_dtype: Literal["float32", "bfloat16", "float16"] = "float32",
+        shN_moments: Literal["float32", "bfloat16", "int8"] = "float32",
+        max_gaussians: Optional[int] = None,
+        max_memory_gb: Optional[float] = None,
+        block_grid: Optional[Tuple[int, int]] = None,
+        block_overlap: float = 0.2,
+        block_min_points: int = 50,
+        block_offload: Literal["cpu", "disk"] = "disk",
         means_lr: float = 1.6e-4,
         scales_lr: float = 5e-3,
         opacities_lr: float = 5e-2,
@@ -52,17 +74,28 @@ class GaussianSplattingPipeline:
         depth_loss: bool = False,
         depth_lambda: float = 1e-2,
         tb_every: int = 100,
+        metrics_every: int = 10,
         tb_save_image: bool = False,
         lpips_net: Literal["vgg", "alex"] = "alex",
         with_ut: bool = False,
         with_eval3d: bool = False,
         use_fused_bilagrid: bool = False,
         steps_scaler: float = 1.0,
+        png_compress_level: int = 6,
+        parser_cache: bool = True,
+        cache_images: bool = False,
+        cache_ram_gb: float = 8.0,
+        cache_disk_gb: float = 32.0,
+        image_store: Literal["dataloader", "device", "host"] = "dataloader",
+        resume: bool = False,
         # Strategy selection
         strategy_type: Literal["default", "mcmc"] = "default",
         # Other parameters
         disable_viewer: bool = False,
         port: int = 8080,
+        viewer_snapshot_every: int = 100,
+        viewer_frame_time: float = 1 / 30,
+        viewer_move_sh_degree: int = 0,
         batch_size: int = 1,
         # For distributed training, if needed in the future
         local_rank: int = 0,
@@ -74,10 +107,20 @@ class GaussianSplattingPipeline:
             "result_dir": result_dir,
             "max_steps": max_steps,
             "eval_steps": eval_steps if eval_steps is not None else [-1],
+            "eval_batch_size": eval_batch_size,
+            "eval_workers": eval_workers,
+            "eval_save_images": eval_save_images,
             "save_steps": save_steps if save_steps is not None else [7_000, 30_000],
             "save_ply": save_ply,
+            "export_format": export_format,
+            "export_means_dtype": export_means_dtype,
+            "async_save": async_save,
             "ply_steps": ply_steps if ply_steps is not None else [30_000],
             "disable_video": disable_video,
+            "traj_batch_size": traj_batch_size,
+            "traj_fps": traj_fps,
+            "traj_scale": traj_scale,
+            "traj_rgb_only": traj_rgb_only,
             "init_type": init_type,
             "sh_degree": sh_degree,
             "sh_degree_interval": sh_degree_interval,
@@ -85,7 +128,19 @@ class GaussianSplattingPipeline:
             "init_scale": init_scale,
             "ssim_lambda": ssim_lambda,
             "antialiased": antialiased,
+            "frustum_culling": frustum_culling,
+            "culling_resolution": culling_resolution,
+            "culling_refresh_every": culling_refresh_every,
             "random_bkgd": random_bkgd,
+            "grouped_adam": grouped_adam,
+            "shN_dtype": shN_dtype,
+            "shN_moments": shN_moments,
+            "max_gaussians": max_gaussians,
+            "max_memory_gb": max_memory_gb,
+            "block_grid": block_grid,
+            "block_overlap": block_overlap,
+            "block_min_points": block_min_points,
+            "block_offload": block_offload,
             "means_lr": means_lr,
             "scales_lr": scales_lr,
             "opacities_lr": opacities_lr,
@@ -107,14 +162,25 @@ class GaussianSplattingPipeline:
             "depth_loss": depth_loss,
             "depth_lambda": depth_lambda,
             "tb_every": tb_every,
+            "metrics_every": metrics_every,
             "tb_save_image": tb_save_image,
             "lpips_net": lpips_net,
             "with_ut": with_ut,
             "with_eval3d": with_eval3d,
             "use_fused_bilagrid": use_fused_bilagrid,
             "steps_scaler": steps_scaler,
+            "png_compress_level": png_compress_level,
+            "parser_cache": parser_cache,
+            "cache_images": cache_images,
+            "cache_ram_gb": cache_ram_gb,
+            "cache_disk_gb": cache_disk_gb,
+            "image_store": image_store,
+            "resume": resume,
             "disable_viewer": disable_viewer,
             "port": port,
+            "viewer_snapshot_every": viewer_snapshot_every,
+            "viewer_frame_time": viewer_frame_time,
+            "viewer_move_sh_degree": viewer_move_sh_degree,
             "batch_size": batch_size,
         }
 
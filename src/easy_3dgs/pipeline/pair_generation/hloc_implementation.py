@@ -1,12 +1,26 @@
 # src/easy_3dgs/pipeline/pair_generation/hloc_implementation.py
 import logging
 from pathlib import Path
+from typing import List, Optional
 from hloc import pairs_from_retrieval
 from .base import AbstractPairGenerator
 
 class HlocPairGenerator(AbstractPairGenerator):
     """Concrete implementation for pair generation using HLOC."""
-    def run(self, retrieval_path: Path, output_path: Path, num_matched: int):
+    def run(
+        self,
+        retrieval_path: Path,
+        output_path: Path,
+        num_matched: int,
+        query_list: Optional[List[str]] = None,
+        db_list: Optional[List[str]] = None,
+    ):
         logging.info(f"Step 2/6: Generating {num_matched} image pairs...")
-        pairs_from_retrieval.main(retrieval_path, output_path, num_matched=num_matched)
+        pairs_from_retrieval.main(
+            retrieval_path,
+            output_path,
+            num_matched=num_matched,
+            query_list=query_list,
+            db_list=db_list,
+        )
         return output_path
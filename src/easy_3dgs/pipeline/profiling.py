@@ -0,0 +1,195 @@
+# src/easy_3dgs/pipeline/profiling.py
+import json
+import logging
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List
+
+
+class PipelineProfiler:
+    """Records wall time, CPU time, peak RSS, I/O and item counts of pipeline stages.
+
+    CPU time includes terminated child processes (e.g. dataloader workers or
+    ImageMagick). CPU time, I/O and peak RSS are measured for the whole process, so
+    they overlap for stages that run concurrently.
+    """
+
+    def __init__(self):
+        self.records: List[dict] = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Profiles the enclosed block as stage `name` and yields its record."""
+        record = {"stage": name, "cached": False, "counts": {}}
+        _reset_peak_rss()
+        io_start = _read_io()
+        cpu_start = _cpu_time()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            end = time.perf_counter()
+            io_end = _read_io()
+            record.update(
+                {
+                    "start": start - self._origin,
+                    "wall_time": end - start,
+                    "cpu_time": _cpu_time() - cpu_start,
+                    "peak_rss": _peak_rss(),
+                    "bytes_read": io_end["rchar"] - io_start["rchar"],
+                    "bytes_written": io_end["wchar"] - io_start["wchar"],
+                    "thread": threading.get_ident(),
+                }
+            )
+            with self._lock:
+                self.records.append(record)
+            logging.info(
+                f"[{name}] {record['wall_time']:.1f}s wall, "
+                f"{record['cpu_time']:.1f}s CPU, "
+                f"{record['peak_rss'] / 1024**3:.2f} GB peak RSS"
+            )
+
+    def count(self, name: str, **counts: int):
+        """Adds item counts (images, pairs, matches, ...) to the last `name` record."""
+        with self._lock:
+            for record in reversed(self.records):
+                if record["stage"] == name:
+                    record["counts"].update(counts)
+                    return
+
+    def save(self, output_dir: Path, chrome_trace: bool = False) -> Path:
+        """
+        Writes the records to `output_dir/profile.json`.
+
+        Args:
+            output_dir (Path): The directory to write the profile to.
+            chrome_trace (bool): If True, also writes `profile_trace.json` in the
+                Chrome trace event format (chrome://tracing, Perfetto).
+
+        Returns:
+            Path: The path to the JSON profile.
+        """
+        profile_path = Path(output_dir) / "profile.json"
+        summary = {
+            "wall_time": sum(r["wall_time"] for r in self.records),
+            "cpu_time": sum(r["cpu_time"] for r in self.records),
+            "peak_rss": max((r["peak_rss"] for r in self.records), default=0),
+        }
+        with open(profile_path, "w") as f:
+            json.dump({"stages": self.records, "total": summary}, f, indent=2)
+
+        if chrome_trace:
+            pid = os.getpid()
+            events = [
+                {
+                    "name": r["stage"],
+                    "cat": "cached" if r["cached"] else "stage",
+                    "ph": "X",
+                    "ts": r["start"] * 1e6,
+                    "dur": r["wall_time"] * 1e6,
+                    "pid": pid,
+                    "tid": r["thread"],
+                    "args": {
+                        k: v
+                        for k, v in r.items()
+                        if k not in ("stage", "start", "wall_time", "thread")
+                    },
+                }
+                for r in self.records
+            ]
+            with open(Path(output_dir) / "profile_trace.json", "w") as f:
+                json.dump({"traceEvents": events}, f)
+
+        logging.info(f"Pipeline profile written to {profile_path}")
+        return profile_path
+
+
+def count_lines(path: Path) -> int:
+    """Returns the number of non-empty lines of a text file, e.g. a pair list."""
+    with open(path) as f:
+        return sum(1 for line in f if line.strip())
+
+
+def count_files(path: Path) -> int:
+    """Returns the number of files below a directory."""
+    return sum(len(files) for _, _, files in os.walk(path))
+
+
+def count_matches(pairs_path: Path, match_path: Path) -> Dict[str, int]:
+    """Returns the number of matched pairs and matches stored by hloc."""
+    import h5py
+    from hloc.utils.io import find_pair
+
+    num_pairs = num_matches = 0
+    # Opened once, instead of once per pair by `hloc.utils.io.get_matches`.
+    with h5py.File(str(match_path), "r", libver="latest") as hfile:
+        with open(pairs_path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                name0, name1 = line.split()[:2]
+                try:
+                    pair, _ = find_pair(hfile, name0, name1)
+                    matches0 = hfile[pair]["matches0"][()]
+                except (KeyError, ValueError):
+                    continue
+                num_pairs += 1
+                num_matches += int((matches0 != -1).sum())
+    return {"pairs": num_pairs, "matches": num_matches}
+
+
+def count_reconstruction(model_path: Path) -> Dict[str, int]:
+    """Returns the number of registered images and 3D points of a COLMAP model."""
+    import pycolmap
+
+    model = pycolmap.Reconstruction(model_path)
+    return {
+        "registered_images": model.num_reg_images(),
+        "points3D": model.num_points3D(),
+    }
+
+
+def _cpu_time() -> float:
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def _read_io() -> Dict[str, int]:
+    counters = {"rchar": 0, "wchar": 0}
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                key, value = line.split(":")
+                if key in counters:
+                    counters[key] = int(value)
+    except OSError:
+        pass
+    return counters
+
+
+def _reset_peak_rss():
+    # Linux only: resets VmHWM so the peak is measured per stage.
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss() -> int:
+    """Returns the peak resident set size in bytes."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux; this is the peak of the whole process.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
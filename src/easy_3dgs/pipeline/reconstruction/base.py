@@ -1,9 +1,16 @@
 # src/easy_3dgs/pipeline/reconstruction/base.py
 from abc import ABC, abstractmethod
 from pathlib import Path
+from typing import List
 
 class AbstractReconstructor(ABC):
     """Abstract class to perform 3D reconstruction."""
     @abstractmethod
     def run(self, sfm_dir: Path, image_dir: Path, pairs_path: Path, feature_path: Path, match_path: Path, mapper_options: dict = None):
         pass
+
+    def extend(self, sfm_dir: Path, image_dir: Path, image_list: List[str], pairs_path: Path, feature_path: Path, match_path: Path, mapper_options: dict = None):
+        """Registers new images into the existing reconstruction in `sfm_dir`."""
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support incremental reconstruction."
+        )
@@ -1,10 +1,18 @@
 # src/easy_3dgs/pipeline/reconstruction/hloc_implementation.py
 import logging
+import multiprocessing
 import os
 import shutil
 from pathlib import Path
+from typing import List
 
+import pycolmap
 from hloc import reconstruction
+from hloc.triangulation import (
+    estimation_and_geometric_verification,
+    import_features,
+    import_matches,
+)
 
 from .base import AbstractReconstructor
 
@@ -34,3 +42,63 @@ class HlocReconstructor(AbstractReconstructor):
         os.rename(os.path.join(sfm_dir, "models"), os.path.join(sfm_dir, "sparse"))
 
         return model
+
+    def extend(
+        self,
+        sfm_dir: Path,
+        image_dir: Path,
+        image_list: List[str],
+        pairs_path: Path,
+        feature_path: Path,
+        match_path: Path,
+        mapper_options: dict = None,
+    ):
+        """
+        Registers new images into the model in `sfm_dir/sparse/0`.
+
+        The new images, their features and the matches listed in `pairs_path` are
+        added to the database left by `run`, then the incremental mapper resumes
+        from the existing model instead of starting from scratch.
+        """
+        logging.info(
+            f"Step 5/6: Registering {len(image_list)} new images into the reconstruction..."
+        )
+        database = sfm_dir / "database.db"
+        model_path = sfm_dir / "sparse" / "0"
+        if not database.exists() or not model_path.exists():
+            raise FileNotFoundError(
+                f"No existing reconstruction to extend in '{sfm_dir}'."
+            )
+
+        reconstruction.import_images(
+            image_dir, database, pycolmap.CameraMode.AUTO, image_list
+        )
+        image_ids = reconstruction.get_image_ids(database)
+        import_features(
+            {name: image_ids[name] for name in image_list}, database, feature_path
+        )
+        import_matches(image_ids, database, pairs_path, match_path)
+        estimation_and_geometric_verification(database, pairs_path)
+
+        options = {"num_threads": min(multiprocessing.cpu_count(), 16)}
+        options.update(mapper_options or {})
+        output_path = sfm_dir / "models_incremental"
+        shutil.rmtree(output_path, ignore_errors=True)
+        output_path.mkdir(parents=True)
+        models = pycolmap.incremental_mapping(
+            database, image_dir, output_path, options=options, input_path=model_path
+        )
+        if len(models) == 0:
+            raise RuntimeError("Could not extend the reconstruction.")
+
+        # Keep the model that grew out of the existing one as sparse/0.
+        largest_index = max(models, key=lambda i: models[i].num_reg_images())
+        shutil.rmtree(model_path)
+        shutil.move(str(output_path / str(largest_index)), str(model_path))
+        shutil.rmtree(output_path, ignore_errors=True)
+
+        model = models[largest_index]
+        logging.info(
+            f"Reconstruction now has {model.num_reg_images()} registered images."
+        )
+        return model
@@ -1,6 +1,105 @@
+import logging
+import os
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
 
 class BaseResizer(ABC):
-    @abstractmethod
+    """
+    Writes downscaled copies of `sfm_dir/images` to `sfm_dir/images_{mag}`.
+
+    Each source image is decoded once and all its stale pyramid levels are produced
+    from it, each level being derived from the previous one. Images are spread over
+    a pool of `num_workers` processes, and outputs newer than their source are kept.
+    Levels are written to a temporary path and renamed once complete, so that an
+    interrupted run never leaves a truncated image behind.
+    """
+
+    def __init__(self, num_workers: Optional[int] = None):
+        self.num_workers = num_workers or os.cpu_count() or 1
+
     def main(self, sfm_dir: str, magnifications: list[int]):
+        image_dir = os.path.join(sfm_dir, "images")
+        if not os.path.isdir(image_dir):
+            logging.error(f"Image directory not found at {image_dir}. Skipping resize.")
+            return
+
+        magnifications = sorted(set(mag for mag in magnifications if mag != 1))
+        for mag in magnifications:
+            os.makedirs(os.path.join(sfm_dir, f"images_{mag}"), exist_ok=True)
+            _remove_stale_tmp_files(os.path.join(sfm_dir, f"images_{mag}"))
+
+        jobs = []
+        for file in sorted(os.listdir(image_dir)):
+            source_file = os.path.join(image_dir, file)
+            outputs = {
+                mag: os.path.join(sfm_dir, f"images_{mag}", file)
+                for mag in magnifications
+            }
+            outputs = {
+                mag: path
+                for mag, path in outputs.items()
+                if not _is_up_to_date(path, source_file)
+            }
+            if outputs:
+                jobs.append((source_file, outputs))
+
+        logging.info(
+            f"Resizing {len(jobs)} images by factors {magnifications} "
+            f"with {self.num_workers} workers..."
+        )
+        if self.num_workers == 1 or len(jobs) <= 1:
+            for source_file, outputs in jobs:
+                self.resize_pyramid(source_file, outputs)
+            return
+
+        with ProcessPoolExecutor(max_workers=self.num_workers) as executor:
+            # Consume results to surface worker exceptions.
+            for _ in executor.map(
+                self.resize_pyramid,
+                [source_file for source_file, _ in jobs],
+                [outputs for _, outputs in jobs],
+                chunksize=max(1, len(jobs) // (self.num_workers * 4)),
+            ):
+                pass
+
+    @abstractmethod
+    def resize_pyramid(self, source_file: str, outputs: Dict[int, str]):
+        """Writes `source_file` downscaled by each magnification to `outputs[mag]`."""
         pass
+
+    @staticmethod
+    def level_size(width: int, height: int, mag: int) -> Tuple[int, int]:
+        """Size of the level `mag` of a `width` x `height` image, for every engine."""
+        return int(width / mag), int(height / mag)
+
+    @staticmethod
+    def tmp_path(path: str) -> str:
+        """Per-process temporary path of `path`, renamed to it once written."""
+        return f"{path}.{os.getpid()}.tmp"
+
+
+# Age after which a temporary file is considered left by an interrupted run.
+STALE_TMP_SECONDS = 3600
+
+
+def _remove_stale_tmp_files(directory: str):
+    # Recent ones may be written by another process resizing the same folder.
+    for file in os.listdir(directory):
+        path = os.path.join(directory, file)
+        try:
+            if (
+                file.endswith(".tmp")
+                and time.time() - os.path.getmtime(path) > STALE_TMP_SECONDS
+            ):
+                os.remove(path)
+        except FileNotFoundError:
+            pass  # Removed by another process meanwhile.
+
+
+def _is_up_to_date(path: str, source_file: str) -> bool:
+    return os.path.isfile(path) and os.path.getmtime(path) >= os.path.getmtime(
+        source_file
+    )
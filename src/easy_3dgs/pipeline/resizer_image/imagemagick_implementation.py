@@ -1,31 +1,49 @@
 import os
-import shutil
-import logging
+import shlex
+import subprocess
+from typing import Dict, Optional
+
+from PIL import Image
 
 from .base import BaseResizer
 
+
 class ImageMagickResizer(BaseResizer):
+    def __init__(self, num_workers: Optional[int] = None, magick_command: str = ""):
+        super().__init__(num_workers)
+        self.magick_command = magick_command
+
     def main(self, sfm_dir: str, magnifications: list[int], magick_command: str = ""):
-        print("Copying and resizing...")
-        
-        image_dir = os.path.join(sfm_dir, "images")
-        files = os.listdir(image_dir)
-
-        for mag in magnifications:
-            if mag == 1:
-                continue
-                
-            output_dir = os.path.join(sfm_dir, f"images_{mag}")
-            os.makedirs(output_dir, exist_ok=True)
-
-            for file in files:
-                source_file = os.path.join(image_dir, file)
-                destination_file = os.path.join(output_dir, file)
-                shutil.copy2(source_file, destination_file)
-                
-                resize_percentage = 100 / mag
-                exit_code = os.system(f"{magick_command} mogrify -resize {resize_percentage}% {destination_file}")
-                
-                if exit_code != 0:
-                    logging.error(f"{resize_percentage}% resize failed with code {exit_code}. Exiting.")
-                    exit(exit_code)
+        if magick_command:
+            self.magick_command = magick_command
+        super().main(sfm_dir, magnifications)
+
+    def resize_pyramid(self, source_file: str, outputs: Dict[int, str]):
+        # Only the header is read, the sizes are those of the other engines.
+        with Image.open(source_file) as img:
+            width, height = img.size
+
+        # A single convert call decodes the source once and writes every level,
+        # each one resized from the previous one to its exact size.
+        command = shlex.split(self.magick_command) + ["convert", source_file]
+        for mag in sorted(outputs):
+            level_width, level_height = self.level_size(width, height, mag)
+            # The format is given since the temporary path ends with .tmp.
+            target = self.tmp_path(outputs[mag])
+            image_format = os.path.splitext(outputs[mag])[1][1:]
+            if image_format:
+                target = f"{image_format}:{target}"
+            command += ["-resize", f"{level_width}x{level_height}!", "-write", target]
+        command.append("null:")
+
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            for path in outputs.values():
+                if os.path.exists(self.tmp_path(path)):
+                    os.remove(self.tmp_path(path))
+            raise RuntimeError(
+                f"Resizing {source_file} failed with code {result.returncode}: "
+                f"{result.stderr.strip()}"
+            )
+        for path in outputs.values():
+            os.replace(self.tmp_path(path), path)
@@ -1,8 +1,13 @@
 # src/easy_3dgs/pipeline/orchestrator.py
 import logging
 import shutil
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Type
+from typing import Callable, Optional, Type
+
+from hloc.extract_features import ImageDataset
+from hloc.utils.io import list_h5_names
 
 from .feature_extraction import HlocFeatureExtractor
 from .feature_extraction.base import AbstractFeatureExtractor
@@ -18,6 +23,14 @@ from .reconstruction import HlocReconstructor
 from .reconstruction.base import AbstractReconstructor
 from .resizer_image import ImageMagickResizer
 from .resizer_image.base import BaseResizer
+from .profiling import (
+    PipelineProfiler,
+    count_files,
+    count_lines,
+    count_matches,
+    count_reconstruction,
+)
+from .stage_cache import StageCache
 
 
 class ReconstructionPipeline:
@@ -85,6 +98,11 @@ class ReconstructionPipeline:
         feature_path: Optional[Path] = None,
         match_path: Optional[Path] = None,
         sfm_dir: Optional[Path] = None,
+        use_cache: bool = False,
+        hash_image_content: bool = False,
+        parallel: bool = False,
+        profile: bool = False,
+        chrome_trace: bool = False,
     ):
         """
         Executes the reconstruction pipeline based on the configured steps.
@@ -93,20 +111,42 @@ class ReconstructionPipeline:
             image_dir (Path): The directory containing the input images.
             output_dir (Path): The directory where results will be saved.
             clean_output (bool): If True, cleans the output directory before starting.
+                When `use_cache` is set, the directory is only cleaned if it holds
+                no stage cache from a previous run.
             resize (bool): If True, resizes the images after undistortion.
             retrieval_path (Path, optional): Path to pre-computed retrieval results.
             sfm_pairs_path (Path, optional): Path to pre-computed pair lists.
             feature_path (Path, optional): Path to pre-computed local features.
             match_path (Path, optional): Path to pre-computed feature matches.
             sfm_dir (Path, optional): Path to the main SfM directory.
+            use_cache (bool): If True, skips every stage whose inputs (images,
+                configuration and upstream artifacts) are unchanged since the
+                previous run in `output_dir`.
+            hash_image_content (bool): If True, the stage cache hashes the input
+                images by content rather than by name, size and modification time.
+            parallel (bool): If True, runs the retrieval and pair generation steps
+                concurrently with local feature extraction. Results are identical to
+                a sequential run.
+            profile (bool): If True, records the wall time, CPU time, peak RSS,
+                bytes read and written and item counts of every stage to
+                `output_dir/profile.json`.
+            chrome_trace (bool): If True with `profile`, also writes the stages as
+                Chrome trace events to `output_dir/profile_trace.json`.
         """
         if not image_dir.exists() or not image_dir.is_dir():
             raise FileNotFoundError(f"Image directory '{image_dir}' does not exist.")
 
-        if clean_output:
+        cache = (
+            StageCache(output_dir, hash_image_content=hash_image_content)
+            if use_cache
+            else None
+        )
+        if clean_output and not (cache and cache.exists()):
             logging.info(f"Cleaning output directory: {output_dir}")
             shutil.rmtree(output_dir, ignore_errors=True)
         output_dir.mkdir(parents=True, exist_ok=True)
+        images_hash = cache.hash_images(image_dir) if cache else None
+        profiler = PipelineProfiler() if profile else None
 
         # --- Define default output paths if not provided ---
         if self.retriever and not retrieval_path:
@@ -116,41 +156,115 @@ class ReconstructionPipeline:
         if self.reconstructor and not sfm_dir:
             sfm_dir = output_dir / f"sfm"
 
-        # --- Execute steps in order ---
-        if self.retriever:
-            retrieval_path = self.retriever.run(image_dir, output_dir)
-        elif not retrieval_path:
+        # --- Check that skipped steps have their inputs ---
+        if not self.retriever and not retrieval_path:
             raise ValueError(
                 "Retriever step is skipped, but 'retrieval_path' was not provided."
             )
-
-        if self.pair_generator:
-            self.pair_generator.run(
-                retrieval_path, sfm_pairs_path, self.num_matched_pairs
-            )
-        elif not sfm_pairs_path:
+        if not self.pair_generator and not sfm_pairs_path:
             raise ValueError(
                 "Pair generator step is skipped, but 'sfm_pairs_path' was not provided."
             )
-
-        if self.extractor:
-            feature_path = self.extractor.run(image_dir, output_dir)
-        elif not feature_path and (
-            not self.matcher
-            or not isinstance(self.matcher, AbstractDenseFeatureMatcher)
+        if (
+            not self.extractor
+            and not feature_path
+            and (
+                not self.matcher
+                or not isinstance(self.matcher, AbstractDenseFeatureMatcher)
+            )
         ):
             raise ValueError(
                 "Extractor step is skipped, but 'feature_path' was not provided."
             )
 
+        # --- Execute steps in order ---
+        def retrieve_and_pair():
+            nonlocal retrieval_path
+            if self.retriever:
+                (retrieval_path,) = self._run_stage(
+                    cache,
+                    profiler,
+                    "retrieval",
+                    (images_hash, self.retrieval_conf),
+                    lambda: (self.retriever.run(image_dir, output_dir),),
+                )
+                if profiler:
+                    profiler.count(
+                        "retrieval", images=len(list_h5_names(retrieval_path))
+                    )
+            if self.pair_generator:
+                self._run_stage(
+                    cache,
+                    profiler,
+                    "pair_generation",
+                    (self.num_matched_pairs, self._fingerprint(cache, retrieval_path)),
+                    lambda: self.pair_generator.run(
+                        retrieval_path, sfm_pairs_path, self.num_matched_pairs
+                    ),
+                    outputs=(sfm_pairs_path,),
+                )
+                if profiler:
+                    profiler.count("pair_generation", pairs=count_lines(sfm_pairs_path))
+
+        def extract():
+            nonlocal feature_path
+            if self.extractor:
+                (feature_path,) = self._run_stage(
+                    cache,
+                    profiler,
+                    "feature_extraction",
+                    (images_hash, self.feature_conf),
+                    lambda: (self.extractor.run(image_dir, output_dir),),
+                )
+                if profiler:
+                    profiler.count(
+                        "feature_extraction", images=len(list_h5_names(feature_path))
+                    )
+
+        if parallel:
+            # Local features do not depend on retrieval: run both branches at once.
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                futures = [executor.submit(retrieve_and_pair), executor.submit(extract)]
+                for future in futures:
+                    future.result()
+        else:
+            retrieve_and_pair()
+            extract()
+
         if self.matcher:
             if isinstance(self.matcher, AbstractDenseFeatureMatcher):
-                feature_path, match_path = self.matcher.run(
-                    sfm_pairs_path, image_dir, output_dir
+                feature_path, match_path = self._run_stage(
+                    cache,
+                    profiler,
+                    "feature_matching",
+                    (
+                        images_hash,
+                        self.matcher_conf,
+                        self._fingerprint(cache, sfm_pairs_path),
+                    ),
+                    lambda: tuple(
+                        self.matcher.run(sfm_pairs_path, image_dir, output_dir)
+                    ),
                 )
             else:
-                match_path = self.matcher.run(
-                    sfm_pairs_path, self.feature_conf["output"], output_dir
+                (match_path,) = self._run_stage(
+                    cache,
+                    profiler,
+                    "feature_matching",
+                    (
+                        self.matcher_conf,
+                        self._fingerprint(cache, sfm_pairs_path),
+                        self._fingerprint(cache, feature_path),
+                    ),
+                    lambda: (
+                        self.matcher.run(
+                            sfm_pairs_path, self.feature_conf["output"], output_dir
+                        ),
+                    ),
+                )
+            if profiler:
+                profiler.count(
+                    "feature_matching", **count_matches(sfm_pairs_path, match_path)
                 )
         elif not match_path:
             raise ValueError(
@@ -158,19 +272,167 @@ class ReconstructionPipeline:
             )
 
         if self.reconstructor:
-            self.reconstructor.run(
-                sfm_dir,
-                image_dir,
-                sfm_pairs_path,
-                feature_path,
-                match_path,
-                self.mapper_options,
+            self._run_stage(
+                cache,
+                profiler,
+                "reconstruction",
+                (
+                    images_hash,
+                    self.mapper_options,
+                    self._fingerprint(cache, sfm_pairs_path),
+                    self._fingerprint(cache, feature_path),
+                    self._fingerprint(cache, match_path),
+                ),
+                lambda: self.reconstructor.run(
+                    sfm_dir,
+                    image_dir,
+                    sfm_pairs_path,
+                    feature_path,
+                    match_path,
+                    self.mapper_options,
+                ),
+                outputs=(sfm_dir / "sparse" / "0",),
+                cleanup=(sfm_dir,),
             )
+            if profiler:
+                profiler.count(
+                    "reconstruction", **count_reconstruction(sfm_dir / "sparse" / "0")
+                )
         elif not sfm_dir:
             raise ValueError(
                 "Reconstructor step is skipped, but 'sfm_dir' was not provided."
             )
 
+        if self.undistorter:
+            self._run_stage(
+                cache,
+                profiler,
+                "undistortion",
+                (images_hash, self._fingerprint(cache, sfm_dir / "sparse" / "0")),
+                lambda: self.undistorter.run(sfm_dir, image_dir),
+                outputs=(sfm_dir / "images",),
+            )
+            if profiler:
+                profiler.count("undistortion", images=count_files(sfm_dir / "images"))
+
+        if resize and self.resizer:
+            magnifications = [2, 4, 8]
+            self._run_stage(
+                cache,
+                profiler,
+                "resize",
+                (
+                    type(self.resizer).__name__,
+                    magnifications,
+                    self._fingerprint(cache, sfm_dir / "images"),
+                ),
+                lambda: self.resizer.main(sfm_dir, magnifications),
+                outputs=tuple(sfm_dir / f"images_{mag}" for mag in magnifications),
+            )
+            if profiler:
+                profiler.count(
+                    "resize",
+                    images=sum(
+                        count_files(sfm_dir / f"images_{mag}") for mag in magnifications
+                    ),
+                )
+
+        if profiler:
+            profiler.save(output_dir, chrome_trace=chrome_trace)
+
+        logging.info(f"\nPipeline finished. Results in: {sfm_dir}")
+        return sfm_dir
+
+    def extend(
+        self,
+        image_dir: Path,
+        output_dir: Path,
+        resize: bool = False,
+    ) -> Path:
+        """
+        Adds the images of `image_dir` that are not yet part of the reconstruction
+        stored in `output_dir` by a previous call to `run`.
+
+        Global and local features are only extracted for the new images and
+        appended to the existing feature files, retrieval pairs are generated for
+        the new images against the whole set, only those pairs are matched, and the
+        new images are registered into the existing `sfm/sparse/0` model.
+
+        Args:
+            image_dir (Path): The directory containing the old and new input images.
+            output_dir (Path): The output directory of the previous run.
+            resize (bool): If True, resizes the images after undistortion.
+
+        Returns:
+            Path: The path to the main SfM directory.
+        """
+        if not image_dir.exists() or not image_dir.is_dir():
+            raise FileNotFoundError(f"Image directory '{image_dir}' does not exist.")
+        if not (self.retriever and self.pair_generator and self.reconstructor):
+            raise ValueError(
+                "Incremental mode requires the retriever, pair generator and "
+                "reconstructor steps."
+            )
+        if not self.extractor or not isinstance(self.matcher, AbstractFeatureMatcher):
+            raise ValueError(
+                "Incremental mode requires a local feature extractor and a sparse "
+                "feature matcher."
+            )
+
+        # --- Locate the artifacts of the previous run ---
+        retrieval_path = output_dir / f"{self.retrieval_conf['output']}.h5"
+        feature_path = output_dir / f"{self.feature_conf['output']}.h5"
+        sfm_pairs_path = output_dir / f"pairs-{self.retrieval_conf['output']}.txt"
+        match_path = (
+            output_dir
+            / f"{self.feature_conf['output']}_{self.matcher_conf['output']}_{sfm_pairs_path.stem}.h5"
+        )
+        sfm_dir = output_dir / "sfm"
+        for path in [retrieval_path, feature_path, sfm_pairs_path, match_path]:
+            if not path.exists():
+                raise FileNotFoundError(
+                    f"'{path}' not found, run the full pipeline before extending it."
+                )
+
+        existing_images = list_h5_names(feature_path)
+        all_images = ImageDataset(image_dir, self.feature_conf["preprocessing"]).names
+        new_images = sorted(set(all_images) - set(existing_images))
+        if not new_images:
+            logging.info("No new images to add to the reconstruction.")
+            return sfm_dir
+        logging.info(
+            f"Adding {len(new_images)} new images to {len(existing_images)} existing ones."
+        )
+
+        # --- Process only the new images ---
+        self.retriever.run(image_dir, output_dir, image_list=new_images)
+        new_pairs_path = sfm_pairs_path.with_name(f"{sfm_pairs_path.stem}-new.txt")
+        self.pair_generator.run(
+            retrieval_path,
+            new_pairs_path,
+            self.num_matched_pairs,
+            query_list=new_images,
+            db_list=sorted(all_images),
+        )
+        self.extractor.run(image_dir, output_dir, image_list=new_images)
+        self.matcher.run(
+            new_pairs_path, self.feature_conf["output"], output_dir, match_path
+        )
+        self.reconstructor.extend(
+            sfm_dir,
+            image_dir,
+            new_images,
+            new_pairs_path,
+            feature_path,
+            match_path,
+            self.mapper_options,
+        )
+
+        # Keep the full pair list in sync for later runs.
+        with open(sfm_pairs_path, "a") as f:
+            f.write(new_pairs_path.read_text())
+        new_pairs_path.unlink()
+
         if self.undistorter:
             self.undistorter.run(sfm_dir, image_dir)
 
@@ -179,3 +441,52 @@ class ReconstructionPipeline:
 
         logging.info(f"\nPipeline finished. Results in: {sfm_dir}")
         return sfm_dir
+
+    @staticmethod
+    def _fingerprint(cache: Optional[StageCache], path: Optional[Path]):
+        return cache.fingerprint([path]) if cache else None
+
+    @staticmethod
+    def _run_stage(
+        cache: Optional[StageCache],
+        profiler: Optional[PipelineProfiler],
+        stage: str,
+        key_parts: tuple,
+        fn: Callable,
+        outputs: Optional[tuple] = None,
+        cleanup: tuple = (),
+    ) -> tuple:
+        """
+        Runs a pipeline stage unless the stage cache holds an up-to-date result.
+
+        Args:
+            cache (StageCache, optional): The stage cache, or None to always run.
+            profiler (PipelineProfiler, optional): Records the stage resources.
+            stage (str): The name of the stage in the cache manifest.
+            key_parts (tuple): The inputs the stage result depends on.
+            fn (Callable): Runs the stage. Its return value is used as the stage
+                artifacts when `outputs` is not given.
+            outputs (tuple, optional): The artifacts written by `fn`.
+            cleanup (tuple): Extra paths to remove before re-running the stage.
+
+        Returns:
+            tuple: The paths of the stage artifacts.
+        """
+        with profiler.stage(stage) if profiler else nullcontext() as record:
+            if cache is None:
+                result = fn()
+                return outputs if outputs is not None else result
+
+            key = cache.key(stage, *key_parts)
+            artifacts = cache.lookup(stage, key)
+            if artifacts is not None:
+                logging.info(f"Skipping {stage}: inputs unchanged since the last run.")
+                if record is not None:
+                    record["cached"] = True
+                return tuple(artifacts)
+
+            cache.invalidate(stage, extra_paths=cleanup)
+            result = fn()
+            artifacts = outputs if outputs is not None else result
+            cache.store(stage, key, artifacts)
+            return tuple(artifacts)
@@ -0,0 +1,141 @@
+# src/easy_3dgs/pipeline/stage_cache.py
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence
+
+
+class StageCache:
+    """Content-addressed record of the pipeline stages completed in an output directory.
+
+    Every stage is stored under a key derived from the hash of its inputs (input
+    images, stage configuration and the fingerprints of the upstream artifacts).
+    A stage can be skipped when its key matches the recorded one and its
+    artifacts are still on disk, unchanged since they were written.
+    """
+
+    MANIFEST_NAME = "stage_cache.json"
+
+    def __init__(self, output_dir: Path, hash_image_content: bool = False):
+        """
+        Args:
+            output_dir (Path): The directory holding the pipeline artifacts.
+            hash_image_content (bool): If True, input images are hashed by content
+                instead of by name, size and modification time.
+        """
+        self.output_dir = Path(output_dir)
+        self.hash_image_content = hash_image_content
+        self.manifest_path = self.output_dir / self.MANIFEST_NAME
+        # Stages may run concurrently, guard the manifest.
+        self._lock = threading.Lock()
+        self.entries = {}
+        if self.manifest_path.exists():
+            try:
+                with open(self.manifest_path) as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable stage cache manifest: {e}")
+
+    def exists(self) -> bool:
+        """Returns True if a manifest from a previous run was found."""
+        return bool(self.entries)
+
+    def hash_images(self, image_dir: Path) -> str:
+        """Hashes the set of input images found under `image_dir`."""
+        digest = hashlib.sha1()
+        for rel_path in _walk_files(image_dir):
+            path = Path(image_dir) / rel_path
+            digest.update(rel_path.encode())
+            if self.hash_image_content:
+                with open(path, "rb") as f:
+                    for block in iter(lambda: f.read(1 << 20), b""):
+                        digest.update(block)
+            else:
+                stat = path.stat()
+                digest.update(f":{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def fingerprint(paths: Iterable[Optional[Path]]) -> str:
+        """Hashes the name, size and modification time of files and directories."""
+        digest = hashlib.sha1()
+        for path in paths:
+            if path is None:
+                digest.update(b"<none>")
+                continue
+            path = Path(path)
+            digest.update(str(path).encode())
+            if path.is_dir():
+                files = [(rel_path, path / rel_path) for rel_path in _walk_files(path)]
+            elif path.exists():
+                files = [("", path)]
+            else:
+                digest.update(b"<missing>")
+                continue
+            for rel_path, file in files:
+                stat = file.stat()
+                digest.update(f"{rel_path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def key(*parts) -> str:
+        """Builds a stage key from configs, hashes and other JSON-serializable parts."""
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def lookup(self, stage: str, key: str) -> Optional[List[Path]]:
+        """Returns the artifacts of `stage` if they were produced under `key` and are intact."""
+        entry = self.entries.get(stage)
+        if entry is None or entry["key"] != key:
+            return None
+        artifacts = [Path(p) if p is not None else None for p in entry["artifacts"]]
+        if any(p is not None and not p.exists() for p in artifacts):
+            return None
+        if self.fingerprint(artifacts) != entry["fingerprint"]:
+            return None
+        return artifacts
+
+    def store(self, stage: str, key: str, artifacts: Sequence[Optional[Path]]):
+        """Records the artifacts produced by `stage` under `key`."""
+        entry = {
+            "key": key,
+            "artifacts": [str(p) if p is not None else None for p in artifacts],
+            "fingerprint": self.fingerprint(artifacts),
+        }
+        with self._lock:
+            self.entries[stage] = entry
+            self._save()
+
+    def invalidate(self, stage: str, extra_paths: Sequence[Path] = ()):
+        """Forgets `stage` and removes its stale artifacts from disk."""
+        with self._lock:
+            entry = self.entries.pop(stage, None)
+            self._save()
+        paths = list(extra_paths)
+        if entry is not None:
+            paths += [Path(p) for p in entry["artifacts"] if p is not None]
+        for path in paths:
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            elif path.exists():
+                path.unlink()
+
+    def _save(self):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+
+def _walk_files(root: Path) -> List[str]:
+    """Returns the sorted relative paths of every file below `root`."""
+    paths = []
+    for dp, _, fn in os.walk(root):
+        for f in fn:
+            paths.append(os.path.relpath(os.path.join(dp, f), root))
+    return sorted(paths)
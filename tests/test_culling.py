@@ -0,0 +1,145 @@
+import math
+
+import torch
+
+from easy_3dgs.pipeline.gaussian_splatting.culling import GaussianGrid, uncull_info
+
+WIDTH, HEIGHT = 320, 240
+
+
+def _random_gaussians(num_gaussians: int = 20_000):
+    generator = torch.Generator().manual_seed(0)
+    means = torch.randn(num_gaussians, 3, generator=generator) * 5
+    scales = torch.exp(torch.randn(num_gaussians, 3, generator=generator) * 0.5 - 4)
+    return means, scales
+
+
+def _random_cameras(num_cameras: int = 50):
+    """Pinhole cameras around the origin, looking at random points near it."""
+    generator = torch.Generator().manual_seed(1)
+    camtoworlds, Ks = [], []
+    for _ in range(num_cameras):
+        position = torch.nn.functional.normalize(
+            torch.randn(3, generator=generator), dim=0
+        ) * (4 + 12 * torch.rand(1, generator=generator))
+        target = torch.randn(3, generator=generator) * 2
+        forward = torch.nn.functional.normalize(target - position, dim=0)
+        right = torch.nn.functional.normalize(
+            torch.linalg.cross(forward, torch.tensor([0.0, 0.0, 1.0])), dim=0
+        )
+        down = torch.linalg.cross(forward, right)
+        camtoworld = torch.eye(4)
+        camtoworld[:3, :3] = torch.stack([right, down, forward], 1)
+        camtoworld[:3, 3] = position
+        camtoworlds.append(camtoworld)
+
+        half_fov = math.radians(20 + 30 * torch.rand(1, generator=generator).item())
+        focal = 0.5 * WIDTH / math.tan(half_fov)
+        Ks.append(
+            torch.tensor(
+                [[focal, 0.0, WIDTH / 2], [0.0, focal, HEIGHT / 2], [0.0, 0.0, 1.0]]
+            )
+        )
+    return torch.stack(camtoworlds), torch.stack(Ks)
+
+
+def _reference_visible(means, scales, camtoworld, K, near_plane=0.01):
+    """The GSs whose projected 3-sigma footprint overlaps the image."""
+    points = (means - camtoworld[:3, 3]) @ camtoworld[:3, :3]
+    depths = points[:, 2]
+    u = K[0, 0] * points[:, 0] / depths + K[0, 2]
+    v = K[1, 1] * points[:, 1] / depths + K[1, 2]
+    radii = 3 * scales.amax(-1) * K[0, 0] / depths
+    return (
+        (depths > near_plane)
+        & (u + radii >= 0)
+        & (u - radii <= WIDTH)
+        & (v + radii >= 0)
+        & (v - radii <= HEIGHT)
+    )
+
+
+def _assert_no_false_negatives(grid, means, scales, camtoworlds, Ks):
+    num_culled = 0
+    for camtoworld, K in zip(camtoworlds, Ks):
+        visible = torch.zeros(len(means), dtype=torch.bool)
+        visible[grid.visible(camtoworld[None], K[None], WIDTH, HEIGHT)] = True
+        expected = _reference_visible(means, scales, camtoworld, K)
+        assert not (expected & ~visible).any()
+        num_culled += int((~visible).sum())
+    # The test is meaningless if nothing is culled.
+    assert num_culled > 0
+
+
+def test_visible_has_no_false_negatives():
+    means, scales = _random_gaussians()
+    camtoworlds, Ks = _random_cameras()
+    grid = GaussianGrid()
+    grid.build(means, scales)
+    _assert_no_false_negatives(grid, means, scales, camtoworlds, Ks)
+
+
+def test_visible_covers_moved_gaussians():
+    means, scales = _random_gaussians()
+    camtoworlds, Ks = _random_cameras()
+    grid = GaussianGrid()
+    grid.build(means, scales)
+
+    generator = torch.Generator().manual_seed(2)
+    offsets = torch.rand(means.shape, generator=generator) * 2 - 1
+    moved_means = means + 0.99 * grid.margin * offsets
+    grown_scales = scales * (1 + 0.99 * grid.slack)
+    assert grid.covers(moved_means, grown_scales)
+    _assert_no_false_negatives(grid, moved_means, grown_scales, camtoworlds, Ks)
+
+    moved_means[0, 0] += 2 * grid.margin
+    assert not grid.covers(moved_means, grown_scales)
+
+
+def test_visible_cache():
+    means, scales = _random_gaussians()
+    camtoworlds, Ks = _random_cameras(4)
+    grid = GaussianGrid()
+    grid.build(means, scales)
+    expected = grid.visible(camtoworlds, Ks, WIDTH, HEIGHT).sort().values
+    for _ in range(2):
+        visible = grid.visible(camtoworlds, Ks, WIDTH, HEIGHT, cache_keys=range(4))
+        assert torch.equal(visible.sort().values, expected)
+    assert len(grid.cache) == 4
+
+
+def test_uncull_info():
+    num_gaussians, num_cameras = 1000, 2
+    ids = torch.randperm(num_gaussians)[:300]
+    radii = torch.randint(0, 5, (num_cameras, len(ids), 2), dtype=torch.int32)
+    means2d = torch.zeros(num_cameras, len(ids), 2, requires_grad=True)
+    grads = torch.randn(num_cameras, len(ids), 2)
+    (means2d * grads).sum().backward()
+    means2d.absgrad = grads.abs()
+
+    info = uncull_info(
+        {"radii": radii, "means2d": means2d, "width": WIDTH},
+        ids,
+        num_gaussians,
+        packed=False,
+    )
+    culled = torch.ones(num_gaussians, dtype=torch.bool)
+    culled[ids] = False
+    assert info["width"] == WIDTH
+    assert info["radii"].shape == (num_cameras, num_gaussians, 2)
+    assert torch.equal(info["radii"][:, ids], radii)
+    assert not info["radii"][:, culled].any()
+    for name in ["grad", "absgrad"]:
+        full = getattr(info["means2d"], name)
+        assert full.shape == (num_cameras, num_gaussians, 2)
+        assert torch.equal(full[:, ids], getattr(means2d, name))
+        assert not full[:, culled].any()
+
+    gaussian_ids = torch.randint(0, len(ids), (500,))
+    info = uncull_info(
+        {"gaussian_ids": gaussian_ids, "radii": radii[0]},
+        ids,
+        num_gaussians,
+        packed=True,
+    )
+    assert torch.equal(info["gaussian_ids"], ids[gaussian_ids])
@@ -0,0 +1,200 @@
+import io
+
+import pytest
+import torch
+from gsplat.strategy.ops import duplicate, remove
+
+from easy_3dgs.pipeline.gaussian_splatting.optimizers import (
+    GroupedAdam,
+    LowPrecisionAdam,
+)
+
+NUM_GAUSSIANS = 100
+
+# Name, shape and (lr, betas) of the splat parameters, as set by the trainer.
+SPLATS = {
+    "means": ((3,), (1.6e-4, (0.9, 0.999))),
+    "scales": ((3,), (5e-3, (0.9, 0.999))),
+    "quats": ((4,), (1e-3, (0.9, 0.999))),
+    "opacities": ((), (5e-2, (0.9, 0.999))),
+    "sh0": ((1, 3), (2.5e-3, (0.8, 0.99))),
+    "shN": ((15, 3), (2.5e-3 / 20, (0.8, 0.99))),
+}
+
+
+def _make_splats():
+    generator = torch.Generator().manual_seed(0)
+    params, optimizers = {}, {}
+    for name, (shape, (lr, betas)) in SPLATS.items():
+        data = torch.randn(NUM_GAUSSIANS, *shape, generator=generator)
+        params[name] = torch.nn.Parameter(data)
+        optimizers[name] = torch.optim.Adam(
+            [params[name]], lr=lr, betas=betas, eps=1e-15, foreach=False
+        )
+    return params, optimizers
+
+
+def _set_grads(params, seed: int, skip=()):
+    generator = torch.Generator().manual_seed(seed)
+    for name, param in params.items():
+        grad = torch.randn(param.shape, generator=generator)
+        param.grad = None if name in skip else grad
+
+
+def _assert_same_splats(params, expected_params, optimizers, expected_optimizers):
+    for name, param in params.items():
+        assert torch.equal(param, expected_params[name]), name
+        state = optimizers[name].state[param]
+        expected_state = expected_optimizers[name].state[expected_params[name]]
+        assert state.keys() == expected_state.keys(), name
+        for key, value in state.items():
+            assert torch.equal(value, expected_state[key]), (name, key)
+
+
+# GroupedAdam updates the parameters without calling the optimizers' step.
+@pytest.mark.filterwarnings("ignore:Detected call of `lr_scheduler.step\\(\\)`")
+def test_grouped_adam_matches_adam():
+    expected_params, expected_optimizers = _make_splats()
+    params, optimizers = _make_splats()
+    schedulers = [
+        torch.optim.lr_scheduler.ExponentialLR(o["means"], gamma=0.99)
+        for o in [expected_optimizers, optimizers]
+    ]
+    grouped = GroupedAdam(optimizers)
+
+    for step in range(20):
+        # The higher SH bands get no gradient until they are used.
+        skip = ["shN"] if step < 5 else []
+        _set_grads(expected_params, step, skip)
+        _set_grads(params, step, skip)
+        for optimizer in expected_optimizers.values():
+            optimizer.step()
+        grouped.step()
+        for scheduler in schedulers:
+            scheduler.step()
+        _assert_same_splats(params, expected_params, optimizers, expected_optimizers)
+
+
+def test_grouped_adam_follows_strategy_resizes():
+    expected_params, expected_optimizers = _make_splats()
+    params, optimizers = _make_splats()
+    grouped = GroupedAdam(optimizers)
+    generator = torch.Generator().manual_seed(1)
+
+    for step in range(12):
+        if step in (3, 6, 9):
+            # Resize both sets of splats the way the densification strategies do.
+            num_gaussians = len(params["means"])
+            mask = torch.rand(num_gaussians, generator=generator) < 0.3
+            op = duplicate if step != 6 else remove
+            op(expected_params, expected_optimizers, {}, mask)
+            op(params, optimizers, {}, mask)
+        _set_grads(expected_params, step)
+        _set_grads(params, step)
+        for optimizer in expected_optimizers.values():
+            optimizer.step()
+        grouped.step()
+        _assert_same_splats(params, expected_params, optimizers, expected_optimizers)
+    assert len(params["means"]) != NUM_GAUSSIANS
+
+
+def test_grouped_adam_rejects_unsupported_options():
+    param = torch.nn.Parameter(torch.zeros(3))
+    for optimizer in [
+        torch.optim.Adam([param], weight_decay=0.1),
+        torch.optim.Adam([param], amsgrad=True),
+        torch.optim.SGD([param], lr=0.1),
+    ]:
+        try:
+            GroupedAdam({"param": optimizer})
+        except ValueError:
+            continue
+        raise AssertionError(f"{optimizer} was accepted.")
+
+
+def _fit_quadratic(optimizer_cls, dtype=torch.float32, steps=300, **kwargs):
+    """Fits random rows to a random target, returning the parameter and optimizer."""
+    generator = torch.Generator().manual_seed(0)
+    target = torch.randn(NUM_GAUSSIANS, 15, 3, generator=generator)
+    init = torch.randn(NUM_GAUSSIANS, 15, 3, generator=generator)
+    param = torch.nn.Parameter(init.to(dtype))
+    optimizer = optimizer_cls([param], lr=1e-2, eps=1e-15, **kwargs)
+    for _ in range(steps):
+        loss = ((param.float() - target) ** 2).sum()
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad()
+    return (param.float() - target).abs().mean().item(), param, optimizer
+
+
+@pytest.mark.parametrize(
+    "moments, dtype",
+    [
+        ("float32", torch.float32),
+        ("bfloat16", torch.float32),
+        ("int8", torch.float32),
+        ("bfloat16", torch.bfloat16),
+        ("int8", torch.bfloat16),
+    ],
+)
+def test_low_precision_adam_converges_like_adam(moments, dtype):
+    torch.manual_seed(0)
+    expected_error, _, _ = _fit_quadratic(torch.optim.Adam, foreach=False)
+    initial_error, _, _ = _fit_quadratic(torch.optim.Adam, steps=0)
+    error, param, _ = _fit_quadratic(LowPrecisionAdam, dtype, moments=moments)
+    assert param.dtype == dtype
+    assert expected_error < 0.1 * initial_error
+    # The rounding noise slows the fit down by a few percent at most.
+    assert abs(error - expected_error) < 0.05 * expected_error
+
+
+def test_low_precision_adam_int8_state_round_trip():
+    torch.manual_seed(0)
+    _, param, optimizer = _fit_quadratic(LowPrecisionAdam, steps=10, moments="int8")
+    state = optimizer.state[param]
+    buffer = io.BytesIO()
+    torch.save(optimizer.state_dict(), buffer)
+    buffer.seek(0)
+
+    loaded = LowPrecisionAdam([param], lr=1e-2, eps=1e-15, moments="int8")
+    loaded.load_state_dict(torch.load(buffer, weights_only=True))
+    loaded_state = loaded.state[param]
+    assert loaded_state.keys() == state.keys()
+    for key, dtype in [
+        ("exp_avg", torch.int8),
+        ("exp_avg_sq", torch.uint8),
+        ("exp_avg_scale", torch.float32),
+        ("exp_avg_sq_scale", torch.float32),
+    ]:
+        assert loaded_state[key].dtype == dtype, key
+        assert torch.equal(loaded_state[key], state[key]), key
+    assert loaded_state["step"].item() == state["step"].item()
+
+
+def test_low_precision_adam_int8_state_follows_duplicate():
+    torch.manual_seed(0)
+    _, param, optimizer = _fit_quadratic(LowPrecisionAdam, steps=10, moments="int8")
+    before = {
+        key: optimizer._load_moment(optimizer.state[param], key)
+        for key in ["exp_avg", "exp_avg_sq"]
+    }
+    mask = torch.zeros(NUM_GAUSSIANS, dtype=torch.bool)
+    mask[::3] = True
+    params, optimizers = {"shN": param}, {"shN": optimizer}
+    duplicate(params, optimizers, {}, mask)
+
+    # Growing the int8 codes with float32 zeros promotes them to float32.
+    new_param = params["shN"]
+    state = optimizer.state[new_param]
+    assert state["exp_avg"].dtype == torch.float32
+    assert len(state["exp_avg"]) == len(new_param) == NUM_GAUSSIANS + mask.sum()
+    for key, expected in before.items():
+        moment = optimizer._load_moment(state, key)
+        assert torch.equal(moment[:NUM_GAUSSIANS], expected), key
+        assert not moment[NUM_GAUSSIANS:].any(), key
+
+    new_param.grad = torch.randn_like(new_param)
+    optimizer.step()
+    assert state["exp_avg"].dtype == torch.int8
+    assert state["exp_avg_sq"].dtype == torch.uint8
+    assert torch.isfinite(new_param).all()
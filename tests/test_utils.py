@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+import torch
+from sklearn.neighbors import NearestNeighbors
+
+from easy_3dgs.pipeline.gaussian_splatting.utils import knn
+
+
+def _clouds():
+    generator = torch.Generator().manual_seed(0)
+    centers = torch.randn(4, 3, generator=generator) * 10
+    return {
+        "uniform": torch.rand(20000, 3, generator=generator) * 10,
+        "clustered": torch.cat(
+            [torch.randn(5000, 3, generator=generator) * 0.01 + c for c in centers]
+        ),
+        "duplicates": torch.randint(0, 20, (5000, 3), generator=generator).float(),
+        "planar": torch.cat(
+            [torch.rand(5000, 2, generator=generator), torch.zeros(5000, 1)], 1
+        ),
+        "outliers": torch.cat(
+            [
+                torch.randn(5000, 3, generator=generator),
+                torch.randn(10, 3, generator=generator) * 1e4,
+            ]
+        ),
+    }
+
+
+def _sklearn_knn(x: torch.Tensor, K: int) -> np.ndarray:
+    points = x.numpy()
+    model = NearestNeighbors(n_neighbors=K).fit(points)
+    distances, _ = model.kneighbors(points)
+    return distances.astype(np.float32)
+
+
+@pytest.mark.parametrize("name", list(_clouds()))
+def test_knn_matches_sklearn(name):
+    x = _clouds()[name]
+    np.testing.assert_array_equal(knn(x, 4).numpy(), _sklearn_knn(x, 4))
+
+
+@pytest.mark.parametrize("name", ["clustered", "outliers"])
+def test_knn_bounded_candidates(name):
+    # Dense cells and outliers scan their candidates by chunks.
+    x = _clouds()[name][::5]
+    distances = knn(x, 4, chunk_size=256, max_candidates=300)
+    np.testing.assert_array_equal(distances.numpy(), _sklearn_knn(x, 4))
+
+
+@pytest.mark.parametrize("N", [4, 5, 8, 9, 16])
+def test_knn_tiny_inputs(N):
+    # sklearn computes the distances of tiny inputs by brute force, with the
+    # |x|^2 - 2 x.y + |y|^2 expansion: they may differ in the last bit.
+    x = torch.randn(N, 3, generator=torch.Generator().manual_seed(N))
+    np.testing.assert_allclose(
+        knn(x, 4).numpy(), _sklearn_knn(x, 4), rtol=1e-6, atol=1e-6
+    )